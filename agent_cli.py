@@ -1,34 +1,177 @@
 import os
+import sys
 import json
 import shlex
 import asyncio
 import signal
 import readline
+import functools
+import stat
+from collections import deque
 from datetime import datetime
-from typing import List, Optional
-from anthropic_agent import Agent
-from structured_schemas import (
-    TextAnalysisResponse, 
-    SearchResultsResponse, 
-    GitHubRepositoryAnalysis,
-    CodeAnalysisResponse,
-    PlanResponse
-)
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
 import logging
 
+if TYPE_CHECKING:
+    # Imported for annotations only; the agent module pulls in the anthropic SDK
+    from anthropic_agent import Agent
+
+try:
+    import uvloop
+except ImportError:  # Optional speedup; uvloop is not available on Windows
+    uvloop = None
+
+try:
+    from prompt_toolkit import PromptSession
+except ImportError:  # Fall back to readline-backed input()
+    PromptSession = None
+
+try:
+    import orjson
+except ImportError:  # Optional speedup; fall back to the standard library
+    orjson = None
+
+try:
+    import aiofiles
+except ImportError:  # Fall back to appending from a worker thread
+    aiofiles = None
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Number of recent turns kept in memory, and so shown by "history" and written by "save"
+HISTORY_MAXLEN = 1024
+
+# Environment variable naming a JSONL file every turn is appended to, like --history-log;
+# without one nothing is logged. A full log is moved aside to a single ".1" backup.
+HISTORY_LOG_ENV = "KAI_HISTORY_LOG"
+HISTORY_LOG_MAX_BYTES = 16 * 1024 * 1024
+
+def dump_json_file(path: str, data: Any) -> None:
+    """Write data to a file as indented JSON."""
+    if orjson:
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+
+def _encode_history_entry(role: str, content: str, ts: str) -> bytes:
+    """Encode a history entry as one JSON line."""
+    entry = {"role": role, "content": content, "ts": ts}
+    if orjson:
+        return orjson.dumps(entry) + b"\n"
+    return json.dumps(entry).encode("utf-8") + b"\n"
+
+def _append_bytes(path: str, data: bytes) -> None:
+    """Append raw bytes to a file."""
+    with open(path, "ab") as f:
+        f.write(data)
+
+def _rotate_log(path: str, max_bytes: int) -> None:
+    """Move a log aside to path.1 once it reaches max_bytes, replacing any older backup."""
+    try:
+        if os.path.getsize(path) >= max_bytes:
+            os.replace(path, path + ".1")
+    except FileNotFoundError:
+        pass
+
+class HistoryLog:
+    """Append-only JSONL log of conversation turns, written in batches by a background task."""
+    
+    def __init__(self, path: str, loop: asyncio.AbstractEventLoop):
+        """Initialize a log at path, written from the given event loop."""
+        self.path = path
+        self.loop = loop
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+    
+    def append(self, role: str, content: str) -> None:
+        """Queue a turn for the log."""
+        if self._task is None:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            except OSError:
+                pass  # The writer logs the failed appends
+            self._queue = asyncio.Queue()
+            self._task = self.loop.create_task(self._writer())
+        self._queue.put_nowait((role, content, datetime.now().isoformat()))
+    
+    async def _writer(self) -> None:
+        """Append queued entries to the log, batching whatever has accumulated."""
+        queue = self._queue
+        while True:
+            entries = [await queue.get()]
+            while not queue.empty():
+                entries.append(queue.get_nowait())
+            
+            data = b"".join(_encode_history_entry(*entry) for entry in entries)
+            try:
+                _rotate_log(self.path, HISTORY_LOG_MAX_BYTES)
+                if aiofiles:
+                    async with aiofiles.open(self.path, "ab") as f:
+                        await f.write(data)
+                else:
+                    await asyncio.to_thread(_append_bytes, self.path, data)
+            except OSError as e:
+                logger.error(f"Error writing history log: {e}")
+            finally:
+                for _ in entries:
+                    queue.task_done()
+    
+    async def aclose(self) -> None:
+        """Write out every queued entry and stop the writer."""
+        if self._task is None:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+@functools.lru_cache(maxsize=None)
+def get_structured_schemas() -> Dict[str, Any]:
+    """
+    Get the predefined structured output schemas by name
+    
+    The schema models are imported on first call so commands that never use
+    structured output do not pay for building them.
+    """
+    from structured_schemas import (
+        TextAnalysisResponse, 
+        SearchResultsResponse, 
+        GitHubRepositoryAnalysis,
+        CodeAnalysisResponse,
+        PlanResponse
+    )
+    
+    return {
+        "text_analysis": TextAnalysisResponse,
+        "search_results": SearchResultsResponse,
+        "github_repo": GitHubRepositoryAnalysis,
+        "code_analysis": CodeAnalysisResponse,
+        "plan": PlanResponse
+    }
+
 class AgentCLI:
     """Command Line Interface for the Anthropic Agent."""
     
-    def __init__(self, agent: Agent, use_streaming: bool = True):
-        """Initialize with an agent."""
+    def __init__(self, agent: "Agent", use_streaming: bool = True, history_log: Optional[str] = None):
+        """Initialize with an agent, optionally logging every turn to a JSONL file."""
         self.agent = agent
         self.running = True
-        self.history = []
+        self.history = deque(maxlen=HISTORY_MAXLEN)
         self.use_streaming = use_streaming
+        
+        # One event loop for the whole session so the async Anthropic client
+        # keeps its connection pool between commands
+        self.loop = uvloop.new_event_loop() if uvloop else asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        
+        # With a log path, every turn is also queued for the append-only history log
+        history_log = history_log or os.environ.get(HISTORY_LOG_ENV)
+        self._history_log = HistoryLog(history_log, self.loop) if history_log else None
+        
         self.commands = {
             "help": self.show_help,
             "exit": self.exit,
@@ -47,18 +190,70 @@ class AgentCLI:
             "rag": self.rag_commands,
             "image": self.image_commands  # Add image commands
         }
-        
-        # Available structured output schemas
-        self.structured_schemas = {
-            "text_analysis": TextAnalysisResponse,
-            "search_results": SearchResultsResponse,
-            "github_repo": GitHubRepositoryAnalysis,
-            "code_analysis": CodeAnalysisResponse,
-            "plan": PlanResponse
-        }
+    
+    @property
+    def structured_schemas(self) -> Dict[str, Any]:
+        """Available structured output schemas."""
+        return get_structured_schemas()
     
     # ... existing methods ...
     
+    @functools.cached_property
+    def session(self) -> Optional["PromptSession"]:
+        """Prompt session for async input, created on first prompt."""
+        return PromptSession() if PromptSession else None
+    
+    def prompt(self, message: str) -> str:
+        """Read a line of input while the event loop keeps running background tasks."""
+        if self.session is None:
+            return input(message)
+        return self.run_async(self.session.prompt_async(message))
+    
+    def run_async(self, coro):
+        """Run a coroutine to completion on the CLI's event loop."""
+        return self.loop.run_until_complete(coro)
+    
+    def add_history(self, role: str, content: str) -> None:
+        """Record a conversation turn and queue it for the history log if one is enabled."""
+        self.history.append((role, content))
+        if self._history_log is not None:
+            self._history_log.append(role, content)
+    
+    def close(self) -> None:
+        """Flush the history log, close the agent's API connections and shut down the CLI's event loop."""
+        if self.loop.is_closed():
+            return
+        
+        try:
+            if self._history_log is not None:
+                self.loop.run_until_complete(self._history_log.aclose())
+            self.loop.run_until_complete(self.agent.client.close())
+            self.loop.run_until_complete(self.loop.shutdown_asyncgens())
+        finally:
+            self.loop.close()
+    
+    async def _print_stream(self, deltas) -> str:
+        """Write streamed response deltas to stdout as they arrive and return the full text."""
+        chunks = []
+        async for delta in deltas:
+            sys.stdout.write(delta)
+            sys.stdout.flush()
+            chunks.append(delta)
+        return "".join(chunks)
+    
+    def _validate_image_path(self, image_path: str) -> Optional[os.stat_result]:
+        """Check that an image path is a regular file, printing an error if not."""
+        try:
+            image_stat = os.stat(image_path)
+        except OSError:
+            image_stat = None
+        
+        if image_stat is None or not stat.S_ISREG(image_stat.st_mode):
+            print(f"Error: Image file not found: {image_path}")
+            return None
+        
+        return image_stat
+    
     def image_commands(self, args: Optional[List[str]] = None) -> None:
         """Handle image-related commands."""
         if not args or args[0] == "help":
@@ -75,27 +270,24 @@ class AgentCLI:
         
         if command == "analyze" and len(args) >= 2:
             image_path = args[1]
-            if not os.path.exists(image_path):
-                print(f"Error: Image file not found: {image_path}")
+            if self._validate_image_path(image_path) is None:
                 return
             
             # Get prompt from user
-            prompt = input("Enter analysis prompt: ")
+            prompt = self.prompt("Enter analysis prompt: ")
             
             self.execute_tool(["analyze_image", f"image_path={image_path}", f"prompt={prompt}"])
         
         elif command == "ocr" and len(args) >= 2:
             image_path = args[1]
-            if not os.path.exists(image_path):
-                print(f"Error: Image file not found: {image_path}")
+            if self._validate_image_path(image_path) is None:
                 return
             
             self.execute_tool(["extract_text_from_image", f"image_path={image_path}"])
         
         elif command == "describe" and len(args) >= 2:
             image_path = args[1]
-            if not os.path.exists(image_path):
-                print(f"Error: Image file not found: {image_path}")
+            if self._validate_image_path(image_path) is None:
                 return
             
             detail_level = "detailed"
@@ -106,8 +298,7 @@ class AgentCLI:
         
         elif command == "optimize" and len(args) >= 2:
             image_path = args[1]
-            if not os.path.exists(image_path):
-                print(f"Error: Image file not found: {image_path}")
+            if self._validate_image_path(image_path) is None:
                 return
             
             max_size = 5.0
@@ -123,24 +314,30 @@ class AgentCLI:
         
         elif command == "send" and len(args) >= 2:
             image_path = args[1]
-            if not os.path.exists(image_path):
-                print(f"Error: Image file not found: {image_path}")
+            if self._validate_image_path(image_path) is None:
                 return
             
             # Get message from user
-            message = input("Enter your message to send with the image: ")
+            message = self.prompt("Enter your message to send with the image: ")
             
             # Process message with image
             print("Agent is thinking...")
-            response = asyncio.run(self.agent.process_message_with_image(message, image_path))
-            
-            print("\nAgent:")
-            print(response)
-            print()
+            if self.use_streaming:
+                print("\nAgent:")
+                response = self.run_async(self._print_stream(
+                    self.agent.stream_response_with_image(message, image_path)
+                ))
+                print("\n")
+            else:
+                response = self.run_async(self.agent.process_message_with_image(message, image_path))
+                
+                print("\nAgent:")
+                print(response)
+                print()
             
             # Add to history
-            self.history.append(("user", f"[Message with image: {os.path.basename(image_path)}] {message}"))
-            self.history.append(("assistant", response))
+            self.add_history("user", f"[Message with image: {os.path.basename(image_path)}] {message}")
+            self.add_history("assistant", response)
         
         else:
             print(f"Unknown image command: {command}")
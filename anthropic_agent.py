@@ -1,21 +1,52 @@
 import base64
+import asyncio
+import logging
 import mimetypes
-from typing import Dict, List, Optional, Any, Union, BinaryIO, Type, Tuple
-from anthropic import Anthropic, Client, Model
+from typing import Dict, List, Optional, Any, Union, BinaryIO, Type, Tuple, AsyncIterator
+from anthropic import Anthropic, AsyncAnthropic, Client, Model
+from anthropic_client import get_client
 from anthropic_agent.memory import Memory
 from anthropic_agent.tools import Tool, ToolParameter
 
+logger = logging.getLogger(__name__)
+
 class Agent:
     """Anthropic-powered agent with tool execution capabilities."""
     
-    def __init__(self, model: str = "claude-3-opus-20240229", use_rag: bool = False):
+    __slots__ = (
+        "model",
+        "memory",
+        "tools",
+        "tool_categories",
+        "client",
+        "max_tokens",
+        "use_rag",
+        "rag_system",
+        "_system_prompts",
+        "_tools_version",
+        "_tool_defs_by_name",
+        "_tool_defs",
+        "__weakref__",
+    )
+    
+    def __init__(self, model: str = "claude-3-opus-20240229", use_rag: bool = False,
+                 max_tokens: int = 4096):
         self.model = model
         self.memory = Memory()
         self.tools = {}
         self.tool_categories = {}
-        self.client = Client(api_key=os.environ.get("ANTHROPIC_API_KEY"))
+        self.client = get_client()
+        self.max_tokens = max_tokens
         self.use_rag = use_rag
         self.rag_system = RAGSystem() if use_rag else None
+        
+        # Enriched system prompts, keyed by the use_rag flag they were built for
+        self._system_prompts = {}
+        
+        # Tool definitions sent to the API, built once when tools are registered
+        self._tools_version = 0
+        self._tool_defs_by_name = {}
+        self._tool_defs = []
     
     def register_tools(self, tools: List[Tool]):
         """Register tools with the agent."""
@@ -24,100 +55,169 @@ class Agent:
             if tool.category not in self.tool_categories:
                 self.tool_categories[tool.category] = []
             self.tool_categories[tool.category].append(tool.name)
+            self._tool_defs_by_name[tool.name] = self._tool_definition(tool)
+        
+        # Publish a new definitions list so requests never rebuild schemas
+        self._tool_defs = list(self._tool_defs_by_name.values())
+        self._tools_version += 1
+    
+    @property
+    def tools_version(self) -> int:
+        """Counter that changes whenever tools are registered, for cache invalidation."""
+        return self._tools_version
+    
+    def get_tool(self, name: str) -> Optional[Tool]:
+        """Get a registered tool by name."""
+        return self.tools.get(name)
+    
+    @staticmethod
+    def _tool_definition(tool: Tool) -> Dict[str, Any]:
+        """Build the API definition for a single tool."""
+        properties = {}
+        required = []
+        for param in tool.parameters:
+            properties[param.name] = {
+                "type": param.type,
+                "description": param.description
+            }
+            if param.required:
+                required.append(param.name)
+        
+        return {
+            "name": tool.name,
+            "description": tool.description,
+            "input_schema": {
+                "type": "object",
+                "properties": properties,
+                "required": required
+            }
+        }
+    
+    def _get_tool_definitions(self) -> List[Dict[str, Any]]:
+        """Get tool definitions for the API, as prepared by register_tools."""
+        return self._tool_defs
     
     def _enrich_system_prompt(self) -> str:
         """Enrich the system prompt with context."""
+        cached = self._system_prompts.get(self.use_rag)
+        if cached is not None:
+            return cached
+        
         enriched = "You are an assistant powered by Anthropic's Claude model. You have access to various tools and a knowledge base."
         
         # If using RAG, mention it
         if self.use_rag:
             enriched += "\n\nYou have access to a knowledge base of documents. When appropriate, reference information from this knowledge base in your responses."
         
+        self._system_prompts[self.use_rag] = enriched
         return enriched
     
-    async def process_message(self, user_message: str) -> str:
-        """Process a user message and generate a complete response."""
-        # Add user message to memory
-        self.memory.add("user", user_message)
-        
-        # Get RAG context if enabled
-        rag_context = ""
-        if self.use_rag:
-            rag_context = await self._enrich_with_rag(user_message)
-        
-        # Prepare messages
-        enriched_system_prompt = self._enrich_system_prompt()
-        messages = [
-            {"role": "system", "content": enriched_system_prompt}
-        ] + self.memory.get_history()
-        
-        # If RAG context is available, add it before the user's message
-        if rag_context:
-            # Find the last user message
-            for i in range(len(messages) - 1, -1, -1):
-                if messages[i]["role"] == "user":
-                    # Replace with the enriched version
-                    original_message = messages[i]["content"]
-                    messages[i]["content"] = f"{rag_context}\n\nUser query: {original_message}\n\nPlease use the above context to help answer the query."
-                    break
-        
-        # Prepare API call
+    def _build_request(self, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Build the API request arguments for a prepared message list."""
         kwargs = {
             "model": self.model,
             "messages": messages,
-            "max_tokens": 4096,
+            "max_tokens": self.max_tokens,
             "temperature": 0.7,
         }
         
         if self.tools:
             kwargs["tools"] = self._get_tool_definitions()
         
+        return kwargs
+    
+    async def _call_api(self, kwargs: Dict[str, Any], request_note: str = "") -> str:
+        """Call the model, record the reply in memory and return its text."""
+        request = f"your request {request_note}" if request_note else "your request"
+        
         try:
             # Call the model
-            response = self.client.messages.create(**kwargs)
+            response = await self.client.messages.create(**kwargs)
             
             # Update usage statistics
             self._update_usage_stats(response)
             
             # Process response
-            if hasattr(response, 'content'):
-                text_blocks = [block.text for block in response.content if block.type == 'text']
-                assistant_response = ''.join(text_blocks)
+            content = getattr(response, 'content', None)
+            if content:
+                assistant_response = ''.join(block.text for block in content if block.type == 'text')
                 self.memory.add("assistant", assistant_response)
                 return assistant_response
             else:
-                return "I apologize, but I encountered an issue processing your request with the image."
+                return f"I apologize, but I encountered an issue processing {request}."
         
         except Exception as e:
             logger.error(f"API call error: {str(e)}")
-            return f"I encountered an error while processing your request with the image: {str(e)}"
+            return f"I encountered an error while processing {request}: {str(e)}"
     
-    async def process_message_with_image(self, user_message: str, image_path: str) -> str:
-        """Process a user message with an image and generate a response."""
-        # Add user message to memory
-        self.memory.add("user", f"[Message with image] {user_message}")
+    async def _prepare_text_request(self, user_message: str) -> Dict[str, Any]:
+        """Add a user message to memory and build the API request for it."""
+        # Start RAG retrieval first so it runs while the request is assembled
+        rag_task = asyncio.create_task(self._enrich_with_rag(user_message)) if self.use_rag else None
         
-        # Prepare messages
+        # Prepare messages from the history before this turn
         enriched_system_prompt = self._enrich_system_prompt()
         messages = [
-            {"role": "system", "content": enriched_system_prompt}
+            {"role": "system", "content": enriched_system_prompt},
+            *self.memory.get_history()
         ]
         
-        # Add conversation history excluding the last message (which will be replaced)
-        history = self.memory.get_history()[:-1]  # Exclude the last message we just added
-        messages.extend(history)
-        
         # Get RAG context if enabled
-        rag_context = ""
-        if self.use_rag:
-            rag_context = await self._enrich_with_rag(user_message)
+        rag_context = await rag_task if rag_task else ""
         
-        # Prepare the multimodal message
+        # Add the user's message, with RAG context before it if available
+        if rag_context:
+            content = f"{rag_context}\n\nUser query: {user_message}\n\nPlease use the above context to help answer the query."
+        else:
+            content = user_message
+        messages.append({"role": "user", "content": content})
+        
+        # Add the original user message to memory
+        self.memory.add("user", user_message)
+        
+        return self._build_request(messages)
+    
+    async def process_message(self, user_message: str) -> str:
+        """Process a user message and generate a complete response."""
+        kwargs = await self._prepare_text_request(user_message)
+        return await self._call_api(kwargs)
+    
+    async def stream_response(self, user_message: str) -> AsyncIterator[str]:
+        """Process a user message and yield the response text as it is generated."""
+        kwargs = await self._prepare_text_request(user_message)
+        async for delta in self._stream_completion(kwargs):
+            yield delta
+    
+    async def _prepare_image_request(self, user_message: str, image_path: str) -> Dict[str, Any]:
+        """Add a user message with an image to memory and build the API request for it."""
+        # Start RAG retrieval first so it overlaps with image encoding
+        rag_task = asyncio.create_task(self._enrich_with_rag(user_message)) if self.use_rag else None
+        
+        # Prepare messages from the history before this turn; the multimodal
+        # version of the user message is appended below
+        enriched_system_prompt = self._enrich_system_prompt()
+        messages = [
+            {"role": "system", "content": enriched_system_prompt},
+            *self.memory.get_history()
+        ]
+        
+        # Add user message to memory
+        self.memory.add("user", f"[Message with image] {user_message}")
+        
+        # Encode the image (off the event loop unless cached) while RAG retrieval is in flight
+        image_content = None
+        image_error = None
         try:
             from image_processing import ImageProcessor
-            # Encode image
-            image_content = ImageProcessor.encode_image_base64(image_path)
-            
+            image_content = await ImageProcessor.encode_image_base64_async(image_path)
+        except Exception as e:
+            image_error = e
+        
+        # Get RAG context if enabled
+        rag_context = await rag_task if rag_task else ""
+        
+        # Prepare the multimodal message
+        if image_error is None:
             # Create multimodal message content
             multimodal_content = [
                 {
@@ -133,41 +233,42 @@ class Agent:
                 "content": multimodal_content
             })
             
-        except Exception as e:
+        else:
             # Fall back to text-only if image processing fails
-            logger.error(f"Error processing image: {str(e)}")
+            logger.error(f"Error processing image: {str(image_error)}")
             messages.append({
                 "role": "user",
-                "content": f"{rag_context}\n\n{user_message} [Note: Failed to process image: {str(e)}]" if rag_context else f"{user_message} [Note: Failed to process image: {str(e)}]"
+                "content": f"{rag_context}\n\n{user_message} [Note: Failed to process image: {str(image_error)}]" if rag_context else f"{user_message} [Note: Failed to process image: {str(image_error)}]"
             })
         
-        # Prepare API call
-        kwargs = {
-            "model": self.model,
-            "messages": messages,
-            "max_tokens": self.max_tokens,
-            "temperature": 0.7,
-        }
-        
-        if self.tools:
-            kwargs["tools"] = self._get_tool_definitions()
-        
+        return self._build_request(messages)
+    
+    async def process_message_with_image(self, user_message: str, image_path: str) -> str:
+        """Process a user message with an image and generate a response."""
+        kwargs = await self._prepare_image_request(user_message, image_path)
+        return await self._call_api(kwargs, "with the image")
+    
+    async def stream_response_with_image(self, user_message: str, image_path: str) -> AsyncIterator[str]:
+        """Process a user message with an image and yield the response text as it is generated."""
+        kwargs = await self._prepare_image_request(user_message, image_path)
+        async for delta in self._stream_completion(kwargs):
+            yield delta
+    
+    async def _stream_completion(self, kwargs: Dict[str, Any]) -> AsyncIterator[str]:
+        """Stream text deltas for a prepared request and store the full reply in memory."""
+        chunks = []
         try:
-            # Call the model
-            response = self.client.messages.create(**kwargs)
-            
-            # Update usage statistics
-            self._update_usage_stats(response)
-            
-            # Process response
-            if hasattr(response, 'content'):
-                text_blocks = [block.text for block in response.content if block.type == 'text']
-                assistant_response = ''.join(text_blocks)
-                self.memory.add("assistant", assistant_response)
-                return assistant_response
-            else:
-                return "I apologize, but I encountered an issue processing your request with the image."
+            async with self.client.messages.stream(**kwargs) as stream:
+                async for text in stream.text_stream:
+                    chunks.append(text)
+                    yield text
+                
+                # Update usage statistics from the final message
+                self._update_usage_stats(await stream.get_final_message())
         
         except Exception as e:
-            logger.error(f"API call error: {str(e)}")
-            return f"I encountered an error while processing your request with the image: {str(e)}"
\ No newline at end of file
+            logger.error(f"API streaming error: {str(e)}")
+            yield f"I encountered an error while processing your request: {str(e)}"
+            return
+        
+        self.memory.add("assistant", ''.join(chunks))
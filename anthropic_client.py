@@ -0,0 +1,36 @@
+"""
+Shared Anthropic client for the agent and its tools
+"""
+
+import os
+from typing import Optional
+import httpx
+from anthropic import AsyncAnthropic
+
+try:
+    import h2  # noqa: F401  # Required by httpx for HTTP/2
+except ImportError:
+    h2 = None
+
+_client: Optional[AsyncAnthropic] = None
+
+def get_client() -> AsyncAnthropic:
+    """
+    Get the process-wide async Anthropic client
+
+    The client is created on first use, so its connection pool belongs to the
+    event loop that first awaits it. Sharing one client lets the agent and all
+    Claude-backed tools reuse the same warm connections to the API.
+    """
+    global _client
+    if _client is None:
+        _client = AsyncAnthropic(
+            api_key=os.environ.get("ANTHROPIC_API_KEY"),
+            max_retries=2,
+            http_client=httpx.AsyncClient(
+                http2=h2 is not None,
+                timeout=httpx.Timeout(600.0, connect=5.0),
+                limits=httpx.Limits(max_keepalive_connections=32)
+            )
+        )
+    return _client
@@ -1,9 +1,6 @@
 from typing import List, Dict, Any
 from anthropic_agent.tools import Tool, ToolParameter
-from anthropic import Anthropic, Client
-
-# Initialize Anthropic client
-client = Client(api_key=os.environ.get("ANTHROPIC_API_KEY"))
+from anthropic_client import get_client
 
 def get_cookbook_tools() -> List[Tool]:
     """Get tools for advanced techniques from Anthropic's cookbook."""
@@ -16,7 +13,7 @@ def get_cookbook_tools() -> List[Tool]:
             messages.append({"role": "system", "content": example["system"]})
             messages.append({"role": "user", "content": example["user"]})
         
-        response = client.messages.create(
+        response = await get_client().messages.create(
             model="claude-3-opus-20240229",
             max_tokens=1024,
             messages=messages
@@ -25,7 +22,7 @@ def get_cookbook_tools() -> List[Tool]:
     
     async def chain_of_thought(prompt: str) -> Dict[str, Any]:
         """Generate a response using chain-of-thought reasoning."""
-        response = client.messages.create(
+        response = await get_client().messages.create(
             model="claude-3-opus-20240229",
             max_tokens=1024,
             messages=[
@@ -1,68 +1,87 @@
-from anthropic import Anthropic, Client
-from typing import List, Dict, Any
+import asyncio
+from typing import List, Dict, Any, Iterable, Awaitable
 from anthropic_agent.tools import Tool, ToolParameter
+from anthropic_client import get_client
 
-# Initialize Anthropic client
-client = Client(api_key=os.environ.get("ANTHROPIC_API_KEY"))
+# Maximum number of Claude requests the batch helpers keep in flight
+MAX_CONCURRENT_REQUESTS = 8
 
-def get_claude_tools() -> List[Tool]:
-    """Get tools for Claude language capabilities."""
-    
-    async def summarize_text(text: str) -> Dict[str, Any]:
-        """Summarize a given text using Claude."""
-        response = client.messages.create(
-            model="claude-3-opus-20240229",
-            max_tokens=1024,
-            messages=[
-                {
-                    "role": "user",
-                    "content": f"Summarize the following text:\n\n{text}"
-                }
-            ]
-        )
-        return {"summary": response.content[0].text}
-    
-    async def translate_text(text: str, target_language: str) -> Dict[str, Any]:
-        """Translate a given text to the target language using Claude."""
-        response = client.messages.create(
-            model="claude-3-opus-20240229",
-            max_tokens=1024,
-            messages=[
-                {
-                    "role": "user",
-                    "content": f"Translate the following text to {target_language}:\n\n{text}"
-                }
-            ]
-        )
-        return {"translation": response.content[0].text}
+async def summarize_text(text: str) -> Dict[str, Any]:
+    """Summarize a given text using Claude."""
+    response = await get_client().messages.create(
+        model="claude-3-opus-20240229",
+        max_tokens=1024,
+        messages=[
+            {
+                "role": "user",
+                "content": f"Summarize the following text:\n\n{text}"
+            }
+        ]
+    )
+    return {"summary": response.content[0].text}
+
+async def translate_text(text: str, target_language: str) -> Dict[str, Any]:
+    """Translate a given text to the target language using Claude."""
+    response = await get_client().messages.create(
+        model="claude-3-opus-20240229",
+        max_tokens=1024,
+        messages=[
+            {
+                "role": "user",
+                "content": f"Translate the following text to {target_language}:\n\n{text}"
+            }
+        ]
+    )
+    return {"translation": response.content[0].text}
+
+async def complete_code(prompt: str) -> Dict[str, Any]:
+    """Generate code completion for a given prompt using Claude."""
+    response = await get_client().messages.create(
+        model="claude-3-opus-20240229",
+        max_tokens=1024,
+        messages=[
+            {
+                "role": "user",
+                "content": f"Complete the following code:\n\n{prompt}"
+            }
+        ]
+    )
+    return {"completion": response.content[0].text}
+
+async def explain_code(code: str) -> Dict[str, Any]:
+    """Explain a given piece of code using Claude."""
+    response = await get_client().messages.create(
+        model="claude-3-opus-20240229",
+        max_tokens=1024,
+        messages=[
+            {
+                "role": "user",
+                "content": f"Explain the following code:\n\n{code}"
+            }
+        ]
+    )
+    return {"explanation": response.content[0].text}
+
+async def _gather_bounded(calls: Iterable[Awaitable[Dict[str, Any]]], limit: int = MAX_CONCURRENT_REQUESTS) -> List[Any]:
+    """Run Claude calls concurrently, keeping at most `limit` requests in flight."""
+    semaphore = asyncio.Semaphore(limit)
     
-    async def complete_code(prompt: str) -> Dict[str, Any]:
-        """Generate code completion for a given prompt using Claude."""
-        response = client.messages.create(
-            model="claude-3-opus-20240229",
-            max_tokens=1024,
-            messages=[
-                {
-                    "role": "user",
-                    "content": f"Complete the following code:\n\n{prompt}"
-                }
-            ]
-        )
-        return {"completion": response.content[0].text}
+    async def run(call: Awaitable[Dict[str, Any]]) -> Dict[str, Any]:
+        async with semaphore:
+            return await call
     
-    async def explain_code(code: str) -> Dict[str, Any]:
-        """Explain a given piece of code using Claude."""
-        response = client.messages.create(
-            model="claude-3-opus-20240229",
-            max_tokens=1024,
-            messages=[
-                {
-                    "role": "user",
-                    "content": f"Explain the following code:\n\n{code}"
-                }
-            ]
-        )
-        return {"explanation": response.content[0].text}
+    return await asyncio.gather(*(run(call) for call in calls), return_exceptions=True)
+
+async def summarize_many(texts: List[str]) -> List[Any]:
+    """Summarize several texts concurrently; failed calls are returned as exceptions."""
+    return await _gather_bounded(summarize_text(text) for text in texts)
+
+async def translate_many(texts: List[str], target_language: str) -> List[Any]:
+    """Translate several texts concurrently; failed calls are returned as exceptions."""
+    return await _gather_bounded(translate_text(text, target_language) for text in texts)
+
+def get_claude_tools() -> List[Tool]:
+    """Get tools for Claude language capabilities."""
     
     # Define tools
     return [
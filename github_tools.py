@@ -1,7 +1,60 @@
+import os
+import re
+import time
+import asyncio
+import functools
+import threading
+import weakref
+import httpx
 import requests
-from typing import List, Dict, Any, Optional
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import List, Dict, Any, Optional, Tuple
 from anthropic_agent.tools import Tool, ToolParameter
 
+try:
+    import h2  # noqa: F401  # Required by httpx for HTTP/2
+except ImportError:
+    h2 = None
+
+try:
+    import orjson
+except ImportError:  # Optional speedup; fall back to the standard library
+    orjson = None
+
+# Seconds to wait for a GitHub API response
+REQUEST_TIMEOUT = 10
+
+# Responses retried with exponential backoff, and how many times
+RETRY_STATUSES = (429, 502, 503, 504)
+MAX_RETRIES = 5
+RETRY_BACKOFF = 0.5
+
+# Seconds a cached response is served without revalidation. Lists change
+# often; repository metadata and file contents are kept longer.
+LIST_CACHE_TTL = 60
+DEFAULT_CACHE_TTL = 600
+LIST_ENDPOINT_SUFFIXES = ("/issues", "/pulls", "/search/code")
+MAX_CACHE_ENTRIES = 256
+
+# Results per page for list and search tools; GitHub's own default is 30
+DEFAULT_PER_PAGE = 10
+
+# Qualifiers that scope a code search to something smaller than all of GitHub
+SEARCH_SCOPE_QUALIFIER = re.compile(r"(?:^|\s)(?:repo|org|user|language):\S")
+
+def _query_params(**params: Any) -> Dict[str, Any]:
+    """Build request parameters, leaving out the ones that were not given."""
+    return {name: value for name, value in params.items() if value is not None}
+
+def _parse_json(response) -> Any:
+    """Parse a response body, straight from bytes when orjson is available."""
+    return orjson.loads(response.content) if orjson else response.json()
+
+def _cache_ttl(url: str) -> int:
+    """Get how long a response for a URL may be served from the cache."""
+    return LIST_CACHE_TTL if url.endswith(LIST_ENDPOINT_SUFFIXES) else DEFAULT_CACHE_TTL
+
 class GitHubAPI:
     """GitHub API wrapper with authentication."""
     
@@ -11,55 +64,194 @@ class GitHubAPI:
             "Authorization": f"token {self.token}",
             "Accept": "application/vnd.github.v3+json"
         }
+        
+        # Keep-alive connection pool that backs off on rate limits and server errors
+        retry = Retry(
+            total=MAX_RETRIES,
+            backoff_factor=RETRY_BACKOFF,
+            status_forcelist=list(RETRY_STATUSES),
+            allowed_methods=["GET"],
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        self.session.mount("https://", HTTPAdapter(pool_connections=10, pool_maxsize=20, max_retries=retry))
+        
+        # Responses by (url, params): (etag, data, expiry on the monotonic clock)
+        self._cache: Dict[Tuple[str, frozenset], Tuple[Optional[str], Any, float]] = {}
+        self._cache_lock = threading.Lock()
+        
+        # An httpx client is bound to the event loop it first ran on, so each loop gets its own
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+        self._async_clients_lock = threading.Lock()
+    
+    def _cache_lookup(self, url: str, params: Optional[Dict[str, Any]]):
+        """Get the cache key and any cached entry for a request."""
+        key = (url, frozenset((params or {}).items()))
+        with self._cache_lock:
+            return key, self._cache.get(key)
+    
+    def _cache_store(self, key: Tuple[str, frozenset], etag: Optional[str], data: Any) -> Any:
+        """Cache response data with a fresh expiry and return it."""
+        with self._cache_lock:
+            self._cache.pop(key, None)
+            if len(self._cache) >= MAX_CACHE_ENTRIES:
+                # Evict the entry stored longest ago
+                del self._cache[next(iter(self._cache))]
+            self._cache[key] = (etag, data, time.monotonic() + _cache_ttl(key[0]))
+        return data
+    
+    @staticmethod
+    def _revalidation_headers(entry) -> Optional[Dict[str, str]]:
+        """Headers for a conditional request; a 304 reply costs no rate limit."""
+        if entry and entry[0]:
+            return {"If-None-Match": entry[0]}
+        return None
     
     def get(self, url: str, params: Optional[Dict[str, Any]] = None):
-        """Make a GET request to the GitHub API."""
-        response = requests.get(url, headers=self.headers, params=params)
+        """Make a GET request to the GitHub API, reusing cached responses. Returned data is shared."""
+        key, entry = self._cache_lookup(url, params)
+        if entry and entry[2] > time.monotonic():
+            return entry[1]
+        
+        response = self.session.get(url, params=params, headers=self._revalidation_headers(entry),
+                                    timeout=REQUEST_TIMEOUT)
+        if response.status_code == 304 and entry:
+            return self._cache_store(key, entry[0], entry[1])
+        
+        response.raise_for_status()
+        return self._cache_store(key, response.headers.get("ETag"), _parse_json(response))
+    
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        """HTTP/2 client shared by concurrent tool calls on the running event loop, created on first use there."""
+        loop = asyncio.get_running_loop()
+        with self._async_clients_lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                client = self._async_clients[loop] = httpx.AsyncClient(
+                    http2=h2 is not None,
+                    headers=self.headers,
+                    timeout=REQUEST_TIMEOUT,
+                    limits=httpx.Limits(max_keepalive_connections=20, max_connections=100)
+                )
+        return client
+    
+    async def get_async(self, url: str, params: Optional[Dict[str, Any]] = None):
+        """Make a GET request to the GitHub API without blocking the event loop. Returned data is shared."""
+        key, entry = self._cache_lookup(url, params)
+        if entry and entry[2] > time.monotonic():
+            return entry[1]
+        
+        headers = self._revalidation_headers(entry)
+        for attempt in range(MAX_RETRIES + 1):
+            response = await self.async_client.get(url, params=params, headers=headers)
+            if response.status_code not in RETRY_STATUSES or attempt == MAX_RETRIES:
+                break
+            
+            # Back off, honouring Retry-After when it is given in seconds
+            try:
+                delay = float(response.headers.get("Retry-After", ""))
+            except ValueError:
+                delay = RETRY_BACKOFF * 2 ** attempt
+            await asyncio.sleep(delay)
+        
+        if response.status_code == 304 and entry:
+            return self._cache_store(key, entry[0], entry[1])
+        
         response.raise_for_status()
-        return response.json()
+        return self._cache_store(key, response.headers.get("ETag"), _parse_json(response))
+    
+    async def aclose(self) -> None:
+        """Close the running event loop's async client connections."""
+        with self._async_clients_lock:
+            client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
 
+# Parameter descriptors shared by the GitHub tools
+_OWNER_PARAM = ToolParameter(name="owner", type="string", description="Repository owner")
+_REPO_PARAM = ToolParameter(name="repo", type="string", description="Repository name")
+_DIRECTION_PARAM = ToolParameter(name="direction", type="string", description="Sort direction (asc, desc)", required=False)
+
+_REPO_INFO_PARAMS = [_OWNER_PARAM, _REPO_PARAM]
+_FILE_CONTENTS_PARAMS = [
+    _OWNER_PARAM,
+    _REPO_PARAM,
+    ToolParameter(name="path", type="string", description="File path"),
+    ToolParameter(name="ref", type="string", description="Branch or tag name", required=False)
+]
+_SEARCH_CODE_PARAMS = [
+    ToolParameter(name="query", type="string", description="Search query, including a repo:, org:, user: or language: qualifier"),
+    ToolParameter(name="per_page", type="integer", description="Number of results to return", required=False, default=DEFAULT_PER_PAGE)
+]
+_LIST_ISSUES_PARAMS = [
+    _OWNER_PARAM,
+    _REPO_PARAM,
+    ToolParameter(name="state", type="string", description="Issue state (open, closed, all)", required=False, default="open"),
+    ToolParameter(name="labels", type="string", description="Comma-separated label names to filter by", required=False),
+    ToolParameter(name="sort", type="string", description="Sort by (created, updated, comments)", required=False),
+    _DIRECTION_PARAM,
+    ToolParameter(name="per_page", type="integer", description="Number of issues to return", required=False, default=DEFAULT_PER_PAGE)
+]
+_LIST_PULL_REQUESTS_PARAMS = [
+    _OWNER_PARAM,
+    _REPO_PARAM,
+    ToolParameter(name="state", type="string", description="Pull request state (open, closed, all)", required=False, default="open"),
+    ToolParameter(name="sort", type="string", description="Sort by (created, updated, popularity, long-running)", required=False),
+    _DIRECTION_PARAM,
+    ToolParameter(name="per_page", type="integer", description="Number of pull requests to return", required=False, default=DEFAULT_PER_PAGE)
+]
+
+@functools.lru_cache(maxsize=1)
 def get_github_tools() -> List[Tool]:
-    """Get tools for GitHub API integration."""
+    """Get tools for GitHub API integration. The list is built once and shared; connections are per event loop."""
     github_api = GitHubAPI()
     
     async def get_repo_info(owner: str, repo: str) -> Dict[str, Any]:
         """Get information about a GitHub repository."""
         url = f"https://api.github.com/repos/{owner}/{repo}"
-        return github_api.get(url)
+        return await github_api.get_async(url)
     
     async def get_file_contents(owner: str, repo: str, path: str, ref: Optional[str] = None) -> Dict[str, Any]:
         """Get the contents of a file in a GitHub repository."""
         url = f"https://api.github.com/repos/{owner}/{repo}/contents/{path}"
         params = {"ref": ref} if ref else None
-        return github_api.get(url, params)
+        return await github_api.get_async(url, params)
     
-    async def search_code(query: str) -> Dict[str, Any]:
+    async def search_code(query: str, per_page: int = DEFAULT_PER_PAGE) -> Dict[str, Any]:
         """Search code in GitHub repositories."""
+        if not SEARCH_SCOPE_QUALIFIER.search(query):
+            raise ValueError("Code search needs a repo:, org:, user: or language: qualifier")
+        
         url = "https://api.github.com/search/code"
-        params = {"q": query}
-        return github_api.get(url, params)
+        params = _query_params(q=query, per_page=per_page)
+        return await github_api.get_async(url, params)
     
-    async def list_issues(owner: str, repo: str, state: Optional[str] = "open") -> Dict[str, Any]:
+    async def list_issues(owner: str, repo: str, state: Optional[str] = "open",
+                          labels: Optional[str] = None, sort: Optional[str] = None,
+                          direction: Optional[str] = None,
+                          per_page: int = DEFAULT_PER_PAGE) -> Dict[str, Any]:
         """List issues in a GitHub repository."""
         url = f"https://api.github.com/repos/{owner}/{repo}/issues"
-        params = {"state": state}
-        return github_api.get(url, params)
+        params = _query_params(state=state, labels=labels, sort=sort, direction=direction, per_page=per_page)
+        return await github_api.get_async(url, params)
     
-    async def list_pull_requests(owner: str, repo: str, state: Optional[str] = "open") -> Dict[str, Any]:
+    async def list_pull_requests(owner: str, repo: str, state: Optional[str] = "open",
+                                 sort: Optional[str] = None, direction: Optional[str] = None,
+                                 per_page: int = DEFAULT_PER_PAGE) -> Dict[str, Any]:
         """List pull requests in a GitHub repository."""
         url = f"https://api.github.com/repos/{owner}/{repo}/pulls"
-        params = {"state": state}
-        return github_api.get(url, params)
+        params = _query_params(state=state, sort=sort, direction=direction, per_page=per_page)
+        return await github_api.get_async(url, params)
     
     # Define tools
     return [
         Tool(
             name="get_repo_info",
             description="Get information about a GitHub repository",
-            parameters=[
-                ToolParameter(name="owner", type="string", description="Repository owner"),
-                ToolParameter(name="repo", type="string", description="Repository name")
-            ],
+            parameters=_REPO_INFO_PARAMS,
             function=get_repo_info,
             category="github"
         ),
@@ -67,12 +259,7 @@ def get_github_tools() -> List[Tool]:
         Tool(
             name="get_file_contents",
             description="Get the contents of a file in a GitHub repository",
-            parameters=[
-                ToolParameter(name="owner", type="string", description="Repository owner"),
-                ToolParameter(name="repo", type="string", description="Repository name"),
-                ToolParameter(name="path", type="string", description="File path"),
-                ToolParameter(name="ref", type="string", description="Branch or tag name", required=False)
-            ],
+            parameters=_FILE_CONTENTS_PARAMS,
             function=get_file_contents,
             category="github"
         ),
@@ -80,9 +267,7 @@ def get_github_tools() -> List[Tool]:
         Tool(
             name="search_code",
             description="Search code in GitHub repositories",
-            parameters=[
-                ToolParameter(name="query", type="string", description="Search query")
-            ],
+            parameters=_SEARCH_CODE_PARAMS,
             function=search_code,
             category="github"
         ),
@@ -90,11 +275,7 @@ def get_github_tools() -> List[Tool]:
         Tool(
             name="list_issues",
             description="List issues in a GitHub repository",
-            parameters=[
-                ToolParameter(name="owner", type="string", description="Repository owner"),
-                ToolParameter(name="repo", type="string", description="Repository name"),
-                ToolParameter(name="state", type="string", description="Issue state (open, closed, all)", required=False, default="open")
-            ],
+            parameters=_LIST_ISSUES_PARAMS,
             function=list_issues,
             category="github"
         ),
@@ -102,11 +283,7 @@ def get_github_tools() -> List[Tool]:
         Tool(
             name="list_pull_requests",
             description="List pull requests in a GitHub repository",
-            parameters=[
-                ToolParameter(name="owner", type="string", description="Repository owner"),
-                ToolParameter(name="repo", type="string", description="Repository name"),
-                ToolParameter(name="state", type="string", description="Pull request state (open, closed, all)", required=False, default="open")
-            ],
+            parameters=_LIST_PULL_REQUESTS_PARAMS,
             function=list_pull_requests,
             category="github"
         )
@@ -5,22 +5,373 @@ Enables multimodal capabilities with Claude 3 models
 
 import os
 import json
+import asyncio
 import logging
+import math
 import base64
+import functools
+import hashlib
+import importlib.util
 import mimetypes
-import requests
-from typing import Dict, List, Optional, Any, Union, BinaryIO
+import mmap
+import shutil
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Any, Union, BinaryIO, Tuple
 from pathlib import Path
-from PIL import Image
 import io
-import anthropic
+
+if TYPE_CHECKING:
+    # PIL, requests and the anthropic SDK are imported on first use to keep startup fast
+    from PIL import Image
+    import requests
+
+try:
+    import pybase64
+except ImportError:  # Optional SIMD speedup; fall back to the standard library
+    pybase64 = None
+
+try:
+    import xxhash
+except ImportError:  # Optional faster hashing; fall back to hashlib
+    xxhash = None
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Initialize Anthropic client
-client = anthropic.Anthropic(api_key=os.environ.get("ANTHROPIC_API_KEY"))
+# Number of encoded images and optimized paths kept in memory for re-sends
+ENCODED_IMAGE_CACHE_SIZE = 128
+
+# Total base64 characters of encoded images kept in memory
+ENCODED_IMAGE_CACHE_MAX_BYTES = 128 * 1024 * 1024
+
+# Read size when streaming image downloads to disk
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Connect and read timeout in seconds for image downloads
+DOWNLOAD_TIMEOUT = 30
+
+# Most images Claude accepts in a single message
+MAX_IMAGES_PER_MESSAGE = 20
+
+# Number of file fingerprints remembered by path, modification time and size
+FINGERPRINT_CACHE_SIZE = 1024
+
+# torchvision is imported only when a JPEG is optimized, since importing it is slow
+HAS_TORCHVISION = importlib.util.find_spec("torchvision") is not None
+JPEG_EXTENSIONS = (".jpg", ".jpeg")
+
+# JPEG qualities tried by the torchvision path, best first
+TORCHVISION_JPEG_QUALITIES = (95, 85, 75)
+
+# Pixel budget for images sent to Claude; larger images only cost more tokens and latency
+DEFAULT_MAX_PIXELS = 1_300_000
+
+# PIL JPEG quality search: probe the middle, then step up if it fits or down if not
+JPEG_QUALITY_PROBE = 85
+JPEG_QUALITY_HIGH = 92
+JPEG_QUALITY_FALLBACKS = (75, 70)
+
+# Fast baseline JPEG settings with 4:2:0 chroma subsampling; colour detail is wasted on the vision encoder
+JPEG_SAVE_OPTIONS = {"subsampling": 2, "optimize": False, "progressive": False}
+
+def _b64encode_str(data: bytes) -> str:
+    """Base64-encode bytes to a str, using SIMD kernels when pybase64 is available."""
+    if pybase64:
+        return pybase64.b64encode_as_string(data)
+    return base64.b64encode(data).decode("ascii")
+
+@functools.lru_cache(maxsize=None)
+def _guess_mime_type(extension: str) -> str:
+    """Guess the MIME type for a file extension, defaulting to JPEG."""
+    mime_type, _ = mimetypes.guess_type(f"image{extension}")
+    return mime_type or "image/jpeg"
+
+def _image_block(data: bytes, media_type: str) -> Dict[str, Any]:
+    """Build a Claude base64 image block from raw image bytes."""
+    return {
+        "type": "image",
+        "source": {
+            "type": "base64",
+            "media_type": media_type,
+            "data": _b64encode_str(data)
+        }
+    }
+
+class LRUDictCache:
+    """
+    Thread-safe mapping that evicts the least recently used entries beyond maxsize
+    
+    When max_bytes and sizeof are given, entries are also evicted until the
+    total sizeof of the values fits within max_bytes.
+    """
+    
+    def __init__(self, maxsize: int, max_bytes: Optional[int] = None,
+                 sizeof: Optional[Callable[[Any], int]] = None):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+        self._nbytes = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: Any) -> Any:
+        """Get a value and mark it as recently used, or None if it is missing."""
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+    
+    def put(self, key: Any, value: Any) -> None:
+        """Store a value, evicting the least recently used entry if full."""
+        with self._lock:
+            if self._sizeof is not None:
+                old = self._data.get(key)
+                if old is not None:
+                    self._nbytes -= self._sizeof(old)
+                self._nbytes += self._sizeof(value)
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize or (
+                    self.max_bytes is not None and self._nbytes > self.max_bytes and len(self._data) > 1):
+                _, evicted = self._data.popitem(last=False)
+                if self._sizeof is not None:
+                    self._nbytes -= self._sizeof(evicted)
+    
+    def clear(self) -> None:
+        """Remove all entries."""
+        with self._lock:
+            self._data.clear()
+            self._nbytes = 0
+
+# Content fingerprints by (path, mtime_ns, size), so unchanged files are not rehashed
+_FINGERPRINTS = LRUDictCache(maxsize=FINGERPRINT_CACHE_SIZE)
+
+# Encoded image blocks by (fingerprint, media type); the same bytes at another path share an entry
+_ENCODED_CACHE = LRUDictCache(maxsize=ENCODED_IMAGE_CACHE_SIZE, max_bytes=ENCODED_IMAGE_CACHE_MAX_BYTES,
+                              sizeof=lambda block: len(block["source"]["data"]))
+
+# Stat keys of optimized image files by (fingerprint, max_size_mb, max_width, max_height, max_pixels)
+_OPTIMIZED_PATHS = LRUDictCache(maxsize=ENCODED_IMAGE_CACHE_SIZE)
+
+def _image_stat_key(image_path: str) -> Tuple[str, int, int]:
+    """Identify a file version by path, modification time and size."""
+    stat = os.stat(image_path)
+    return (os.fspath(image_path), stat.st_mtime_ns, stat.st_size)
+
+def _hash_bytes(data: Union[bytes, mmap.mmap]) -> int:
+    """Hash a buffer to a 128-bit fingerprint, using xxh3 when xxhash is available."""
+    if xxhash:
+        return xxhash.xxh3_128_intdigest(data)
+    return int.from_bytes(hashlib.blake2b(data, digest_size=16).digest(), "big")
+
+def _fingerprint(image_path: str) -> int:
+    """Hash a file's contents through a memory map, without copying it into Python."""
+    with open(image_path, "rb") as f:
+        # Empty files cannot be memory-mapped
+        if os.fstat(f.fileno()).st_size == 0:
+            return _hash_bytes(b"")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return _hash_bytes(mm)
+
+def _file_fingerprint(stat_key: Tuple[str, int, int]) -> int:
+    """Get the content fingerprint for a file version, hashing it only once."""
+    fingerprint = _FINGERPRINTS.get(stat_key)
+    if fingerprint is None:
+        fingerprint = _fingerprint(stat_key[0])
+        _FINGERPRINTS.put(stat_key, fingerprint)
+    return fingerprint
+
+def _media_type(image_path: str) -> str:
+    """Get the media type for an image path from its extension."""
+    return _guess_mime_type(os.path.splitext(image_path)[1].lower())
+
+def _cached_image_block(stat_key: Tuple[str, int, int]) -> Optional[Dict[str, Any]]:
+    """Get the encoded block for a file version if it is cached, without touching the file."""
+    fingerprint = _FINGERPRINTS.get(stat_key)
+    if fingerprint is None:
+        return None
+    return _ENCODED_CACHE.get((fingerprint, _media_type(stat_key[0])))
+
+def _encode_image_file(stat_key: Tuple[str, int, int]) -> Dict[str, Any]:
+    """
+    Encode an image file as a Claude image block, reusing cached encodings
+    
+    The returned dict is shared and must not be mutated.
+    """
+    image_path = stat_key[0]
+    media_type = _media_type(image_path)
+    key = (_file_fingerprint(stat_key), media_type)
+    
+    block = _ENCODED_CACHE.get(key)
+    if block is None:
+        with open(image_path, "rb") as image_file:
+            block = _image_block(image_file.read(), media_type)
+        _ENCODED_CACHE.put(key, block)
+    
+    return block
+
+@functools.lru_cache(maxsize=1)
+def _download_session() -> "requests.Session":
+    """Get the shared keep-alive session used for image downloads."""
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+    
+    # Pool connections per host and retry transient connection failures
+    adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32,
+                          max_retries=Retry(total=2, backoff_factor=0.2))
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    
+    # Images are already compressed; don't ask servers to gzip them again
+    session.headers["Accept-Encoding"] = "identity"
+    return session
+
+def _target_size(width: int, height: int, max_width: int, max_height: int,
+                 max_pixels: int) -> Tuple[int, int]:
+    """Get the aspect-preserving size that fits the bounding box and pixel budget."""
+    scale = min(1.0, max_width / width, max_height / height, math.sqrt(max_pixels / (width * height)))
+    if scale >= 1.0:
+        return width, height
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+def _pil_format(img: "Image.Image") -> str:
+    """Get an opened image's format, treating camera multi-picture JPEGs (MPO) as plain JPEG."""
+    return "JPEG" if img.format in (None, "MPO") else img.format
+
+def _already_optimized(image_path: str, max_size_mb: float, max_width: int,
+                       max_height: int, max_pixels: int) -> Optional[str]:
+    """
+    Check whether an image already fits the limits, reading only its header
+    
+    Returns:
+        The image's media type if it needs no optimization, otherwise None
+    """
+    if os.path.getsize(image_path) > max_size_mb * 1024 * 1024:
+        return None
+    
+    from PIL import Image
+    
+    # Image.open parses the header lazily; pixel data is not decoded here
+    with Image.open(image_path) as img:
+        if _target_size(img.width, img.height, max_width, max_height, max_pixels) != img.size:
+            return None
+        return Image.MIME.get(_pil_format(img), _media_type(image_path))
+
+def _optimize_jpeg_torchvision(image_path: str, max_size_mb: float, max_width: int,
+                               max_height: int, max_pixels: int) -> bytes:
+    """
+    Resize and re-encode a JPEG with torchvision's libjpeg-turbo bindings
+    
+    Args:
+        image_path: Path to the JPEG file
+        max_size_mb: Maximum file size in MB
+        max_width: Maximum width in pixels
+        max_height: Maximum height in pixels
+        max_pixels: Maximum number of pixels
+        
+    Returns:
+        The optimized JPEG bytes
+    """
+    from torchvision.io import ImageReadMode, encode_jpeg, read_image
+    from torchvision.transforms.v2 import functional as F
+    
+    image = read_image(image_path, ImageReadMode.RGB)
+    height, width = image.shape[-2:]
+    
+    # One aspect-preserving resize into the bounding box and pixel budget
+    target_width, target_height = _target_size(width, height, max_width, max_height, max_pixels)
+    if (target_width, target_height) != (width, height):
+        image = F.resize(image, [target_height, target_width], antialias=True)
+    
+    max_bytes = max_size_mb * 1024 * 1024
+    for quality in TORCHVISION_JPEG_QUALITIES:
+        encoded = encode_jpeg(image, quality=quality)
+        if encoded.numel() <= max_bytes:
+            break
+    
+    return encoded.numpy().tobytes()
+
+def _encode_jpeg(img: "Image.Image", quality: int) -> bytes:
+    """Encode an image as a baseline, chroma-subsampled JPEG at the given quality."""
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=quality, **JPEG_SAVE_OPTIONS)
+    return buffer.getvalue()
+
+def _encode_jpeg_within(img: "Image.Image", max_bytes: float) -> bytes:
+    """
+    Encode a JPEG at the highest probed quality that fits in max_bytes
+    
+    File size grows with quality, so at most three encodes are needed. The
+    lowest fallback quality is returned even if it is still too large.
+    """
+    data = _encode_jpeg(img, JPEG_QUALITY_PROBE)
+    if len(data) <= max_bytes:
+        higher = _encode_jpeg(img, JPEG_QUALITY_HIGH)
+        return higher if len(higher) <= max_bytes else data
+    
+    for quality in JPEG_QUALITY_FALLBACKS:
+        data = _encode_jpeg(img, quality)
+        if len(data) <= max_bytes:
+            break
+    return data
+
+def _optimize_image_data(image_path: str, max_size_mb: float, max_width: int,
+                         max_height: int, max_pixels: int) -> Tuple[bytes, str]:
+    """
+    Resize and compress an image in memory
+    
+    Args:
+        image_path: Path to the image file
+        max_size_mb: Maximum file size in MB
+        max_width: Maximum width in pixels
+        max_height: Maximum height in pixels
+        max_pixels: Maximum number of pixels
+        
+    Returns:
+        Tuple of the optimized image bytes and their media type
+    """
+    # Send images that are already small enough as they are
+    media_type = _already_optimized(image_path, max_size_mb, max_width, max_height, max_pixels)
+    if media_type:
+        with open(image_path, "rb") as f:
+            return f.read(), media_type
+    
+    # Use the faster torchvision pipeline for JPEGs when it is installed
+    if HAS_TORCHVISION and os.path.splitext(image_path)[1].lower() in JPEG_EXTENSIONS:
+        try:
+            return _optimize_jpeg_torchvision(image_path, max_size_mb, max_width, max_height, max_pixels), "image/jpeg"
+        except Exception as e:
+            logger.warning(f"torchvision optimization failed, falling back to PIL: {str(e)}")
+    
+    from PIL import Image
+    
+    with Image.open(image_path) as img:
+        # Get original format
+        original_format = _pil_format(img)
+        
+        target_size = _target_size(img.width, img.height, max_width, max_height, max_pixels)
+        
+        # Let libjpeg decode large JPEGs at a reduced scale
+        if original_format == "JPEG":
+            img.draft("RGB", target_size)
+        
+        # Resize in place, preserving aspect ratio, if needed
+        if img.size != target_size:
+            img.thumbnail(target_size, Image.LANCZOS)
+        
+        # Save with quality adjustment if JPEG
+        if original_format == "JPEG":
+            return _encode_jpeg_within(img, max_size_mb * 1024 * 1024), "image/jpeg"
+        
+        # For other formats, just save normally
+        buffer = io.BytesIO()
+        img.save(buffer, format=original_format)
+        return buffer.getvalue(), Image.MIME.get(original_format, _media_type(image_path))
 
 class ImageProcessor:
     """Process images for use with Claude 3 models."""
@@ -30,6 +381,9 @@ class ImageProcessor:
         """
         Encode an image as base64 for Claude API
         
+        Results are cached by content fingerprint, so re-sending an unchanged
+        image, or the same image from another path, does not encode it again.
+        
         Args:
             image_path: Path to the image file
             
@@ -37,28 +391,50 @@ class ImageProcessor:
             Dict containing image type and base64-encoded data
         """
         try:
-            with open(image_path, "rb") as image_file:
-                # Get MIME type
-                mime_type, _ = mimetypes.guess_type(image_path)
-                if mime_type is None:
-                    # Default to JPEG if type can't be determined
-                    mime_type = "image/jpeg"
-                
-                # Encode as base64
-                encoded_string = base64.b64encode(image_file.read()).decode("utf-8")
-                
-                return {
-                    "type": "image",
-                    "source": {
-                        "type": "base64",
-                        "media_type": mime_type,
-                        "data": encoded_string
-                    }
-                }
+            return _encode_image_file(_image_stat_key(image_path))
         except Exception as e:
             logger.error(f"Error encoding image: {str(e)}")
             raise
     
+    @staticmethod
+    async def encode_image_base64_async(image_path: str) -> Dict[str, str]:
+        """
+        Encode an image as base64 for Claude API without blocking the event loop
+        
+        Cached images are returned directly; only a cache miss reads and
+        encodes the file in a worker thread.
+        
+        Args:
+            image_path: Path to the image file
+            
+        Returns:
+            Dict containing image type and base64-encoded data
+        """
+        try:
+            stat_key = _image_stat_key(image_path)
+            block = _cached_image_block(stat_key)
+            if block is None:
+                block = await asyncio.to_thread(_encode_image_file, stat_key)
+            return block
+        except Exception as e:
+            logger.error(f"Error encoding image: {str(e)}")
+            raise
+    
+    @staticmethod
+    async def encode_images_base64(image_paths: List[str]) -> List[Dict[str, str]]:
+        """
+        Encode several images concurrently for Claude API
+        
+        Args:
+            image_paths: Paths to the image files
+            
+        Returns:
+            List of image dicts in the same order as image_paths
+        """
+        return list(await asyncio.gather(
+            *(ImageProcessor.encode_image_base64_async(path) for path in image_paths)
+        ))
+    
     @staticmethod
     def encode_image_url(image_url: str) -> Dict[str, str]:
         """
@@ -80,71 +456,120 @@ class ImageProcessor:
     
     @staticmethod
     def optimize_image(image_path: str, max_size_mb: float = 5.0, 
-                       max_width: int = 2000, max_height: int = 2000) -> str:
+                       max_width: int = 2000, max_height: int = 2000,
+                       max_pixels: int = DEFAULT_MAX_PIXELS) -> str:
         """
         Optimize an image for Claude API by resizing and compressing
         
+        Images that already fit the limits are returned unchanged. Repeat
+        optimizations of the same image content with the same limits reuse
+        the earlier output while it is unchanged on disk.
+        
         Args:
             image_path: Path to the image file
             max_size_mb: Maximum file size in MB
             max_width: Maximum width in pixels
             max_height: Maximum height in pixels
+            max_pixels: Maximum number of pixels
             
         Returns:
             Path to the optimized image
         """
         try:
-            # Open the image
-            with Image.open(image_path) as img:
-                # Get original format
-                original_format = img.format
-                if not original_format:
-                    original_format = "JPEG"  # Default format
-                
-                # Check if resizing is needed
-                width, height = img.size
-                if width > max_width or height > max_height:
-                    # Calculate aspect ratio
-                    aspect_ratio = width / height
-                    
-                    if width > max_width:
-                        width = max_width
-                        height = int(width / aspect_ratio)
-                    
-                    if height > max_height:
-                        height = max_height
-                        width = int(height * aspect_ratio)
-                    
-                    # Resize image
-                    img = img.resize((width, height), Image.LANCZOS)
-                
-                # Create output path
-                output_path = f"{os.path.splitext(image_path)[0]}_optimized{os.path.splitext(image_path)[1]}"
-                
-                # Save with quality adjustment if JPEG
-                if original_format == "JPEG":
-                    # Start with high quality and reduce until size is acceptable
-                    quality = 95
-                    while quality > 70:  # Don't go below quality 70
-                        img.save(output_path, format=original_format, quality=quality)
-                        
-                        # Check file size
-                        size_mb = os.path.getsize(output_path) / (1024 * 1024)
-                        if size_mb <= max_size_mb:
-                            break
-                        
-                        # Reduce quality and try again
-                        quality -= 5
-                else:
-                    # For other formats, just save normally
-                    img.save(output_path, format=original_format)
-                
-                return output_path
+            if _already_optimized(image_path, max_size_mb, max_width, max_height, max_pixels):
+                return image_path
+            key = (_file_fingerprint(_image_stat_key(image_path)), max_size_mb, max_width, max_height, max_pixels)
+        except OSError as e:
+            logger.error(f"Error optimizing image: {str(e)}")
+            return image_path
+        
+        # The output name is shared by every image with the same stem, so check it was not rewritten
+        cached = _OPTIMIZED_PATHS.get(key)
+        if cached is not None:
+            try:
+                if _image_stat_key(cached[0]) == cached:
+                    return cached[0]
+            except OSError:
+                pass
+        
+        optimized_path = ImageProcessor._optimize_image_file(image_path, max_size_mb, max_width,
+                                                             max_height, max_pixels)
+        if optimized_path != image_path:
+            try:
+                _OPTIMIZED_PATHS.put(key, _image_stat_key(optimized_path))
+            except OSError:
+                pass
+        return optimized_path
+    
+    @staticmethod
+    def _optimize_image_file(image_path: str, max_size_mb: float, max_width: int,
+                             max_height: int, max_pixels: int) -> str:
+        """
+        Resize and compress an image into a new file
+        
+        Args:
+            image_path: Path to the image file
+            max_size_mb: Maximum file size in MB
+            max_width: Maximum width in pixels
+            max_height: Maximum height in pixels
+            max_pixels: Maximum number of pixels
+            
+        Returns:
+            Path to the optimized image
+        """
+        try:
+            data, _ = _optimize_image_data(image_path, max_size_mb, max_width, max_height, max_pixels)
+            
+            # Create output path
+            output_path = f"{os.path.splitext(image_path)[0]}_optimized{os.path.splitext(image_path)[1]}"
+            with open(output_path, "wb") as f:
+                f.write(data)
+            
+            return output_path
         
         except Exception as e:
             logger.error(f"Error optimizing image: {str(e)}")
             return image_path  # Return original path if optimization fails
     
+    @staticmethod
+    def optimize_image_to_bytes(image_path: str, max_size_mb: float = 5.0,
+                                max_width: int = 2000, max_height: int = 2000,
+                                max_pixels: int = DEFAULT_MAX_PIXELS) -> Tuple[bytes, str]:
+        """
+        Optimize an image for Claude API without writing it to disk
+        
+        Args:
+            image_path: Path to the image file
+            max_size_mb: Maximum file size in MB
+            max_width: Maximum width in pixels
+            max_height: Maximum height in pixels
+            max_pixels: Maximum number of pixels
+            
+        Returns:
+            Tuple of the optimized image bytes and their media type
+        """
+        try:
+            return _optimize_image_data(image_path, max_size_mb, max_width, max_height, max_pixels)
+        except Exception as e:
+            logger.error(f"Error optimizing image: {str(e)}")
+            # Fall back to the original image if optimization fails
+            with open(image_path, "rb") as f:
+                return f.read(), _media_type(image_path)
+    
+    @staticmethod
+    def encode_image_bytes(data: bytes, media_type: str) -> Dict[str, Any]:
+        """
+        Encode in-memory image bytes as base64 for Claude API
+        
+        Args:
+            data: Raw image bytes
+            media_type: MIME type of the image, e.g. "image/jpeg"
+            
+        Returns:
+            Dict containing image type and base64-encoded data
+        """
+        return _image_block(data, media_type)
+    
     @staticmethod
     def download_image(image_url: str, output_dir: str = "downloaded_images") -> str:
         """
@@ -164,18 +589,26 @@ class ImageProcessor:
             # Get filename from URL
             filename = os.path.basename(image_url.split("?")[0])  # Remove query params
             if not filename or "." not in filename:
-                # Generate a filename if none is available
-                filename = f"image_{hash(image_url) % 10000}.jpg"
-            
-            output_path = os.path.join(output_dir, filename)
-            
-            # Download the image
-            response = requests.get(image_url, stream=True)
-            response.raise_for_status()
+                # Generate a stable filename from the URL if none is available
+                url_digest = hashlib.blake2b(image_url.encode(), digest_size=8).hexdigest()
+                output_path = os.path.join(output_dir, f"image_{url_digest}.jpg")
+                
+                # The name is unique to this URL, so an existing file is an earlier download
+                if os.path.exists(output_path):
+                    return output_path
+            else:
+                output_path = os.path.join(output_dir, filename)
             
-            with open(output_path, "wb") as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
+            # Download the image, copying the raw stream to disk in large reads
+            with _download_session().get(image_url, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+                response.raise_for_status()
+                response.raw.decode_content = True
+                
+                # Write to a temporary name so an interrupted download is never reused
+                partial_path = f"{output_path}.part"
+                with open(partial_path, "wb") as f:
+                    shutil.copyfileobj(response.raw, f, length=DOWNLOAD_CHUNK_SIZE)
+                os.replace(partial_path, output_path)
             
             return output_path
         
@@ -183,12 +616,19 @@ class ImageProcessor:
             logger.error(f"Error downloading image: {str(e)}")
             raise
 
+def _prepare_image(image_path: str) -> Dict[str, Any]:
+    """Optimize and encode an image in memory, returning its image block."""
+    data, media_type = ImageProcessor.optimize_image_to_bytes(image_path)
+    return ImageProcessor.encode_image_bytes(data, media_type)
+
 class ImageAnalyzer:
     """Analyze images using Claude 3 models."""
     
     def __init__(self, model: str = "claude-3-opus-20240229"):
         """Initialize the image analyzer."""
-        self.client = client
+        from anthropic_client import get_client
+        
+        self.client = get_client()
         self.model = model
     
     async def analyze_image(self, image_path: str, prompt: str) -> str:
@@ -203,15 +643,11 @@ class ImageAnalyzer:
             Claude's analysis of the image
         """
         try:
-            # Optimize image if needed
-            optimizer = ImageProcessor()
-            optimized_path = optimizer.optimize_image(image_path)
-            
-            # Encode image
-            image_content = optimizer.encode_image_base64(optimized_path)
+            # Optimize and encode the image off the event loop
+            image_content = await asyncio.to_thread(_prepare_image, image_path)
             
             # Create message
-            response = self.client.messages.create(
+            response = await self.client.messages.create(
                 model=self.model,
                 max_tokens=4096,
                 messages=[
@@ -228,19 +664,58 @@ class ImageAnalyzer:
                 ]
             )
             
-            # Clean up optimized image if it's different from original
-            if optimized_path != image_path and os.path.exists(optimized_path):
-                try:
-                    os.remove(optimized_path)
-                except:
-                    pass
-            
             return response.content[0].text
         
         except Exception as e:
             logger.error(f"Error analyzing image: {str(e)}")
             return f"Error analyzing image: {str(e)}"
     
+    async def analyze_images(self, image_paths: List[str], prompt: str) -> str:
+        """
+        Analyze several images together in a single Claude request
+        
+        Args:
+            image_paths: Paths to the image files
+            prompt: Prompt for Claude describing what to analyze across the images
+            
+        Returns:
+            Claude's analysis of the images
+        """
+        try:
+            if not image_paths:
+                raise ValueError("No images given")
+            if len(image_paths) > MAX_IMAGES_PER_MESSAGE:
+                raise ValueError(f"At most {MAX_IMAGES_PER_MESSAGE} images can be analyzed at once")
+            
+            # Optimize and encode all images concurrently off the event loop
+            image_contents = await asyncio.gather(
+                *(asyncio.to_thread(_prepare_image, image_path) for image_path in image_paths)
+            )
+            
+            # Create one message with every image followed by the prompt
+            response = await self.client.messages.create(
+                model=self.model,
+                max_tokens=4096,
+                messages=[
+                    {
+                        "role": "user",
+                        "content": [
+                            *image_contents,
+                            {
+                                "type": "text",
+                                "text": prompt
+                            }
+                        ]
+                    }
+                ]
+            )
+            
+            return response.content[0].text
+        
+        except Exception as e:
+            logger.error(f"Error analyzing images: {str(e)}")
+            return f"Error analyzing images: {str(e)}"
+    
     async def analyze_image_url(self, image_url: str, prompt: str) -> str:
         """
         Analyze an image from a URL using Claude
@@ -257,7 +732,7 @@ class ImageAnalyzer:
             image_content = ImageProcessor.encode_image_url(image_url)
             
             # Create message
-            response = self.client.messages.create(
+            response = await self.client.messages.create(
                 model=self.model,
                 max_tokens=4096,
                 messages=[
@@ -328,6 +803,13 @@ def get_image_tools() -> List:
             "analysis": result
         }
     
+    async def analyze_images_tool(image_paths: List[str], prompt: str) -> Dict[str, Any]:
+        """Analyze several images together with a specific prompt."""
+        result = await image_analyzer.analyze_images(image_paths, prompt)
+        return {
+            "analysis": result
+        }
+    
     async def analyze_image_url_tool(image_url: str, prompt: str) -> Dict[str, Any]:
         """Analyze an image from a URL with a specific prompt."""
         result = await image_analyzer.analyze_image_url(image_url, prompt)
@@ -400,6 +882,17 @@ def get_image_tools() -> List:
             category="image"
         ),
         
+        Tool(
+            name="analyze_images",
+            description="Analyze several related images together in one request, e.g. to compare them",
+            parameters=[
+                ToolParameter(name="image_paths", type="array", description=f"Paths to the image files (up to {MAX_IMAGES_PER_MESSAGE})"),
+                ToolParameter(name="prompt", type="string", description="Prompt for Claude describing what to analyze across the images")
+            ],
+            function=analyze_images_tool,
+            category="image"
+        ),
+        
         Tool(
             name="analyze_image_url",
             description="Analyze an image from a URL with a specific prompt",
@@ -8,19 +8,13 @@ import sys
 import logging
 import asyncio
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from anthropic_agent import Agent
 from github_tools import get_github_tools
 from claude_tools import get_claude_tools
 from system_tools import get_system_tools
 from anthropic_cookbook import get_cookbook_tools
-from agent_cli import AgentCLI
-from structured_schemas import (
-    TextAnalysisResponse, 
-    SearchResultsResponse, 
-    GitHubRepositoryAnalysis,
-    CodeAnalysisResponse,
-    PlanResponse
-)
+from agent_cli import AgentCLI, get_structured_schemas, dump_json_file
 from image_processing import get_image_tools
 
 # Configure logging
@@ -65,32 +59,25 @@ def setup_agent(model=None, use_rag=False):
     # Register tools
     print("Loading tools...")
     
-    github_tools = get_github_tools()
-    agent.register_tools(github_tools)
-    print(f"Registered {len(github_tools)} GitHub tools")
-    
-    claude_tools = get_claude_tools()
-    agent.register_tools(claude_tools)
-    print(f"Registered {len(claude_tools)} Claude language tools")
-    
-    system_tools = get_system_tools()
-    agent.register_tools(system_tools)
-    print(f"Registered {len(system_tools)} system tools")
-    
-    cookbook_tools = get_cookbook_tools()
-    agent.register_tools(cookbook_tools)
-    print(f"Registered {len(cookbook_tools)} cookbook tools")
-    
-    # Register RAG tools if enabled
+    # Build the tool sets concurrently; each loader is independent
+    loaders = [
+        ("GitHub", get_github_tools),
+        ("Claude language", get_claude_tools),
+        ("system", get_system_tools),
+        ("cookbook", get_cookbook_tools),
+    ]
     if use_rag:
-        rag_tools = get_rag_tools()
-        agent.register_tools(rag_tools)
-        print(f"Registered {len(rag_tools)} RAG tools")
+        loaders.append(("RAG", get_rag_tools))
+    loaders.append(("image", get_image_tools))
     
-    # Register image tools
-    image_tools = get_image_tools()
-    agent.register_tools(image_tools)
-    print(f"Registered {len(image_tools)} image tools")
+    with ThreadPoolExecutor(max_workers=len(loaders)) as executor:
+        futures = [(label, executor.submit(loader)) for label, loader in loaders]
+        
+        # Register in a fixed order as each tool set becomes ready
+        for label, future in futures:
+            tools = future.result()
+            agent.register_tools(tools)
+            print(f"Registered {len(tools)} {label} tools")
     
     print(f"Total tools available: {len(agent.tools)}")
     print()
@@ -128,6 +115,9 @@ def parse_arguments():
     parser.add_argument("--image-prompt", type=str, default=None,
                       help="Prompt to use when analyzing an image")
     
+    parser.add_argument("--history-log", type=str, default=None,
+                      help="Append every conversation turn to this JSONL file (default: $KAI_HISTORY_LOG, off if unset)")
+    
     return parser.parse_args()
 
 def main():
@@ -168,13 +158,7 @@ def main():
     # Handle structured output mode
     if args.structured:
         # Get available schemas
-        schemas = {
-            "text_analysis": TextAnalysisResponse,
-            "search_results": SearchResultsResponse,
-            "github_repo": GitHubRepositoryAnalysis,
-            "code_analysis": CodeAnalysisResponse,
-            "plan": PlanResponse
-        }
+        schemas = get_structured_schemas()
         
         if args.structured not in schemas:
             print(f"Error: Unknown schema '{args.structured}'")
@@ -193,9 +177,7 @@ def main():
         
         # Output the result
         if args.output:
-            import json
-            with open(args.output, 'w') as f:
-                json.dump(result, f, indent=2)
+            dump_json_file(args.output, result)
             print(f"Result saved to: {args.output}")
         else:
             import json
@@ -204,8 +186,11 @@ def main():
         return
     
     # Run CLI
-    cli = AgentCLI(agent, use_streaming=not args.no_streaming)
-    cli.run()
+    cli = AgentCLI(agent, use_streaming=not args.no_streaming, history_log=args.history_log)
+    try:
+        cli.run()
+    finally:
+        cli.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
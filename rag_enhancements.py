@@ -6,11 +6,23 @@ Adds support for more document formats, hybrid search, and metadata filtering
 import os
 import io
 import re
+import csv
+import asyncio
 import json
 import logging
+import math
+import mmap
+import atexit
+import threading
+import multiprocessing
 import hashlib
+import weakref
 import numpy as np
-from typing import Dict, List, Optional, Any, Tuple, Union
+from collections import Counter
+from contextlib import contextmanager
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from typing import Awaitable, Callable, Dict, List, Optional, Any, Sequence, Set, Tuple, Union
 from datetime import datetime
 from pathlib import Path
 
@@ -21,10 +33,119 @@ import pandas as pd
 import openpyxl
 from bs4 import BeautifulSoup
 
+try:
+    import fitz  # PyMuPDF
+except ImportError:  # Optional faster PDF backend; fall back to PyPDF2
+    fitz = None
+
+try:
+    from numba import njit
+except ImportError:  # Optional JIT for keyword scoring; fall back to numpy slices
+    njit = None
+
+try:
+    import lxml  # noqa: F401  # C-backed parser for BeautifulSoup
+except ImportError:  # Fall back to the pure-Python html.parser
+    lxml = None
+
+try:
+    import xxhash
+except ImportError:  # Optional faster hashing; fall back to hashlib
+    xxhash = None
+
+try:
+    import orjson
+except ImportError:  # Optional speedup; fall back to the standard library
+    orjson = None
+
+try:
+    import simsimd
+except ImportError:  # Optional SIMD similarity kernels; fall back to numpy BLAS
+    simsimd = None
+
+try:
+    import faiss
+except ImportError:  # Optional ANN index for large collections; fall back to brute force
+    faiss = None
+
 # Logging configuration
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Embedding rows quantized or scored per block, bounding temporary float32 copies
+SEARCH_BLOCK_ROWS = 4096
+
+# Texts per embedding provider call, and how long a partial batch waits for more
+EMBEDDING_BATCH_SIZE = 64
+EMBEDDING_BATCH_WAIT_MS = 10
+
+# Int8 candidates per requested result that are re-scored against the float32 rows
+RERANK_OVERSAMPLE = 4
+
+# Collections with at least this many embeddings are searched through an HNSW index when faiss is available
+ANN_MIN_ROWS = 20000
+ANN_HNSW_M = 32
+ANN_EF_CONSTRUCTION = 200
+ANN_EF_SEARCH = 64
+
+# Deleted embedding rows stay in the store as tombstones until they are this fraction of it
+COMPACT_DELETED_FRACTION = 0.25
+
+# HTML text cleanup: runs of spaces or tabs, and line breaks with surrounding whitespace
+_SPACE_RUN_RE = re.compile(r'[ \t]+')
+_LINE_BREAK_RE = re.compile(r'\s*\n\s*')
+
+def _hex_digest(data) -> str:
+    """Hash a buffer to a 128-bit hex digest, using xxh3 when xxhash is available."""
+    if xxhash:
+        return xxhash.xxh3_128_hexdigest(data)
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def _file_content_hash(file_path: Union[str, Path]) -> str:
+    """Hash a file's bytes for deduplication, reading them through a memory map."""
+    with open(file_path, "rb") as f:
+        # mmap can't map an empty file
+        if os.fstat(f.fileno()).st_size == 0:
+            return _hex_digest(b"")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return _hex_digest(data)
+
+# PDFs with more pages than this are split into ranges of at least this many pages across processes
+PDF_PARALLEL_MIN_PAGES = 32
+
+def _pdf_page_count(file_path: str) -> int:
+    """Count the pages of a PDF."""
+    if fitz:
+        with fitz.open(file_path) as doc:
+            return doc.page_count
+    with open(file_path, "rb") as file:
+        return len(PyPDF2.PdfReader(file).pages)
+
+def _extract_pdf_pages(file_path: str, start: int, stop: int) -> List[str]:
+    """Extract the text of pages start to stop of a PDF; also run in worker processes."""
+    # Use MuPDF's C text extraction when PyMuPDF is installed
+    if fitz:
+        with fitz.open(file_path) as doc:
+            return [doc[i].get_text("text") for i in range(start, stop)]
+    with open(file_path, "rb") as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        return [pdf_reader.pages[i].extract_text() for i in range(start, stop)]
+
+# Process pool shared by every PDF extraction, created on first use
+_pdf_pool: Optional[ProcessPoolExecutor] = None
+_pdf_pool_lock = threading.Lock()
+
+def _pdf_executor() -> ProcessPoolExecutor:
+    """Get the shared PDF worker pool, so concurrent extractions never run more than one process per CPU."""
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            # Forking a threaded process can copy held locks into the child, so start workers fresh
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _pdf_pool = ProcessPoolExecutor(max_workers=os.cpu_count() or 1,
+                                            mp_context=multiprocessing.get_context(method))
+        return _pdf_pool
+
 class DocumentProcessor:
     """Process various document formats for RAG system."""
     
@@ -32,13 +153,19 @@ class DocumentProcessor:
     def extract_text_from_pdf(file_path: str) -> str:
         """Extract text from a PDF file."""
         try:
-            text = ""
-            with open(file_path, "rb") as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                for page_num in range(len(pdf_reader.pages)):
-                    page = pdf_reader.pages[page_num]
-                    text += page.extract_text() + "\n\n"
-            return text
+            page_count = _pdf_page_count(file_path)
+            workers = min(os.cpu_count() or 1, math.ceil(page_count / PDF_PARALLEL_MIN_PAGES))
+            
+            # Pages parse independently, so large PDFs are split into page ranges across processes
+            if page_count > PDF_PARALLEL_MIN_PAGES and workers > 1:
+                bounds = [page_count * i // workers for i in range(workers + 1)]
+                ranges = _pdf_executor().map(_extract_pdf_pages, [file_path] * workers, bounds[:-1], bounds[1:])
+                pages = [page for page_range in ranges for page in page_range]
+            else:
+                pages = _extract_pdf_pages(file_path, 0, page_count)
+            
+            # Join once rather than concatenating page by page
+            return "".join(f"{page}\n\n" for page in pages)
         except Exception as e:
             logger.error(f"Error extracting text from PDF {file_path}: {str(e)}")
             raise
@@ -48,39 +175,54 @@ class DocumentProcessor:
         """Extract text from a DOCX file."""
         try:
             doc = docx.Document(file_path)
-            text = ""
-            for paragraph in doc.paragraphs:
-                text += paragraph.text + "\n"
+            
+            # Collect lines and join once rather than concatenating as we go
+            parts = [f"{paragraph.text}\n" for paragraph in doc.paragraphs]
             for table in doc.tables:
                 for row in table.rows:
-                    for cell in row.cells:
-                        text += cell.text + "\t"
-                    text += "\n"
-            return text
+                    parts.append("".join(f"{cell.text}\t" for cell in row.cells) + "\n")
+            return "".join(parts)
         except Exception as e:
             logger.error(f"Error extracting text from DOCX {file_path}: {str(e)}")
             raise
     
     @staticmethod
     def extract_text_from_excel(file_path: str) -> str:
-        """Extract text from an Excel file."""
+        """Extract text from an Excel file, streaming rows as tab-separated lines."""
         try:
-            df_dict = pd.read_excel(file_path, sheet_name=None)
-            text = ""
-            for sheet_name, df in df_dict.items():
-                text += f"Sheet: {sheet_name}\n"
-                text += df.to_string(index=False) + "\n\n"
-            return text
+            # openpyxl only reads xlsx; legacy xls files go through pandas
+            if Path(file_path).suffix.lower() == ".xls":
+                df_dict = pd.read_excel(file_path, sheet_name=None)
+                text = ""
+                for sheet_name, df in df_dict.items():
+                    text += f"Sheet: {sheet_name}\n"
+                    text += df.to_string(index=False) + "\n\n"
+                return text
+            
+            parts = []
+            workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+            try:
+                for sheet in workbook.worksheets:
+                    parts.append(f"Sheet: {sheet.title}\n")
+                    for row in sheet.iter_rows(values_only=True):
+                        parts.append("\t".join("" if value is None else str(value) for value in row) + "\n")
+                    parts.append("\n")
+            finally:
+                workbook.close()
+            return "".join(parts)
         except Exception as e:
             logger.error(f"Error extracting text from Excel {file_path}: {str(e)}")
             raise
     
     @staticmethod
     def extract_text_from_csv(file_path: str) -> str:
-        """Extract text from a CSV file."""
+        """Extract text from a CSV file, streaming rows as tab-separated lines."""
         try:
-            df = pd.read_csv(file_path)
-            return df.to_string(index=False)
+            # Re-delimit rows as they are read; the values stay text, so there is nothing to parse into a DataFrame
+            buffer = io.StringIO()
+            with open(file_path, "r", encoding="utf-8", newline="") as file:
+                csv.writer(buffer, delimiter="\t", lineterminator="\n").writerows(csv.reader(file))
+            return buffer.getvalue()
         except Exception as e:
             logger.error(f"Error extracting text from CSV {file_path}: {str(e)}")
             raise
@@ -92,25 +234,15 @@ class DocumentProcessor:
             with open(file_path, "r", encoding="utf-8") as file:
                 html_content = file.read()
             
-            soup = BeautifulSoup(html_content, "html.parser")
+            soup = BeautifulSoup(html_content, "lxml" if lxml else "html.parser")
             
             # Remove script and style elements
             for script in soup(["script", "style"]):
-                script.extract()
-            
-            # Get text
-            text = soup.get_text()
-            
-            # Break into lines and remove leading and trailing space on each
-            lines = (line.strip() for line in text.splitlines())
+                script.decompose()
             
-            # Break multi-headlines into a line each
-            chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-            
-            # Join the non-empty lines
-            text = "\n".join(chunk for chunk in chunks if chunk)
-            
-            return text
+            # Collapse spaces, then trim lines and drop blank ones in the same pass
+            text = _SPACE_RUN_RE.sub(" ", soup.get_text())
+            return _LINE_BREAK_RE.sub("\n", text).strip()
         except Exception as e:
             logger.error(f"Error extracting text from HTML {file_path}: {str(e)}")
             raise
@@ -126,35 +258,36 @@ class DocumentProcessor:
             "extension": extension,
             "size_bytes": os.path.getsize(file_path),
             "last_modified": datetime.fromtimestamp(os.path.getmtime(file_path)).isoformat(),
-            "processed_at": datetime.now().isoformat()
+            "processed_at": datetime.now().isoformat(),
+            "content_hash": _file_content_hash(file_path)
         }
         
         try:
             if extension == ".pdf":
                 text = DocumentProcessor.extract_text_from_pdf(file_path)
                 metadata["type"] = "pdf"
-                
+            
             elif extension == ".docx":
                 text = DocumentProcessor.extract_text_from_docx(file_path)
                 metadata["type"] = "docx"
-                
+            
             elif extension in [".xlsx", ".xls"]:
                 text = DocumentProcessor.extract_text_from_excel(file_path)
                 metadata["type"] = "excel"
-                
+            
             elif extension == ".csv":
                 text = DocumentProcessor.extract_text_from_csv(file_path)
                 metadata["type"] = "csv"
-                
+            
             elif extension in [".html", ".htm"]:
                 text = DocumentProcessor.extract_text_from_html(file_path)
                 metadata["type"] = "html"
-                
+            
             elif extension in [".txt", ".md", ".py", ".js", ".java", ".c", ".cpp", ".cs", ".json", ".xml"]:
                 with open(file_path, "r", encoding="utf-8") as file:
                     text = file.read()
                 metadata["type"] = "text"
-                
+            
             else:
                 # Try to read as text, but may fail for binary files
                 try:
@@ -174,104 +307,231 @@ class DocumentProcessor:
             logger.error(f"Error processing file {file_path}: {str(e)}")
             raise
 
-class HybridSearcher:
-    """Hybrid search combining vector and keyword search."""
+if njit:
+    @njit(cache=True)
+    def _accumulate_postings(term_ids, postings_ptr, postings_rows, postings_tf, scores):
+        """Add the postings of each query term into scores."""
+        for term in term_ids:
+            for i in range(postings_ptr[term], postings_ptr[term + 1]):
+                scores[postings_rows[i]] += postings_tf[i]
+else:
+    def _accumulate_postings(term_ids, postings_ptr, postings_rows, postings_tf, scores):
+        """Add the postings of each query term into scores."""
+        for term in term_ids:
+            start, end = postings_ptr[term], postings_ptr[term + 1]
+            scores[postings_rows[start:end]] += postings_tf[start:end]
+
+def _read_json(path: Union[str, Path]) -> Any:
+    """Read JSON data from a file."""
+    with open(path, "rb") as f:
+        content = f.read()
+    return orjson.loads(content) if orjson else json.loads(content)
+
+def _write_json(path: Union[str, Path], data: Any) -> None:
+    """Write data to a file as indented JSON."""
+    if orjson:
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+
+# Word tokens for keyword indexing and queries
+_TOKEN_RE = re.compile(r'\b\w+\b')
+
+@lru_cache(maxsize=1024)
+def _tokenize(query: str) -> Tuple[str, ...]:
+    """Split a query into lowercase word tokens, memoized for repeated queries."""
+    return tuple(_TOKEN_RE.findall(query.lower()))
+
+class KeywordIndex:
+    """Inverted index from lowercase tokens to the chunks containing them."""
     
-    def __init__(self, vector_store):
-        """Initialize the hybrid searcher."""
-        self.vector_store = vector_store
+    def __init__(self, chunks: List[Dict[str, Any]]):
+        """Build the index over a list of chunk dicts."""
+        self.chunks = chunks
+        
+        # Lowercased once here, for tokenizing and for phrase checks at query time
+        self.contents_lower = [chunk["content"].lower() for chunk in chunks]
+        
+        # Token -> (chunk rows, term frequencies)
+        postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        for row, content_lower in enumerate(self.contents_lower):
+            for token, tf in Counter(_TOKEN_RE.findall(content_lower)).items():
+                rows, tfs = postings.setdefault(token, ([], []))
+                rows.append(row)
+                tfs.append(tf)
+        
+        # Flatten into contiguous arrays; term i's postings are ptr[i]:ptr[i + 1]
+        self.vocabulary: Dict[str, int] = {token: i for i, token in enumerate(postings)}
+        lengths = [len(rows) for rows, _ in postings.values()]
+        self.postings_ptr = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=self.postings_ptr[1:])
+        self.postings_rows = np.fromiter(
+            (row for rows, _ in postings.values() for row in rows), dtype=np.int32, count=self.postings_ptr[-1]
+        )
+        self.postings_tf = np.fromiter(
+            (tf for _, tfs in postings.values() for tf in tfs), dtype=np.float32, count=self.postings_ptr[-1]
+        )
     
-    def _keyword_search(self, query: str, chunks: List[Dict[str, Any]], top_k: int = 10) -> List[Dict[str, Any]]:
-        """Search chunks using keywords."""
-        # Convert query to lowercase
+    def search(self, query: str, top_k: int = 10) -> List[Dict[str, Any]]:
+        """Score chunks by query term frequency, walking only the query terms' postings."""
         query_lower = query.lower()
+        keywords = _tokenize(query)
         
-        # Extract keywords (simple tokenization)
-        keywords = re.findall(r'\b\w+\b', query_lower)
+        # Repeated query terms count once per occurrence, as they always have
+        term_ids = np.array([self.vocabulary[k] for k in keywords if k in self.vocabulary], dtype=np.int64)
+        scores = np.zeros(len(self.chunks), dtype=np.float32)
+        _accumulate_postings(term_ids, self.postings_ptr, self.postings_rows, self.postings_tf, scores)
         
-        # Score each chunk based on keyword matches
-        scored_chunks = []
-        for chunk in chunks:
-            content_lower = chunk["content"].lower()
-            
-            # Count keyword occurrences
-            score = sum(content_lower.count(keyword) for keyword in keywords)
+        # Boost exact phrase matches, checking only chunks that matched a term
+        candidates = np.flatnonzero(scores)
+        for row in candidates:
+            if query_lower in self.contents_lower[row]:
+                scores[row] += 3
+        
+        # Sort candidates by score (descending) and return the top_k
+        top = candidates[np.argsort(-scores[candidates], kind="stable")][:top_k]
+        return [{"chunk": self.chunks[row], "score": float(scores[row])} for row in top]
+
+class EmbeddingBatcher:
+    """
+    Coalesce concurrent embedding requests into batched provider calls
+    
+    Texts from any number of callers are queued and a background task sends
+    them to embed_many in batches of up to batch_size. A batch waits up to
+    max_wait_ms for more texts unless it is already full. While one call is
+    in flight, new texts accumulate for the next one.
+    """
+    
+    def __init__(self, embed_many: Callable[[List[str]], Awaitable[Sequence[Sequence[float]]]],
+                 batch_size: int = EMBEDDING_BATCH_SIZE, max_wait_ms: float = EMBEDDING_BATCH_WAIT_MS):
+        """Initialize the batcher around a function embedding a list of texts in one call."""
+        self.embed_many = embed_many
+        self.batch_size = batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+    
+    def _ensure_worker(self):
+        """Start the batching task on the running event loop if it isn't running."""
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+    
+    async def _run(self):
+        """Collect queued texts into batches and resolve each caller's future."""
+        while True:
+            batch = [await self._queue.get()]
+            if self._queue.qsize() < self.batch_size - 1:
+                await asyncio.sleep(self.max_wait)
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
             
-            # Boost score for exact phrase match
-            if query_lower in content_lower:
-                score += 3
+            try:
+                embeddings = await self.embed_many([text for text, _ in batch])
+                if len(embeddings) != len(batch):
+                    raise ValueError(f"Embedding provider returned {len(embeddings)} embeddings for {len(batch)} texts")
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
             
-            if score > 0:
-                scored_chunks.append({
-                    "chunk": chunk,
-                    "score": score
-                })
-        
-        # Sort by score (descending)
-        scored_chunks.sort(key=lambda x: x["score"], reverse=True)
+            for (_, future), embedding in zip(batch, embeddings):
+                if not future.done():
+                    future.set_result(embedding)
+    
+    async def embed(self, text: str) -> Sequence[float]:
+        """Embed one text as part of the next batch."""
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((text, future))
+        return await future
+    
+    async def embed_all(self, texts: List[str]) -> List[Sequence[float]]:
+        """Embed several texts, sharing batches with any concurrent callers."""
+        return list(await asyncio.gather(*(self.embed(text) for text in texts)))
+    
+    async def close(self):
+        """Stop the batching task."""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+class HybridSearcher:
+    """Hybrid search combining vector and keyword search."""
+    
+    def __init__(self, vector_store):
+        """Initialize the hybrid searcher."""
+        self.vector_store = vector_store
         
-        # Return top_k results
-        return scored_chunks[:top_k]
+        # Keyword index and the chunk directory modification time it was built at
+        self._keyword_index: Optional[KeywordIndex] = None
+        self._keyword_index_mtime: Optional[int] = None
+    
+    def _get_keyword_index(self) -> KeywordIndex:
+        """Get the keyword index, rebuilding it when chunk files were added or removed."""
+        mtime = self.vector_store.chunks_dir.stat().st_mtime_ns
+        if self._keyword_index is None or mtime != self._keyword_index_mtime:
+            chunks = []
+            for chunk_path in self.vector_store.chunks_dir.glob("*.json"):
+                chunks.append(_read_json(chunk_path))
+            self._keyword_index = KeywordIndex(chunks)
+            self._keyword_index_mtime = mtime
+        return self._keyword_index
+    
+    def _keyword_search(self, query: str, top_k: int = 10) -> List[Dict[str, Any]]:
+        """Search chunks using keywords."""
+        return self._get_keyword_index().search(query, top_k)
     
     async def hybrid_search(self, query: str, top_k: int = 5, vector_weight: float = 0.7) -> List[Dict[str, Any]]:
         """Perform hybrid search combining vector and keyword search."""
-        # Get all chunks for keyword search
-        all_chunks = []
-        for chunk_path in self.vector_store.chunks_dir.glob("*.json"):
-            with open(chunk_path, 'r') as f:
-                chunk_dict = json.load(f)
-                all_chunks.append(chunk_dict)
-        
         # Perform keyword search
-        keyword_results = self._keyword_search(query, all_chunks, top_k=top_k*2)  # Get more for reranking
+        keyword_results = self._keyword_search(query, top_k=top_k*2)  # Get more for reranking
         
         # Perform vector search
         vector_results = await self.vector_store.search(query, top_k=top_k*2)  # Get more for reranking
         
-        # Combine results
-        combined_results = {}
-        
-        # Add vector results with their scores
+        # Chunk dicts by id; keyword hits already carry theirs
+        chunks = {result["chunk"]["id"]: result["chunk"] for result in keyword_results}
         for result in vector_results:
-            chunk_id = result.chunk.id
-            combined_results[chunk_id] = {
-                "chunk": result.chunk,
-                "vector_score": result.score,
-                "keyword_score": 0,
-                "combined_score": result.score * vector_weight
-            }
+            chunks.setdefault(result.chunk.id, result.chunk)
         
-        # Add keyword results with their scores
-        for result in keyword_results:
-            chunk_id = result["chunk"]["id"]
-            
-            # Normalize keyword score (divide by max possible score)
-            max_keyword_score = len(re.findall(r'\b\w+\b', query.lower())) + 3  # +3 for exact phrase match
-            normalized_keyword_score = result["score"] / max_keyword_score if max_keyword_score > 0 else 0
-            
-            if chunk_id in combined_results:
-                combined_results[chunk_id]["keyword_score"] = normalized_keyword_score
-                combined_results[chunk_id]["combined_score"] += normalized_keyword_score * (1 - vector_weight)
-            else:
-                combined_results[chunk_id] = {
-                    "chunk": result["chunk"],
-                    "vector_score": 0,
-                    "keyword_score": normalized_keyword_score,
-                    "combined_score": normalized_keyword_score * (1 - vector_weight)
-                }
+        vector_ids = np.array([result.chunk.id for result in vector_results], dtype=object)
+        keyword_ids = np.array([result["chunk"]["id"] for result in keyword_results], dtype=object)
+        ids = np.union1d(vector_ids, keyword_ids)
+        if not len(ids):
+            return []
+        
+        # Gather both score sets onto the union of candidate ids
+        vector_scores = np.zeros(len(ids))
+        vector_scores[np.searchsorted(ids, vector_ids)] = [result.score for result in vector_results]
+        
+        # Normalize keyword scores by the best possible score (+3 for exact phrase match)
+        max_keyword_score = len(_tokenize(query)) + 3
+        keyword_scores = np.zeros(len(ids))
+        keyword_scores[np.searchsorted(ids, keyword_ids)] = [result["score"] / max_keyword_score for result in keyword_results]
         
-        # Sort by combined score
-        sorted_results = sorted(combined_results.values(), key=lambda x: x["combined_score"], reverse=True)
+        # Fuse in one weighted add and select the top_k
+        combined_scores = vector_weight * vector_scores + (1 - vector_weight) * keyword_scores
+        top = np.argsort(-combined_scores, kind="stable")[:top_k]
         
         # Format results
         formatted_results = []
-        for result in sorted_results[:top_k]:
-            chunk = result["chunk"]
+        for i in top:
+            chunk = chunks[ids[i]]
+            if not isinstance(chunk, dict):
+                chunk = chunk.dict()
             formatted_results.append({
                 "content": chunk["content"],
-                "score": result["combined_score"],
-                "vector_score": result["vector_score"],
-                "keyword_score": result["keyword_score"],
+                "score": float(combined_scores[i]),
+                "vector_score": float(vector_scores[i]),
+                "keyword_score": float(keyword_scores[i]),
                 "metadata": {
                     **chunk["metadata"],
                     "document_id": chunk["document_id"]
@@ -280,6 +540,35 @@ class HybridSearcher:
         
         return formatted_results
 
+def _quantize_int8(rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Quantize float rows to int8 with per-row scales mapping each row's largest component to 127."""
+    scales = np.abs(rows).max(axis=1, initial=0.0) / 127
+    scales[scales == 0] = 1.0
+    return np.round(rows / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+def batch_cosine(queries: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+    """
+    Cosine similarity of every query row against every matrix row
+    
+    Args:
+        queries: (B, d) query vectors
+        matrix: (N, d) stored vectors, of the same dtype as queries
+    
+    Returns:
+        (B, N) float32 similarities; zero vectors score 0 against nonzero ones
+    """
+    if simsimd is not None:
+        # SimSIMD's kernels normalize both sides and read int8 rows without upcasting
+        return 1 - np.asarray(simsimd.cdist(queries, matrix, metric="cosine"), dtype=np.float32)
+    
+    queries = np.asarray(queries, dtype=np.float32)
+    matrix = np.asarray(matrix, dtype=np.float32)
+    query_norms = np.linalg.norm(queries, axis=1, keepdims=True)
+    row_norms = np.linalg.norm(matrix, axis=1)
+    query_norms[query_norms == 0] = 1.0
+    row_norms[row_norms == 0] = 1.0
+    return (queries / query_norms) @ (matrix / row_norms[:, None]).T
+
 class DocumentCollection:
     """Collection of documents with namespacing."""
     
@@ -290,6 +579,10 @@ class DocumentCollection:
         self.documents_dir = self.storage_dir / "documents"
         self.chunks_dir = self.storage_dir / "chunks"
         self.metadata_path = self.storage_dir / "metadata.json"
+        self.embeddings_path = self.storage_dir / "embeddings.f32"
+        self.chunk_ids_path = self.storage_dir / "chunk_ids.tsv"
+        self.deleted_ids_path = self.storage_dir / "deleted_ids.txt"
+        self.ann_index_path = self.storage_dir / "embeddings.hnsw"
         self.metadata = {
             "name": name,
             "document_count": 0,
@@ -298,48 +591,407 @@ class DocumentCollection:
             "created_at": datetime.now().isoformat()
         }
         
+        # Chunk index rows of (chunk_id, document_id, embedding row or -1), loaded on first use.
+        # Rows of deleted chunks stay listed until compaction but are dropped from the lookups.
+        self._rows: Optional[List[Tuple[str, str, int]]] = None
+        self._row_of: Dict[str, int] = {}
+        self._chunks_of: Dict[str, List[str]] = {}
+        
+        # Embedding rows of deleted chunks, skipped by search until the store is compacted
+        self._deleted_rows: Set[int] = set()
+        
+        # Row-normalized embeddings quantized to int8 with per-row scales, built on first search
+        self._emb_q8: Optional[np.ndarray] = None
+        self._emb_scales: Optional[np.ndarray] = None
+        self._emb_chunk_ids: List[str] = []
+        
+        # HNSW index over the normalized embeddings, used instead of int8 rows for large collections.
+        # After appends the previous graph is kept to be extended rather than reloaded from disk.
+        self._ann = None
+        self._ann_base = None
+        self._ann_unsaved = False
+        
+        # Nesting depth of bulk_mode(); index writes wait until it returns to 0
+        self._bulk_depth = 0
+        
+        # Count updates are kept in memory until flush()
+        self._metadata_dirty = False
+        
+        # Total bytes on disk, recomputed after the next change
+        self._size_cache: Optional[int] = None
+        
         # Create directories if they don't exist
         self.documents_dir.mkdir(parents=True, exist_ok=True)
         self.chunks_dir.mkdir(parents=True, exist_ok=True)
         
         # Load metadata if it exists
         if self.metadata_path.exists():
-            with open(self.metadata_path, 'r') as f:
-                self.metadata = json.load(f)
+            self.metadata = _read_json(self.metadata_path)
+    
+    def _load_rows(self):
+        """Load the chunk index, migrating chunk files with inline embeddings first."""
+        if not self.chunk_ids_path.exists():
+            self._migrate_chunk_files()
+        
+        rows = []
+        torn = False
+        with open(self.chunk_ids_path, 'r') as f:
+            for line in f:
+                # A line cut short by an interrupted append has no usable entry
+                if not line.endswith("\n"):
+                    torn = True
+                    break
+                chunk_id, document_id, row = line.rstrip("\n").split("\t")
+                rows.append((chunk_id, document_id, int(row)))
+        rows = self._repair_store(rows, torn)
+        
+        deleted_ids = set()
+        if self.deleted_ids_path.exists():
+            with open(self.deleted_ids_path, 'r') as f:
+                deleted_ids = {line.rstrip("\n") for line in f}
+        
+        self._set_rows(rows, deleted_ids)
+    
+    def _repair_store(self, rows: List[Tuple[str, str, int]], torn: bool = False) -> List[Tuple[str, str, int]]:
+        """
+        Bring the embedding store and chunk index back to the same number of rows
+        
+        Chunks are added by appending their embeddings and then their index
+        entries, so an interrupted add can leave embedding rows no entry
+        refers to, or entries past the end of the store. Later appends number
+        rows by the store's size, so orphan rows are truncated away, and
+        entries without a complete row are kept unembedded. The index is
+        rewritten without a torn last line or with the unembedded entries.
+        """
+        dim = self.metadata.get("embedding_dim")
+        row_bytes = (dim or 0) * np.dtype(np.float32).itemsize
+        size = self.embeddings_path.stat().st_size if self.embeddings_path.exists() else 0
+        stored = size // row_bytes if row_bytes else 0
+        indexed = max((row for _, _, row in rows), default=-1) + 1
+        
+        if indexed > stored:
+            logger.warning(f"Chunk index of {self.name} refers to {indexed - stored} missing embedding rows; leaving them unembedded")
+            rows = [(chunk_id, document_id, row if row < stored else -1) for chunk_id, document_id, row in rows]
+            indexed = max((row for _, _, row in rows), default=-1) + 1
+            torn = True
+        
+        if torn:
+            tmp_ids = self.chunk_ids_path.with_suffix(".tmp")
+            with open(tmp_ids, 'w') as f:
+                f.writelines(f"{chunk_id}\t{document_id}\t{row}\n" for chunk_id, document_id, row in rows)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_ids, self.chunk_ids_path)
+        
+        if size > indexed * row_bytes:
+            logger.warning(f"Truncating {size - indexed * row_bytes} bytes of unindexed embeddings from {self.name}")
+            with open(self.embeddings_path, 'r+b') as f:
+                f.truncate(indexed * row_bytes)
+            self._size_cache = None
+        
+        return rows
+    
+    def _set_rows(self, rows: List[Tuple[str, str, int]], deleted_ids: Set[str] = frozenset()):
+        """Replace the chunk index and the lookups derived from it, leaving deleted chunks out of the lookups."""
+        self._rows = rows
+        self._row_of = {}
+        self._chunks_of = {}
+        self._deleted_rows = set()
+        for chunk_id, document_id, row in rows:
+            if chunk_id in deleted_ids:
+                if row >= 0:
+                    self._deleted_rows.add(row)
+                continue
+            self._row_of[chunk_id] = row
+            self._chunks_of.setdefault(document_id, []).append(chunk_id)
+    
+    def _migrate_chunk_files(self):
+        """
+        Move embeddings out of chunk files written before the binary embedding store
+        
+        The store and index are written and synced before any chunk file is
+        rewritten, so an interrupted migration leaves the inline embeddings
+        in place to migrate again. Embeddings whose dimension differs from
+        the first one found are left inline and not indexed.
+        """
+        rows = []
+        embeddings = []
+        migrated = []
+        dim = self.metadata.get("embedding_dim")
+        for chunk_path in self.chunks_dir.glob("*.json"):
+            chunk_dict = _read_json(chunk_path)
+            
+            embedding = chunk_dict.get("embedding")
+            row = -1
+            if embedding:
+                dim = dim or len(embedding)
+                if len(embedding) == dim:
+                    row = len(embeddings)
+                    embeddings.append(embedding)
+                    migrated.append(chunk_path)
+                else:
+                    logger.warning(f"Leaving embedding of dimension {len(embedding)} inline in {chunk_path}; expected {dim}")
+            rows.append((chunk_dict["id"], chunk_dict["document_id"], row))
+        
+        if embeddings:
+            self.metadata["embedding_dim"] = dim
+            self._save_metadata()
+        self._write_store(rows, np.array(embeddings, dtype=np.float32))
+        
+        # Strip the inline copies only once the store holding them is on disk
+        for chunk_path in migrated:
+            chunk_dict = _read_json(chunk_path)
+            chunk_dict.pop("embedding", None)
+            _write_json(chunk_path, chunk_dict)
+    
+    def _write_store(self, rows: List[Tuple[str, str, int]], matrix: np.ndarray):
+        """Replace the chunk index and embedding files, syncing each before it is swapped in."""
+        tmp_embeddings = self.embeddings_path.with_suffix(".tmp")
+        with open(tmp_embeddings, 'wb') as f:
+            f.write(np.ascontiguousarray(matrix, dtype=np.float32).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_embeddings, self.embeddings_path)
+        
+        tmp_ids = self.chunk_ids_path.with_suffix(".tmp")
+        with open(tmp_ids, 'w') as f:
+            f.writelines(f"{chunk_id}\t{document_id}\t{row}\n" for chunk_id, document_id, row in rows)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_ids, self.chunk_ids_path)
+        
+        # Rows were renumbered, so the tombstones and a persisted ANN index no longer match
+        self.deleted_ids_path.unlink(missing_ok=True)
+        self.ann_index_path.unlink(missing_ok=True)
+        self._size_cache = None
+    
+    def _raw_embeddings(self) -> np.ndarray:
+        """Memory-map the stored embeddings as an (N, d) float32 matrix."""
+        dim = self.metadata.get("embedding_dim")
+        if not dim or not self.embeddings_path.exists() or self.embeddings_path.stat().st_size == 0:
+            return np.empty((0, dim or 0), dtype=np.float32)
+        return np.memmap(self.embeddings_path, dtype=np.float32, mode="r").reshape(-1, dim)
+    
+    def _invalidate_index(self, rows_appended: bool = False):
+        """Drop the in-memory search index after chunks change, keeping the HNSW graph if rows were only appended."""
+        self._emb_q8 = None
+        self._emb_scales = None
+        self._emb_chunk_ids = []
+        self._ann_base = (self._ann or self._ann_base) if rows_appended else None
+        self._ann = None
+    
+    @staticmethod
+    def _normalized_blocks(raw: np.ndarray, start: int = 0):
+        """Yield (offset, block) pairs of L2-normalized float32 rows read from the memory map."""
+        for offset in range(start, len(raw), SEARCH_BLOCK_ROWS):
+            block = np.array(raw[offset:offset + SEARCH_BLOCK_ROWS], dtype=np.float32)
+            norms = np.linalg.norm(block, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0  # Zero vectors keep a score of 0
+            block /= norms
+            yield offset, block
+    
+    def _load_ann_index(self, raw: np.ndarray):
+        """
+        Load the persisted HNSW index, adding any rows appended since it was written
+        
+        Inner product over normalized vectors is cosine similarity. Rows are
+        only appended between compactions, and compaction removes the index
+        file, so a stored index covering fewer rows can be extended in place.
+        """
+        index, self._ann_base = self._ann_base, None
+        if index is None and self.ann_index_path.exists():
+            index = faiss.read_index(str(self.ann_index_path))
+        if index is not None and (index.d != raw.shape[1] or index.ntotal > len(raw)):
+            index = None
+        if index is None:
+            index = faiss.IndexHNSWFlat(raw.shape[1], ANN_HNSW_M, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = ANN_EF_CONSTRUCTION
+        
+        if index.ntotal < len(raw):
+            for _, block in self._normalized_blocks(raw, index.ntotal):
+                index.add(block)
+            self._ann_unsaved = True
+        if self._ann_unsaved and not self._bulk_depth:
+            self._save_ann_index(index)
+        
+        return index
+    
+    def _save_ann_index(self, index):
+        """Persist the HNSW index next to the embedding store."""
+        tmp_path = self.ann_index_path.with_suffix(".tmp")
+        faiss.write_index(index, str(tmp_path))
+        os.replace(tmp_path, self.ann_index_path)
+        self._ann_unsaved = False
+        self._size_cache = None
+    
+    def _load_index(self):
+        """
+        Load the stored embeddings as row-normalized int8 vectors
+        
+        Each row is scaled so its largest component maps to 127. Cosine
+        ranking only needs relative order, and int8 rows take a quarter of
+        the memory and bandwidth of float32. Large collections load an HNSW
+        index instead when faiss is installed.
+        """
+        if self._rows is None:
+            self._load_rows()
+        
+        # Map each embedding row back to its chunk; deleted rows map to None
+        raw = self._raw_embeddings()
+        self._emb_chunk_ids = [None] * len(raw)
+        for chunk_id, row in self._row_of.items():
+            if row >= 0:
+                self._emb_chunk_ids[row] = chunk_id
+        
+        if faiss is not None and len(raw) >= max(ANN_MIN_ROWS, 1):
+            self._ann = self._load_ann_index(raw)
+            return
+        
+        q8 = np.empty(raw.shape, dtype=np.int8)
+        scales = np.empty(len(raw), dtype=np.float32)
+        
+        # Quantize block by block straight from the memory map
+        for start, block in self._normalized_blocks(raw):
+            q8[start:start + len(block)], scales[start:start + len(block)] = _quantize_int8(block)
+        
+        self._emb_q8 = q8
+        self._emb_scales = scales
     
     def _save_metadata(self):
         """Save metadata to disk."""
         self.metadata["last_updated"] = datetime.now().isoformat()
-        with open(self.metadata_path, 'w') as f:
-            json.dump(self.metadata, f, indent=2)
+        _write_json(self.metadata_path, self.metadata)
+        self._metadata_dirty = False
+        self._size_cache = None
+        _DIRTY_COLLECTIONS.discard(self)
+    
+    def _mark_dirty(self):
+        """Record a metadata change to be written by the next flush."""
+        self.metadata["last_updated"] = datetime.now().isoformat()
+        self._metadata_dirty = True
+        self._size_cache = None
+        _DIRTY_COLLECTIONS.add(self)
+    
+    def flush(self):
+        """Write pending metadata changes to disk."""
+        if self._metadata_dirty and self.storage_dir.exists():
+            self._save_metadata()
+    
+    @contextmanager
+    def bulk_mode(self):
+        """
+        Defer metadata and search index writes across a batch of changes
+        
+        Chunks added inside the block only append to the embedding store.
+        On exit the metadata is flushed and the search index is built or
+        extended once, and persisted once, for everything that was added.
+        """
+        self._bulk_depth += 1
+        try:
+            yield self
+        finally:
+            self._bulk_depth -= 1
+            if not self._bulk_depth:
+                self.flush()
+                if self._emb_q8 is None and self._ann is None:
+                    self._load_index()
+                elif self._ann is not None and self._ann_unsaved:
+                    self._save_ann_index(self._ann)
+    
+    def close(self):
+        """Flush pending changes."""
+        self.flush()
+    
+    def __enter__(self):
+        """Use the collection as a context manager that flushes on exit."""
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Flush pending changes."""
+        self.close()
     
     def add_document(self, document):
-        """Add a document to the collection."""
+        """Add a document to the collection, returning the existing id if its content was already added."""
+        document_dict = document.dict()
+        content_hash = (document_dict.get("metadata") or {}).get("content_hash")
+        content_hashes = self.metadata.setdefault("content_hashes", {})
+        
+        # Skip documents whose file content is already stored
+        existing_id = content_hashes.get(content_hash)
+        if existing_id and (self.documents_dir / f"{existing_id}.json").exists():
+            return existing_id
+        
         # Save document
         document_path = self.documents_dir / f"{document.id}.json"
-        with open(document_path, 'w') as f:
-            document_dict = document.dict()
-            json.dump(document_dict, f, indent=2)
+        _write_json(document_path, document_dict)
         
         # Update metadata
+        if content_hash:
+            content_hashes[content_hash] = document.id
         self.metadata["document_count"] += 1
-        self._save_metadata()
+        self._mark_dirty()
         
         return document.id
     
+    def find_document(self, content_hash: str) -> Optional[str]:
+        """Get the id of the document stored with this content hash, if any."""
+        return self.metadata.get("content_hashes", {}).get(content_hash)
+    
     def add_chunk(self, chunk):
         """Add a chunk to the collection."""
-        # Save chunk
-        chunk_path = self.chunks_dir / f"{chunk.id}.json"
-        with open(chunk_path, 'w') as f:
-            chunk_dict = chunk.dict()
-            json.dump(chunk_dict, f, indent=2)
+        return self.bulk_add_chunks([chunk])[0]
+    
+    def bulk_add_chunks(self, chunks) -> List[str]:
+        """Add chunks with a single append to the embedding store and chunk index."""
+        if self._rows is None:
+            self._load_rows()
+        
+        # Split off the embeddings and check their dimension before writing anything
+        chunk_dicts = [chunk.dict() for chunk in chunks]
+        embeddings = [chunk_dict.pop("embedding", None) for chunk_dict in chunk_dicts]
+        dim = self.metadata.get("embedding_dim")
+        for embedding in embeddings:
+            if not embedding:
+                continue
+            if dim is None:
+                dim = len(embedding)
+            elif len(embedding) != dim:
+                raise ValueError(f"Expected an embedding of dimension {dim}, got {len(embedding)}")
+        if dim is not None and "embedding_dim" not in self.metadata:
+            # The embedding store can't be read back without its dimension, so save it right away
+            self.metadata["embedding_dim"] = dim
+            self._save_metadata()
+        
+        # Save chunk content and metadata; the embeddings go to the binary store
+        for chunk, chunk_dict in zip(chunks, chunk_dicts):
+            _write_json(self.chunks_dir / f"{chunk.id}.json", chunk_dict)
+        
+        # Append the embedding rows and the index entries
+        matrix = np.array([embedding for embedding in embeddings if embedding], dtype=np.float32)
+        first_row = 0
+        if len(matrix):
+            with open(self.embeddings_path, 'ab') as f:
+                first_row = f.tell() // (dim * matrix.itemsize)
+                f.write(matrix.tobytes())
+        
+        next_row = iter(range(first_row, first_row + len(matrix)))
+        entries = [
+            (chunk.id, chunk_dict["document_id"], next(next_row) if embedding else -1)
+            for chunk, chunk_dict, embedding in zip(chunks, chunk_dicts, embeddings)
+        ]
+        with open(self.chunk_ids_path, 'a') as f:
+            f.writelines(f"{chunk_id}\t{document_id}\t{row}\n" for chunk_id, document_id, row in entries)
+        self._rows.extend(entries)
+        for chunk_id, document_id, row in entries:
+            self._row_of[chunk_id] = row
+            self._chunks_of.setdefault(document_id, []).append(chunk_id)
         
         # Update metadata
-        self.metadata["chunk_count"] += 1
-        self._save_metadata()
+        self.metadata["chunk_count"] += len(entries)
+        self._mark_dirty()
+        self._invalidate_index(rows_appended=True)
         
-        return chunk.id
+        return [chunk_id for chunk_id, _, _ in entries]
     
     def get_document(self, document_id):
         """Get a document from the collection."""
@@ -347,9 +999,7 @@ class DocumentCollection:
         if not document_path.exists():
             return None
         
-        with open(document_path, 'r') as f:
-            document_dict = json.load(f)
-            return document_dict
+        return _read_json(document_path)
     
     def get_chunk(self, chunk_id):
         """Get a chunk from the collection."""
@@ -357,9 +1007,16 @@ class DocumentCollection:
         if not chunk_path.exists():
             return None
         
-        with open(chunk_path, 'r') as f:
-            chunk_dict = json.load(f)
-            return chunk_dict
+        chunk_dict = _read_json(chunk_path)
+        
+        # Reattach the embedding from the binary store
+        if self._rows is None:
+            self._load_rows()
+        row = self._row_of.get(chunk_id, -1)
+        if "embedding" not in chunk_dict and row >= 0:
+            chunk_dict["embedding"] = self._raw_embeddings()[row].tolist()
+        
+        return chunk_dict
     
     def delete_document(self, document_id):
         """Delete a document and its chunks from the collection."""
@@ -367,47 +1024,187 @@ class DocumentCollection:
         if not document_path.exists():
             return False
         
-        # Delete document
+        # Delete document and forget its content hash
+        content_hash = (_read_json(document_path).get("metadata") or {}).get("content_hash")
+        if self.metadata.get("content_hashes", {}).get(content_hash) == document_id:
+            del self.metadata["content_hashes"][content_hash]
         document_path.unlink()
         
-        # Delete chunks
-        chunks_deleted = 0
-        for chunk_path in self.chunks_dir.glob("*.json"):
-            with open(chunk_path, 'r') as f:
-                chunk_dict = json.load(f)
-                if chunk_dict["document_id"] == document_id:
-                    chunk_path.unlink()
-                    chunks_deleted += 1
+        # Look up the document's chunks instead of parsing every chunk file
+        if self._rows is None:
+            self._load_rows()
+        deleted_ids = self._chunks_of.pop(document_id, [])
+        
+        # Tombstone the chunks rather than rewriting the store; their embedding rows stay in place
+        if deleted_ids:
+            with open(self.deleted_ids_path, 'a') as f:
+                f.writelines(f"{chunk_id}\n" for chunk_id in deleted_ids)
+            for chunk_id in deleted_ids:
+                row = self._row_of.pop(chunk_id)
+                if row >= 0:
+                    self._deleted_rows.add(row)
+                    if self._emb_chunk_ids:
+                        self._emb_chunk_ids[row] = None
+                (self.chunks_dir / f"{chunk_id}.json").unlink(missing_ok=True)
+            self._size_cache = None
+            
+            if len(self._deleted_rows) > COMPACT_DELETED_FRACTION * len(self._raw_embeddings()):
+                self.compact()
         
         # Update metadata
         self.metadata["document_count"] -= 1
-        self.metadata["chunk_count"] -= chunks_deleted
-        self._save_metadata()
+        self.metadata["chunk_count"] -= len(deleted_ids)
+        self._mark_dirty()
         
         return True
     
-    def search(self, query_embedding, top_k=5):
-        """Search for similar chunks using cosine similarity."""
-        results = []
+    def compact(self):
+        """Rewrite the index and embedding store without the rows of deleted chunks."""
+        if self._rows is None:
+            self._load_rows()
         
-        # Load all chunks
-        for chunk_path in self.chunks_dir.glob("*.json"):
-            with open(chunk_path, 'r') as f:
-                chunk_dict = json.load(f)
-                
-                if "embedding" in chunk_dict and chunk_dict["embedding"]:
-                    # Calculate cosine similarity
-                    similarity = self._cosine_similarity(query_embedding, chunk_dict["embedding"])
-                    results.append({
-                        "chunk": chunk_dict,
-                        "score": similarity
-                    })
-        
-        # Sort by similarity score (descending)
-        results.sort(key=lambda x: x["score"], reverse=True)
-        
-        # Return top k results
-        return results[:top_k]
+        kept = [entry for entry in self._rows if entry[0] in self._row_of]
+        kept_rows = [row for _, _, row in kept if row >= 0]
+        matrix = self._raw_embeddings()[kept_rows]
+        
+        next_row = iter(range(len(kept_rows)))
+        rows = [(chunk_id, doc_id, next(next_row) if row >= 0 else -1) for chunk_id, doc_id, row in kept]
+        self._write_store(rows, matrix)
+        self._set_rows(rows)
+        self._invalidate_index()
+    
+    def search(self, query_embedding, top_k=5, document_ids=None):
+        """Search for similar chunks using cosine similarity, optionally only within the given documents."""
+        if not query_embedding:
+            return []
+        return self.search_batch([query_embedding], top_k, document_ids)[0]
+    
+    def _document_rows(self, document_ids) -> np.ndarray:
+        """Get the sorted embedding rows of the given documents' chunks."""
+        rows = {
+            self._row_of[chunk_id]
+            for document_id in document_ids
+            for chunk_id in self._chunks_of.get(document_id, [])
+        }
+        rows.discard(-1)
+        return np.array(sorted(rows), dtype=np.int64)
+    
+    def _exact_search(self, queries, rows, top_k):
+        """Score normalized queries exactly against the given float32 rows, returning the best rows and scores."""
+        embeddings = np.asarray(self._raw_embeddings()[rows])
+        row_norms = np.linalg.norm(embeddings, axis=1)
+        row_norms[row_norms == 0] = 1.0
+        all_scores = (queries @ embeddings.T) / row_norms
+        
+        if top_k < len(rows):
+            best = np.argpartition(-all_scores, top_k, axis=1)[:, :top_k]
+        else:
+            best = np.broadcast_to(np.arange(len(rows)), all_scores.shape)
+        best_scores = np.take_along_axis(all_scores, best, axis=1)
+        order = np.argsort(-best_scores, axis=1)
+        return rows[np.take_along_axis(best, order, axis=1)], np.take_along_axis(best_scores, order, axis=1)
+    
+    def search_batch(self, query_embeddings, top_k=5, document_ids=None):
+        """
+        Search for chunks similar to each of several query embeddings
+        
+        Each block of stored rows is multiplied against the whole query
+        matrix at once, so numpy runs one SGEMM per block instead of one
+        GEMV per query. The best int8 candidates are re-scored against the
+        float32 rows, so returned scores are exact. Zero queries get no
+        results.
+        
+        When document_ids is given, only those documents' chunks are scored,
+        so a filtered search still finds top_k matches when they exist.
+        """
+        if self._emb_q8 is None and self._ann is None:
+            self._load_index()
+        
+        # Restrict the search to the filtered documents' rows up front rather than filtering results.
+        # Filtered rows never include deleted ones; otherwise the tombstoned rows are excluded.
+        allowed = None if document_ids is None else self._document_rows(document_ids)
+        deleted = np.array(sorted(self._deleted_rows), dtype=np.int64) if allowed is None else np.empty(0, dtype=np.int64)
+        
+        if len(self._emb_chunk_ids) <= len(self._deleted_rows) or not len(query_embeddings) or top_k <= 0 or (allowed is not None and not len(allowed)):
+            return [[] for _ in query_embeddings]
+        
+        queries = np.array(query_embeddings, dtype=np.float32, ndmin=2)
+        norms = np.linalg.norm(queries, axis=1)
+        valid = norms > 0
+        queries[valid] /= norms[valid, None]
+        
+        # A filter small enough to scan is scored exactly; the graph would visit few allowed nodes
+        if self._ann is not None and allowed is not None and len(allowed) < ANN_MIN_ROWS:
+            top, scores = self._exact_search(queries, allowed, top_k)
+        # Large collections are searched approximately through the HNSW graph
+        elif self._ann is not None:
+            params = faiss.SearchParametersHNSW()
+            params.efSearch = max(ANN_EF_SEARCH, top_k)
+            if allowed is not None:
+                # The selector restricts the graph traversal itself to the allowed rows,
+                # so widen the beam in proportion to how many rows it rules out
+                params.efSearch *= math.ceil(self._ann.ntotal / len(allowed))
+                selector = faiss.IDSelectorBatch(allowed)
+                params.sel = selector
+            elif len(deleted):
+                # Keep the inner selector referenced for as long as the negation uses it
+                deleted_selector = faiss.IDSelectorBatch(deleted)
+                selector = faiss.IDSelectorNot(deleted_selector)
+                params.sel = selector
+            scores, top = self._ann.search(queries, min(top_k, self._ann.ntotal), params=params)
+            
+            # Score exactly any query the graph search left short of results
+            wanted = min(top_k, self._ann.ntotal - len(deleted) if allowed is None else len(allowed))
+            short = np.flatnonzero(valid & ((top >= 0).sum(axis=1) < wanted))
+            if len(short):
+                rows = np.setdiff1d(np.arange(self._ann.ntotal), deleted) if allowed is None else allowed
+                top, scores = list(top), list(scores)
+                for query, query_top, query_scores in zip(short, *self._exact_search(queries[short], rows, top_k)):
+                    top[query], scores[query] = query_top, query_scores
+        else:
+            q8, scales = self._emb_q8, self._emb_scales
+            if allowed is not None:
+                q8, scales = q8[allowed], scales[allowed]
+            
+            if simsimd is not None:
+                # Compare int8 queries against the int8 rows directly with SIMD kernels
+                all_scores = batch_cosine(_quantize_int8(queries)[0], q8)
+            else:
+                # Score blocks of int8 rows against all normalized queries, rescaling per row
+                all_scores = np.empty((len(queries), len(q8)), dtype=np.float32)
+                for start in range(0, all_scores.shape[1], SEARCH_BLOCK_ROWS):
+                    end = start + SEARCH_BLOCK_ROWS
+                    all_scores[:, start:end] = (queries @ q8[start:end].astype(np.float32).T) * scales[start:end]
+            all_scores[:, deleted] = -np.inf
+            
+            # Select each query's candidates without sorting every score
+            candidate_count = top_k * RERANK_OVERSAMPLE
+            if candidate_count < all_scores.shape[1]:
+                candidates = np.argpartition(-all_scores, candidate_count, axis=1)[:, :candidate_count]
+            else:
+                candidates = np.broadcast_to(np.arange(all_scores.shape[1]), all_scores.shape)
+            if allowed is not None:
+                candidates = allowed[candidates]
+            
+            # Re-rank the candidates with exact cosine over their float32 rows
+            rows = np.asarray(self._raw_embeddings()[candidates.ravel()]).reshape(*candidates.shape, -1)
+            row_norms = np.linalg.norm(rows, axis=2)
+            row_norms[row_norms == 0] = 1.0
+            exact_scores = np.einsum("bkd,bd->bk", rows, queries) / row_norms
+            exact_scores[np.isin(candidates, deleted)] = -np.inf
+            
+            order = np.argsort(-exact_scores, axis=1)[:, :top_k]
+            top = np.take_along_axis(candidates, order, axis=1)
+            scores = np.take_along_axis(exact_scores, order, axis=1)
+        
+        # Only the winning chunks are read from disk
+        return [
+            [
+                {"chunk": self.get_chunk(self._emb_chunk_ids[i]), "score": float(score)}
+                for i, score in zip(query_top, query_scores) if i >= 0 and self._emb_chunk_ids[i] is not None
+            ] if query_valid else []
+            for query_top, query_scores, query_valid in zip(top, scores, valid)
+        ]
     
     def _cosine_similarity(self, vec1, vec2):
         """Calculate cosine similarity between two vectors."""
@@ -434,30 +1231,40 @@ class DocumentCollection:
         }
     
     def _get_storage_size(self):
-        """Calculate the total storage size in bytes."""
+        """Calculate the total storage size in bytes, cached until the collection changes."""
+        if self._size_cache is not None:
+            return self._size_cache
+        
         total_size = 0
         
-        # Add size of documents
-        for document_path in self.documents_dir.glob("*.json"):
-            total_size += document_path.stat().st_size
+        # Add size of documents and chunks
+        for directory in (self.documents_dir, self.chunks_dir):
+            with os.scandir(directory) as entries:
+                total_size += sum(entry.stat().st_size for entry in entries if entry.name.endswith(".json"))
         
-        # Add size of chunks
-        for chunk_path in self.chunks_dir.glob("*.json"):
-            total_size += chunk_path.stat().st_size
-        
-        # Add size of metadata
-        if self.metadata_path.exists():
-            total_size += self.metadata_path.stat().st_size
+        # Add size of metadata, the embedding store and the ANN index
+        for path in (self.metadata_path, self.embeddings_path, self.chunk_ids_path, self.deleted_ids_path, self.ann_index_path):
+            if path.exists():
+                total_size += path.stat().st_size
         
+        self._size_cache = total_size
         return total_size
 
+# Collections with unsaved metadata, flushed when the interpreter exits
+_DIRTY_COLLECTIONS: "weakref.WeakSet[DocumentCollection]" = weakref.WeakSet()
+
+@atexit.register
+def _flush_collections():
+    """Flush metadata for every collection with pending changes."""
+    for collection in list(_DIRTY_COLLECTIONS):
+        collection.flush()
+
 class CollectionManager:
     """Manage multiple document collections."""
     
     def __init__(self, storage_dir: str = "vector_store"):
         """Initialize the collection manager."""
         self.storage_dir = Path(storage_dir)
-        self.collections = {}
         self.metadata_path = self.storage_dir / "collections.json"
         self.metadata = {
             "collections": [],
@@ -470,12 +1277,10 @@ class CollectionManager:
         
         # Load metadata if it exists
         if self.metadata_path.exists():
-            with open(self.metadata_path, 'r') as f:
-                self.metadata = json.load(f)
+            self.metadata = _read_json(self.metadata_path)
         
-        # Load collections
-        for collection_name in self.metadata["collections"]:
-            self.collections[collection_name] = DocumentCollection(collection_name, storage_dir)
+        # Collection names map to None until the collection is first used
+        self.collections: Dict[str, Optional[DocumentCollection]] = dict.fromkeys(self.metadata["collections"])
         
         # Create default collection if it doesn't exist
         if "default" not in self.collections:
@@ -484,8 +1289,7 @@ class CollectionManager:
     def _save_metadata(self):
         """Save metadata to disk."""
         self.metadata["last_updated"] = datetime.now().isoformat()
-        with open(self.metadata_path, 'w') as f:
-            json.dump(self.metadata, f, indent=2)
+        _write_json(self.metadata_path, self.metadata)
     
     def create_collection(self, name: str) -> DocumentCollection:
         """Create a new collection."""
@@ -508,6 +1312,8 @@ class CollectionManager:
         if name not in self.collections:
             raise ValueError(f"Collection {name} does not exist")
         
+        if self.collections[name] is None:
+            self.collections[name] = DocumentCollection(name, self.storage_dir)
         return self.collections[name]
     
     def delete_collection(self, name: str) -> bool:
@@ -534,10 +1340,16 @@ class CollectionManager:
         return True
     
     def list_collections(self) -> List[Dict[str, Any]]:
-        """List all collections."""
+        """List all collections, reading metadata files for collections that aren't loaded."""
         collections = []
         for name, collection in self.collections.items():
-            stats = collection.get_stats()
+            if collection is not None:
+                stats = collection.metadata
+            else:
+                stats = {"document_count": 0, "chunk_count": 0}
+                metadata_path = self.storage_dir / name / "metadata.json"
+                if metadata_path.exists():
+                    stats = _read_json(metadata_path)
             collections.append({
                 "name": name,
                 "document_count": stats["document_count"],
@@ -562,7 +1374,7 @@ class CollectionManager:
     def get_default_collection(self) -> DocumentCollection:
         """Get the default collection."""
         default_name = self.metadata["default_collection"]
-        return self.collections[default_name]
+        return self.get_collection(default_name)
 
 # Enhanced RAG system tools
 def get_enhanced_rag_tools() -> List:
@@ -1,5 +1,14 @@
 # Add to the RAGSystem class in rag.py
 
+import asyncio
+import numpy as np
+
+# Hybrid search candidates fetched per requested result when filters may discard some
+FILTER_OVERSAMPLE = 4
+
+# Files ingested at once by add_documents_from_files
+INGEST_CONCURRENCY = 8
+
 class RAGSystem:
     """Complete RAG system combining all components."""
     
@@ -17,8 +26,8 @@ class RAGSystem:
     async def add_document_from_file(self, file_path: str, metadata: Dict[str, Any] = None, 
                              chunk_strategy: str = "tokens", collection_name: Optional[str] = None) -> Document:
         """Add a document from a file to the RAG system."""
-        # Process file with enhanced document processor
-        text, extracted_metadata = DocumentProcessor.extract_text_from_file(file_path)
+        # Process file with enhanced document processor, off the event loop
+        text, extracted_metadata = await asyncio.to_thread(DocumentProcessor.extract_text_from_file, file_path)
         
         # Combine extracted metadata with provided metadata
         combined_metadata = extracted_metadata
@@ -40,30 +49,33 @@ class RAGSystem:
         
         return document
     
+    async def add_documents_from_files(self, file_paths: List[str], metadata: Dict[str, Any] = None,
+                                       chunk_strategy: str = "tokens", collection_name: Optional[str] = None,
+                                       concurrency: int = INGEST_CONCURRENCY) -> List[Any]:
+        """Add several files concurrently, keeping at most `concurrency` in flight; failures are returned as exceptions."""
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def add(file_path: str) -> Document:
+            async with semaphore:
+                return await self.add_document_from_file(file_path, metadata, chunk_strategy, collection_name)
+        
+        return await asyncio.gather(*(add(file_path) for file_path in file_paths), return_exceptions=True)
+    
     async def hybrid_query(self, query: str, top_k: int = 5, 
                     filters: Optional[Dict[str, Any]] = None, 
                     vector_weight: float = 0.7) -> Dict[str, Any]:
         """Query the RAG system using hybrid search."""
-        # Perform hybrid search
-        results = await self.hybrid_searcher.hybrid_search(query, top_k, vector_weight)
+        # Perform hybrid search, fetching extra candidates so filtering still leaves top_k
+        results = await self.hybrid_searcher.hybrid_search(query, top_k * FILTER_OVERSAMPLE if filters else top_k, vector_weight)
         
-        # Apply filters if provided
-        if filters:
-            filtered_results = []
-            for result in results:
-                metadata = result["metadata"]
-                
-                # Check if all filter criteria match
-                matches = True
-                for key, value in filters.items():
-                    if key not in metadata or metadata[key] != value:
-                        matches = False
-                        break
-                
-                if matches:
-                    filtered_results.append(result)
+        # Apply filters if provided, one boolean column per criterion
+        if filters and results:
+            metadatas = [result["metadata"] for result in results]
+            mask = np.ones(len(results), dtype=bool)
+            for key, value in filters.items():
+                mask &= np.fromiter((key in metadata and metadata[key] == value for metadata in metadatas), dtype=bool, count=len(metadatas))
             
-            results = filtered_results
+            results = [results[i] for i in np.flatnonzero(mask)[:top_k]]
         
         return {
             "query": query,
@@ -1,21 +1,216 @@
 import os
 import json
+import mmap
+import time
 import shlex
+import atexit
+import shutil
 import asyncio
+import tempfile
+import contextlib
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 from datetime import datetime
-from typing import List, Dict, Any, Optional
-from anthropic_agent.tools import Tool, ToolParameter
+from collections import OrderedDict
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Tuple
 
-def get_system_tools() -> List[Tool]:
+if TYPE_CHECKING:
+    # The tool classes and matplotlib are imported on first use, so the helpers below import on their own
+    from anthropic_agent.tools import Tool
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+except ImportError:  # Optional multithreaded CSV reader; fall back to pandas
+    pa = None
+
+# Command output kept in memory per stream; the rest spills to a temporary file
+COMMAND_OUTPUT_MAX_BYTES = 4 * 1024 * 1024
+COMMAND_READ_CHUNK_SIZE = 64 * 1024
+
+# Spilled command output stays readable this long, and is removed when the process exits
+COMMAND_SPILL_TTL_SECONDS = 60 * 60
+
+# Decoded files kept for repeated reads, up to a total size; larger files bypass the cache
+READ_FILE_CACHE_SIZE = 128
+READ_FILE_CACHE_MAX_BYTES = 8 * 1024 * 1024
+READ_FILE_CACHE_TOTAL_BYTES = 64 * 1024 * 1024
+READ_FILE_MMAP_MIN_BYTES = 1024 * 1024
+
+def _read_text(path: str, size: int) -> str:
+    """Read a UTF-8 text file, decoding large files straight from a memory map."""
+    with open(path, "rb") as f:
+        if size >= READ_FILE_MMAP_MIN_BYTES:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                text = str(data, "utf-8")
+        else:
+            text = f.read().decode("utf-8")
+    
+    # Translate newlines as text-mode open() would
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
+
+# Latest decoded version of each recently read file by path, as (mtime_ns, size, text)
+_read_file_cache: "OrderedDict[str, Tuple[int, int, str]]" = OrderedDict()
+_read_file_cache_bytes = 0
+
+def _read_text_cached(path: str, mtime_ns: int, size: int) -> str:
+    """Read a text file, reusing the cached text until its modification time or size changes."""
+    global _read_file_cache_bytes
+    # Only the latest version of each file is kept
+    cached = _read_file_cache.pop(path, None)
+    if cached is not None:
+        _read_file_cache_bytes -= cached[1]
+    if cached is not None and cached[:2] == (mtime_ns, size):
+        text = cached[2]
+    else:
+        text = _read_text(path, size)
+    
+    _read_file_cache[path] = (mtime_ns, size, text)
+    _read_file_cache_bytes += size
+    while len(_read_file_cache) > READ_FILE_CACHE_SIZE or _read_file_cache_bytes > READ_FILE_CACHE_TOTAL_BYTES:
+        _, (_, evicted_size, _) = _read_file_cache.popitem(last=False)
+        _read_file_cache_bytes -= evicted_size
+    return text
+
+# CSV files at least this large are summarized batch by batch instead of loaded whole
+CSV_STREAMING_MIN_BYTES = 256 * 1024 * 1024
+CSV_BLOCK_SIZE = 8 << 20
+CSV_PANDAS_CHUNK_ROWS = 1_000_000
+
+def _merge_moments(column: Dict[str, float], values: np.ndarray) -> None:
+    """Merge a batch of values into a column's running count, mean, squared deviations, min and max."""
+    if not len(values):
+        return
+    batch_mean = values.mean()
+    count = column["count"] + len(values)
+    delta = batch_mean - column["mean"]
+    column["m2"] += ((values - batch_mean) ** 2).sum() + delta ** 2 * column["count"] * len(values) / count
+    column["mean"] += delta * len(values) / count
+    column["count"] = count
+    column["min"] = min(column["min"], values.min())
+    column["max"] = max(column["max"], values.max())
+
+def _describe_moments(stats: Dict[str, Dict[str, float]]) -> Dict[str, Dict[str, float]]:
+    """Report merged moments like describe(): sample standard deviation, NaN for empty columns."""
+    return {
+        name: {
+            "count": float(column["count"]),
+            "mean": float(column["mean"]) if column["count"] else float("nan"),
+            "std": float(np.sqrt(column["m2"] / (column["count"] - 1))) if column["count"] > 1 else float("nan"),
+            "min": float(column["min"]) if column["count"] else float("nan"),
+            "max": float(column["max"]) if column["count"] else float("nan")
+        }
+        for name, column in stats.items()
+    }
+
+def _summarize_csv_chunked(file_path: str, columns: List[str]) -> Dict[str, Dict[str, float]]:
+    """Summarize CSV columns from pandas chunks, leaving out any column that is not entirely numeric."""
+    stats = {name: {"count": 0, "mean": 0.0, "m2": 0.0, "min": np.inf, "max": -np.inf} for name in columns}
+    for chunk in pd.read_csv(file_path, usecols=columns, chunksize=CSV_PANDAS_CHUNK_ROWS):
+        for name in list(stats):
+            values = chunk[name]
+            if not pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values):
+                del stats[name]
+                continue
+            _merge_moments(stats[name], values.dropna().to_numpy(dtype=np.float64))
+    return _describe_moments(stats)
+
+def _summarize_csv_streaming(file_path: str) -> Dict[str, Dict[str, float]]:
+    """
+    Summarize the numeric columns of a CSV file one record batch at a time
+    
+    Per-batch counts, means and squared deviations are merged with Chan's
+    parallel update, so the table is never materialized. Quantiles would
+    need every value, so only count, mean, std, min and max are reported.
+    """
+    read_options = pacsv.ReadOptions(block_size=CSV_BLOCK_SIZE, use_threads=True)
+    numeric = [
+        field.name for field in pacsv.open_csv(file_path, read_options=read_options).schema
+        if pa.types.is_integer(field.type) or pa.types.is_floating(field.type)
+    ]
+    
+    # Types are inferred from the first block only; read numeric columns as float64 so a later 2.5 still converts
+    convert_options = pacsv.ConvertOptions(column_types={name: pa.float64() for name in numeric})
+    reader = pacsv.open_csv(file_path, read_options=read_options, convert_options=convert_options)
+    stats = {name: {"count": 0, "mean": 0.0, "m2": 0.0, "min": np.inf, "max": -np.inf} for name in numeric}
+    
+    try:
+        for batch in reader:
+            for name in numeric:
+                _merge_moments(stats[name], batch.column(name).drop_null().to_numpy(zero_copy_only=False))
+    except pa.ArrowInvalid:
+        # A later block has text in a numeric column; pandas chunks can drop that column instead
+        return _summarize_csv_chunked(file_path, numeric)
+    
+    return _describe_moments(stats)
+
+# Directory of this process's spilled command output, created on first use
+_spill_dir: Optional[str] = None
+
+def _spill_directory() -> str:
+    """Get the directory for spilled command output, removing files older than COMMAND_SPILL_TTL_SECONDS."""
+    global _spill_dir
+    if _spill_dir is None:
+        _spill_dir = tempfile.mkdtemp(prefix="kai-command-")
+        atexit.register(shutil.rmtree, _spill_dir, ignore_errors=True)
+    
+    cutoff = time.time() - COMMAND_SPILL_TTL_SECONDS
+    with os.scandir(_spill_dir) as entries:
+        for entry in entries:
+            with contextlib.suppress(FileNotFoundError):
+                if entry.stat().st_mtime < cutoff:
+                    os.unlink(entry.path)
+    return _spill_dir
+
+async def _read_stream(stream: asyncio.StreamReader) -> Tuple[bytes, Optional[str]]:
+    """
+    Read a subprocess stream without holding more than COMMAND_OUTPUT_MAX_BYTES
+    
+    The spill file is removed by a later spill once it is older than
+    COMMAND_SPILL_TTL_SECONDS, or when the process exits, whichever is first.
+    
+    Returns:
+        The first COMMAND_OUTPUT_MAX_BYTES of output, and the path of a file
+        holding the complete output if it was longer
+    """
+    buffer = bytearray()
+    spill = None
+    try:
+        while chunk := await stream.read(COMMAND_READ_CHUNK_SIZE):
+            if spill is None and len(buffer) + len(chunk) > COMMAND_OUTPUT_MAX_BYTES:
+                spill = tempfile.NamedTemporaryFile(dir=_spill_directory(), suffix=".log", delete=False)
+                spill.write(buffer)
+            if spill is not None:
+                spill.write(chunk)
+                buffer.extend(chunk[:max(COMMAND_OUTPUT_MAX_BYTES - len(buffer), 0)])
+            else:
+                buffer.extend(chunk)
+    except BaseException:
+        # Nothing will report a partial spill's path, so remove it here
+        if spill is not None:
+            spill.close()
+            os.unlink(spill.name)
+        raise
+    finally:
+        if spill is not None:
+            spill.close()
+    return bytes(buffer), spill.name if spill is not None else None
+
+def get_system_tools() -> List["Tool"]:
     """Get tools for system operations."""
+    from anthropic_agent.tools import Tool, ToolParameter
     
     async def read_file(path: str) -> Dict[str, Any]:
         """Read the contents of a file."""
         try:
-            with open(path, "r", encoding="utf-8") as f:
-                content = f.read()
+            path = os.path.abspath(path)
+            stat = os.stat(path)
+            if stat.st_size > READ_FILE_CACHE_MAX_BYTES:
+                content = _read_text(path, stat.st_size)
+            else:
+                content = _read_text_cached(path, stat.st_mtime_ns, stat.st_size)
             return {"content": content}
         except Exception as e:
             return {"error": str(e)}
@@ -30,26 +225,48 @@ def get_system_tools() -> List[Tool]:
             return {"error": str(e)}
     
     async def execute_command(command: str) -> Dict[str, Any]:
-        """Execute a system command."""
+        """Execute a system command, spilling long output to temporary files."""
         try:
             result = await asyncio.create_subprocess_shell(
                 command,
                 stdout=asyncio.subprocess.PIPE,
                 stderr=asyncio.subprocess.PIPE
             )
-            stdout, stderr = await result.communicate()
-            return {
-                "stdout": stdout.decode("utf-8"),
-                "stderr": stderr.decode("utf-8"),
+            
+            # Drain both pipes concurrently so neither can fill up and block the command
+            (stdout, stdout_path), (stderr, stderr_path) = await asyncio.gather(
+                _read_stream(result.stdout),
+                _read_stream(result.stderr)
+            )
+            await result.wait()
+            
+            response = {
+                "stdout": stdout.decode("utf-8", errors="replace"),
+                "stderr": stderr.decode("utf-8", errors="replace"),
                 "returncode": result.returncode
             }
+            if stdout_path:
+                response["stdout_path"] = stdout_path
+            if stderr_path:
+                response["stderr_path"] = stderr_path
+            return response
         except Exception as e:
             return {"error": str(e)}
     
     async def analyze_csv(file_path: str) -> Dict[str, Any]:
         """Analyze a CSV file and return summary statistics."""
         try:
-            data = pd.read_csv(file_path)
+            if pa is None:
+                data = pd.read_csv(file_path)
+            elif os.path.getsize(file_path) >= CSV_STREAMING_MIN_BYTES:
+                # Large files are summarized without loading them, so quantiles are omitted
+                summary = await asyncio.to_thread(_summarize_csv_streaming, file_path)
+                return {"summary": summary}
+            else:
+                # Parse with Arrow's multithreaded reader and hand pandas the columns
+                table = await asyncio.to_thread(pacsv.read_csv, file_path)
+                data = table.to_pandas(split_blocks=True, self_destruct=True)
+                del table
             summary = data.describe().to_dict()
             return {"summary": summary}
         except Exception as e:
@@ -58,6 +275,7 @@ def get_system_tools() -> List[Tool]:
     async def plot_data(data: str, x: str, y: str, output_path: str) -> Dict[str, Any]:
         """Plot data from a JSON string and save the plot to a file."""
         try:
+            import matplotlib.pyplot as plt
             df = pd.read_json(data)
             plt.figure(figsize=(10, 6))
             plt.plot(df[x], df[y])
@@ -119,4 +337,9 @@ def get_system_tools() -> List[Tool]:
                 ToolParameter(name="data", type="string", description="JSON string of the data"),
                 ToolParameter(name="x", type="string", description="Column name for x-axis"),
                 ToolParameter(name="y", type="string", description="Column name for y-axis"),
-                ToolParameter(name="output_path", type="string", description="Path to
\ No newline at end of file
+                ToolParameter(name="output_path", type="string", description="Path to save the plot")
+            ],
+            function=plot_data,
+            category="system"
+        )
+    ]
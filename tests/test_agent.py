@@ -6,7 +6,7 @@ import os
 import sys
 import unittest
 import asyncio
-from unittest.mock import MagicMock, patch
+from unittest.mock import MagicMock, AsyncMock, patch
 import json
 
 # Add the project root to sys.path
@@ -37,7 +37,7 @@ class TestAgent(unittest.TestCase):
         mock_content.text = "This is a test response."
         mock_content.type = "text"
         mock_response.content = [mock_content]
-        self.agent.client.messages.create.return_value = mock_response
+        self.agent.client.messages.create = AsyncMock(return_value=mock_response)
     
     def tearDown(self):
         """Clean up after tests."""
@@ -50,6 +50,7 @@ class TestAgent(unittest.TestCase):
         self.assertEqual(len(self.agent.tools), 0)
         self.assertEqual(len(self.agent.tool_categories), 0)
         self.assertFalse(self.agent.use_rag)
+        self.assertEqual(self.agent.max_tokens, 4096)
     
     def test_register_tools(self):
         """Test tool registration."""
@@ -86,6 +87,41 @@ class TestAgent(unittest.TestCase):
         self.assertIn("test_tool1", self.agent.tool_categories["test"])
         self.assertIn("test_tool2", self.agent.tool_categories["test"])
     
+    def test_tool_definitions_cached(self):
+        """Test tool definitions are reused until new tools are registered."""
+        tool1 = Tool(
+            name="test_tool1",
+            description="Test tool 1",
+            parameters=[
+                ToolParameter(name="param1", type="string", description="Test parameter")
+            ],
+            function=lambda param1: {"result": param1},
+            category="test"
+        )
+        self.agent.register_tools([tool1])
+        
+        # Check definition format
+        definitions = self.agent._get_tool_definitions()
+        self.assertEqual(len(definitions), 1)
+        self.assertEqual(definitions[0]["name"], "test_tool1")
+        self.assertEqual(definitions[0]["input_schema"]["required"], ["param1"])
+        
+        # Same object is returned while tools are unchanged
+        self.assertIs(self.agent._get_tool_definitions(), definitions)
+        
+        # Registering a tool invalidates the cache
+        tool2 = Tool(
+            name="test_tool2",
+            description="Test tool 2",
+            parameters=[],
+            function=lambda: {"result": "success"},
+            category="test"
+        )
+        self.agent.register_tools([tool2])
+        self.assertEqual(len(self.agent._get_tool_definitions()), 2)
+        self.assertIs(self.agent.get_tool("test_tool2"), tool2)
+        self.assertIsNone(self.agent.get_tool("missing"))
+    
     def test_system_prompt_enrichment(self):
         """Test system prompt enrichment."""
         # Test basic enrichment
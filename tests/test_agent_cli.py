@@ -0,0 +1,104 @@
+"""
+Unit tests for the agent CLI
+"""
+
+import os
+import sys
+import json
+import asyncio
+import shutil
+import tempfile
+import unittest
+from collections import deque
+from unittest.mock import AsyncMock, MagicMock, patch
+from pathlib import Path
+
+# Add the project root to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import agent_cli
+from agent_cli import AgentCLI, HistoryLog
+
+def read_log(path):
+    """Read the (role, content) pairs from a history log."""
+    with open(path, "rb") as f:
+        return [(entry["role"], entry["content"]) for entry in map(json.loads, f)]
+
+class TestHistoryLog(unittest.TestCase):
+    """Test cases for the JSONL history log."""
+    
+    def setUp(self):
+        """Set up a temporary log directory and an event loop."""
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.log_path = self.test_dir / "logs" / "history.jsonl"
+        self.loop = asyncio.new_event_loop()
+    
+    def tearDown(self):
+        """Clean up after tests."""
+        self.loop.close()
+        shutil.rmtree(self.test_dir)
+    
+    def test_append_and_close(self):
+        """Test that queued turns are written in order by the time the log is closed."""
+        log = HistoryLog(str(self.log_path), self.loop)
+        log.append("user", "hello")
+        log.append("assistant", "hi there")
+        self.loop.run_until_complete(log.aclose())
+        
+        self.assertEqual(read_log(self.log_path), [("user", "hello"), ("assistant", "hi there")])
+        self.assertTrue(log._task is None)
+    
+    def test_rotates_full_log(self):
+        """Test that a full log is moved aside to a single backup."""
+        log = HistoryLog(str(self.log_path), self.loop)
+        with patch("agent_cli.HISTORY_LOG_MAX_BYTES", 1):
+            log.append("user", "first")
+            self.loop.run_until_complete(log._queue.join())
+            log.append("user", "second")
+            self.loop.run_until_complete(log._queue.join())
+            log.append("user", "third")
+            self.loop.run_until_complete(log.aclose())
+        
+        self.assertEqual(read_log(self.log_path), [("user", "third")])
+        self.assertEqual(read_log(f"{self.log_path}.1"), [("user", "second")])
+
+class TestAgentCLIHistory(unittest.TestCase):
+    """Test cases for the CLI's history handling."""
+    
+    def setUp(self):
+        """Set up a CLI with only the history state, since the full command table needs the whole CLI."""
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.log_path = self.test_dir / "history.jsonl"
+        
+        self.cli = AgentCLI.__new__(AgentCLI)
+        self.cli.agent = MagicMock()
+        self.cli.agent.client.close = AsyncMock()
+        self.cli.history = deque(maxlen=agent_cli.HISTORY_MAXLEN)
+        self.cli.loop = asyncio.new_event_loop()
+    
+    def tearDown(self):
+        """Clean up after tests."""
+        self.cli.close()
+        shutil.rmtree(self.test_dir)
+    
+    def test_add_history_without_log(self):
+        """Test that turns are only kept in memory when no log is configured."""
+        self.cli._history_log = None
+        self.cli.add_history("user", "hello")
+        
+        self.assertEqual(list(self.cli.history), [("user", "hello")])
+        self.assertFalse(self.log_path.exists())
+    
+    def test_close_flushes_history_log(self):
+        """Test that closing the CLI writes out every queued turn before shutting down."""
+        self.cli._history_log = HistoryLog(str(self.log_path), self.cli.loop)
+        self.cli.add_history("user", "hello")
+        self.cli.add_history("assistant", "hi there")
+        self.cli.close()
+        
+        self.assertEqual(read_log(self.log_path), [("user", "hello"), ("assistant", "hi there")])
+        self.cli.agent.client.close.assert_awaited_once()
+        self.assertTrue(self.cli.loop.is_closed())
+
+if __name__ == '__main__':
+    unittest.main()
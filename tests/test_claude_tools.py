@@ -5,26 +5,28 @@ Unit tests for Claude tools
 import os
 import sys
 import unittest
-from unittest.mock import MagicMock, patch
+import asyncio
+from unittest.mock import MagicMock, AsyncMock, patch
 import json
 
 # Add the project root to sys.path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from claude_tools import get_claude_tools
+from claude_tools import get_claude_tools, summarize_many
 
 class TestClaudeTools(unittest.TestCase):
     """Test cases for Claude tools."""
     
-    @patch('claude_tools.client')
-    def test_get_claude_tools(self, mock_client):
+    @patch('claude_tools.get_client')
+    def test_get_claude_tools(self, mock_get_client):
         """Test getting Claude tools."""
         # Mock client response
+        mock_client = mock_get_client.return_value
         mock_content = MagicMock()
         mock_content.text = "Mocked Claude response"
         mock_response = MagicMock()
         mock_response.content = [mock_content]
-        mock_client.messages.create.return_value = mock_response
+        mock_client.messages.create = AsyncMock(return_value=mock_response)
         
         # Get Claude tools
         tools = get_claude_tools()
@@ -42,15 +44,16 @@ class TestClaudeTools(unittest.TestCase):
             self.assertTrue(hasattr(tool, 'category'))
             self.assertEqual(tool.category, 'claude')
     
-    @patch('claude_tools.client')
-    async def test_summarize_text_tool(self, mock_client):
+    @patch('claude_tools.get_client')
+    async def test_summarize_text_tool(self, mock_get_client):
         """Test summarize_text tool."""
         # Mock client response
+        mock_client = mock_get_client.return_value
         mock_content = MagicMock()
         mock_content.text = "This is a summary."
         mock_response = MagicMock()
         mock_response.content = [mock_content]
-        mock_client.messages.create.return_value = mock_response
+        mock_client.messages.create = AsyncMock(return_value=mock_response)
         
         # Get Claude tools
         tools = get_claude_tools()
@@ -68,4 +71,24 @@ class TestClaudeTools(unittest.TestCase):
         mock_client.messages.create.assert_called_once()
         call_args = mock_client.messages.create.call_args[1]
         self.assertEqual(call_args["model"], "claude-3-opus-20240229")
-        self.assertIn("Summarize the following text", call_args["messages"][0]["content"])
\ No newline at end of file
+        self.assertIn("Summarize the following text", call_args["messages"][0]["content"])
+    
+    @patch('claude_tools.get_client')
+    def test_summarize_many(self, mock_get_client):
+        """Test summarizing several texts in one batch."""
+        # Mock client response
+        mock_client = mock_get_client.return_value
+        mock_content = MagicMock()
+        mock_content.text = "This is a summary."
+        mock_response = MagicMock()
+        mock_response.content = [mock_content]
+        mock_client.messages.create = AsyncMock(return_value=mock_response)
+        
+        # Summarize a batch of texts
+        results = asyncio.run(summarize_many(["First text", "Second text", "Third text"]))
+        
+        # Check that every text got its own summary, in order
+        self.assertEqual(len(results), 3)
+        for result in results:
+            self.assertEqual(result["summary"], "This is a summary.")
+        self.assertEqual(mock_client.messages.create.call_count, 3)
@@ -0,0 +1,322 @@
+"""
+Unit tests for the GitHub auto-sync tool
+"""
+
+import os
+import sys
+import time
+import base64
+import asyncio
+import shutil
+import tempfile
+import subprocess
+import unittest
+from unittest.mock import MagicMock, patch
+from pathlib import Path
+
+# Add the project root to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import git
+import github_auto_sync
+from github_auto_sync import GitHubSyncConfig, GitRepoManager, FileChangeHandler, next_sync_delay, watch_inotify
+from watchdog.events import FileModifiedEvent, FileMovedEvent, DirDeletedEvent, DirModifiedEvent
+
+def run_git(cwd, *args):
+    """Run a git command in a directory and return its output."""
+    return subprocess.run(['git', *args], cwd=cwd, check=True, capture_output=True, text=True).stdout.strip()
+
+class TempRepoTestCase(unittest.TestCase):
+    """Base class creating a work tree with a local bare repository as its origin."""
+    
+    def setUp(self):
+        """Set up a fresh repository and a manager with a mocked GitHub repository."""
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.work_dir = self.test_dir / "work"
+        self.work_dir.mkdir()
+        self.origin_dir = self.test_dir / "origin.git"
+        run_git(self.test_dir, 'init', '-q', '--bare', '-b', 'main', str(self.origin_dir))
+        
+        with patch.dict(os.environ, {"GITHUB_TOKEN": "test-token"}), patch("github_auto_sync.Github"):
+            self.config = GitHubSyncConfig(self.work_dir, "user/repo", commit_interval=0)
+            self.manager = GitRepoManager(self.config)
+        self.manager.repo.create_remote('origin', str(self.origin_dir))
+        self.manager.repo.git.checkout('-b', 'main')
+        self.gh_repo = self.manager.gh_repo
+    
+    def tearDown(self):
+        """Clean up after tests."""
+        self.manager.close()
+        shutil.rmtree(self.test_dir)
+    
+    def write(self, path, content):
+        """Write a file in the work tree, returning its absolute path."""
+        full_path = self.work_dir / path
+        full_path.parent.mkdir(parents=True, exist_ok=True)
+        full_path.write_text(content)
+        return str(full_path)
+    
+    def commit_and_push(self, message="initial"):
+        """Commit everything in the work tree and push it to the origin."""
+        run_git(self.work_dir, 'add', '-A')
+        run_git(self.work_dir, 'commit', '-q', '-m', message)
+        run_git(self.work_dir, 'push', '-q', 'origin', 'main')
+    
+    def origin_head(self):
+        """Get the commit the origin's main branch points at."""
+        return run_git(self.origin_dir, 'rev-parse', 'main')
+
+class TestStageChanges(TempRepoTestCase):
+    """Test cases for staging changed paths."""
+    
+    def setUp(self):
+        """Set up a repository with a pushed initial commit."""
+        super().setUp()
+        self.write("a.txt", "a")
+        self.write("b.txt", "b")
+        self.write("d/c.txt", "c")
+        self.write("d/e/f.txt", "f")
+        self.commit_and_push()
+    
+    def staged(self):
+        """Get the staged changes as sorted (status, path) pairs."""
+        output = run_git(self.work_dir, 'diff', '--cached', '--name-status', '--no-renames')
+        return sorted(tuple(line.split('\t')) for line in output.splitlines())
+    
+    def test_stage_changes_paths(self):
+        """Test that added, modified and deleted paths are staged through the index."""
+        modified = self.write("a.txt", "changed")
+        added = self.write("new.txt", "new")
+        deleted = str(self.work_dir / "b.txt")
+        os.unlink(deleted)
+        
+        self.assertTrue(self.manager.stage_changes([modified, added, deleted]))
+        self.assertEqual(self.staged(), [("A", "new.txt"), ("D", "b.txt"), ("M", "a.txt")])
+    
+    def test_stage_changes_porcelain_scan(self):
+        """Test that staging without paths picks up every change from one status scan."""
+        self.write("a.txt", "changed")
+        self.write("d/new.txt", "new")
+        os.unlink(self.work_dir / "b.txt")
+        
+        self.assertTrue(self.manager.stage_changes())
+        self.assertEqual(self.staged(), [("A", "d/new.txt"), ("D", "b.txt"), ("M", "a.txt")])
+        self.assertFalse(self.manager.stage_changes([]))
+    
+    def test_stage_changes_removed_directory(self):
+        """Test that a removed directory stages every tracked file beneath it as deleted."""
+        shutil.move(str(self.work_dir / "d"), str(self.test_dir / "moved"))
+        
+        self.assertTrue(self.manager.stage_changes([str(self.work_dir / "d")]))
+        self.assertEqual(self.staged(), [("D", "d/c.txt"), ("D", "d/e/f.txt")])
+    
+    def test_stage_changes_vanishing_path(self):
+        """Test that a path deleted while being hashed is staged as deleted without stopping later passes."""
+        hash_paths = self.manager._hash_paths
+        
+        def delete_then_hash(paths):
+            os.unlink(self.work_dir / "a.txt")
+            return hash_paths(paths)
+        
+        paths = [self.write("a.txt", "changed"), self.write("b.txt", "changed")]
+        with patch.object(self.manager, "_hash_paths", side_effect=delete_then_hash):
+            self.assertTrue(self.manager.stage_changes(paths))
+        self.assertEqual(self.staged(), [("D", "a.txt"), ("M", "b.txt")])
+        
+        # The restarted hash-object process serves the next pass
+        self.assertTrue(self.manager.stage_changes([self.write("d/c.txt", "changed")]))
+        self.assertIn(("M", "d/c.txt"), self.staged())
+    
+    def test_stage_changes_update_index_failure(self):
+        """Test that a failed update-index falls back to git add."""
+        paths = [self.write("a.txt", "changed")]
+        with patch("github_auto_sync.subprocess.run", side_effect=subprocess.CalledProcessError(128, "git")):
+            self.assertTrue(self.manager.stage_changes(paths))
+        self.assertEqual(self.staged(), [("M", "a.txt")])
+    
+    def test_stage_changes_path_filter(self):
+        """Test that paths rejected by path_filter are never staged."""
+        self.manager.path_filter = lambda path: path.endswith(".log")
+        paths = [self.write("a.txt", "changed"), self.write("debug.log", "noise")]
+        
+        self.assertTrue(self.manager.stage_changes(paths))
+        self.assertEqual(self.staged(), [("M", "a.txt")])
+    
+    def test_setup_remote_credential_helper(self):
+        """Test that pushes authenticate through the environment-backed credential helper."""
+        self.gh_repo.full_name = "user/repo"
+        self.manager.setup_remote()
+        
+        helper = run_git(self.work_dir, 'config', '--get', 'credential.https://github.com.helper')
+        self.assertEqual(helper, github_auto_sync.CREDENTIAL_HELPER)
+        self.assertEqual(run_git(self.work_dir, 'remote', 'get-url', 'origin'), "https://github.com/user/repo.git")
+
+class TestFileChangeHandler(TempRepoTestCase):
+    """Test cases for collecting file events and debouncing syncs."""
+    
+    def setUp(self):
+        """Set up a handler for the temporary work tree."""
+        super().setUp()
+        self.write(".gitignore", "*.tmp\n")
+        self.handler = FileChangeHandler(self.manager)
+    
+    def test_dispatch_records_paths(self):
+        """Test that events record their paths and wake the sync loop."""
+        path = str(self.work_dir / "a.txt")
+        self.handler.dispatch(FileModifiedEvent(path))
+        
+        self.assertTrue(self.handler._wake.is_set())
+        self.assertEqual(self.handler.take_pending_paths(), {path})
+        self.assertFalse(self.handler.pending_sync)
+    
+    def test_dispatch_moves_and_directories(self):
+        """Test that moves record both ends and removed directories are kept."""
+        source, dest = str(self.work_dir / "a.tmp"), str(self.work_dir / "a.txt")
+        self.handler.dispatch(FileMovedEvent(source, dest))
+        self.handler.dispatch(DirDeletedEvent(str(self.work_dir / "d")))
+        self.handler.dispatch(DirModifiedEvent(str(self.work_dir / "e")))
+        
+        self.assertEqual(self.handler.take_pending_paths(), {dest, str(self.work_dir / "d")})
+    
+    def test_dispatch_ignores_git_and_ignored_paths(self):
+        """Test that git's own writes and ignored paths are dropped."""
+        self.handler.dispatch(FileModifiedEvent(str(self.work_dir / ".git" / "index")))
+        self.handler.dispatch(FileModifiedEvent(str(self.work_dir / "scratch.tmp")))
+        
+        self.assertFalse(self.handler.pending_sync)
+        self.assertFalse(self.handler._wake.is_set())
+    
+    def test_next_sync_delay(self):
+        """Test that pending changes wait for the debounce window and the commit interval."""
+        self.assertIsNone(next_sync_delay(self.handler, self.manager))
+        
+        self.handler.record_paths([str(self.work_dir / "a.txt")])
+        self.assertAlmostEqual(next_sync_delay(self.handler, self.manager),
+                               github_auto_sync.SYNC_DEBOUNCE_SECONDS, delta=0.5)
+        
+        # Once events stop, only the commit interval is left to wait for
+        self.handler.last_event_time -= github_auto_sync.SYNC_DEBOUNCE_SECONDS
+        self.assertLessEqual(next_sync_delay(self.handler, self.manager), 0)
+        
+        self.config.commit_interval = 60
+        self.manager.last_commit_time = time.time()
+        self.assertAlmostEqual(next_sync_delay(self.handler, self.manager), 60, delta=0.5)
+    
+    @unittest.skipIf(github_auto_sync.Inotify is None, "asyncinotify is not installed")
+    def test_watch_inotify(self):
+        """Test that the asyncio watcher records new files and removed directories."""
+        self.write("d/c.txt", "c")
+        
+        async def run():
+            wake = asyncio.Event()
+            watcher = asyncio.create_task(watch_inotify(self.handler, str(self.work_dir), wake))
+            await asyncio.sleep(0.1)
+            try:
+                self.write("a.txt", "a")
+                shutil.move(str(self.work_dir / "d"), str(self.test_dir / "moved"))
+                await asyncio.wait_for(wake.wait(), 1)
+                await asyncio.sleep(0.1)
+            finally:
+                watcher.cancel()
+        
+        asyncio.run(run())
+        self.assertEqual(self.handler.take_pending_paths(), {str(self.work_dir / "a.txt"), str(self.work_dir / "d")})
+
+class TestPushViaApi(TempRepoTestCase):
+    """Test cases for committing small change sets through the GitHub API."""
+    
+    def setUp(self):
+        """Set up a mocked GitHub repository that commits the local index to the origin."""
+        super().setUp()
+        self.uploads = []
+        
+        def get_git_ref(name):
+            return MagicMock(object=MagicMock(sha=self.origin_head()))
+        
+        def create_git_blob(content, encoding):
+            self.uploads.append(content)
+            return MagicMock(sha="a" * 40)
+        
+        def create_git_commit(message, tree, parents):
+            # Stand in for GitHub by committing the staged tree straight to the origin
+            tree_sha = run_git(self.work_dir, 'write-tree')
+            sha = run_git(self.work_dir, 'commit-tree', tree_sha, '-p', parents[0].sha, '-m', message)
+            run_git(self.work_dir, 'push', '-q', 'origin', f"{sha}:refs/heads/main")
+            return MagicMock(sha=sha)
+        
+        self.gh_repo.get_git_ref.side_effect = get_git_ref
+        self.gh_repo.get_git_commit.side_effect = lambda sha: MagicMock(sha=sha)
+        self.gh_repo.create_git_blob.side_effect = create_git_blob
+        self.gh_repo.create_git_commit.side_effect = create_git_commit
+    
+    def test_push_via_api_moves_local_branch(self):
+        """Test that an API commit uploads the staged content and moves the local branch onto it."""
+        self.write("a.txt", "first")
+        self.commit_and_push()
+        
+        path = self.write("a.txt", "second")
+        self.assertTrue(self.manager.sync_if_needed(paths=[path]))
+        
+        self.assertEqual(len(self.uploads), 1)
+        self.assertEqual(self.manager.repo.head.commit.hexsha, self.origin_head())
+        self.assertEqual(run_git(self.work_dir, 'status', '--porcelain'), "")
+    
+    def test_push_via_api_uploads_on_workers(self):
+        """Test that several blobs are uploaded on workers with their own clients, keeping path order."""
+        self.write("a.txt", "first")
+        self.commit_and_push()
+        
+        clients = []
+        
+        def make_client(token, seconds_between_writes):
+            client = MagicMock()
+            client.get_repo.return_value.create_git_blob.side_effect = (
+                lambda content, encoding: MagicMock(sha=base64.b64decode(content).decode().rjust(40, "0"))
+            )
+            clients.append((client, seconds_between_writes))
+            return client
+        
+        paths = [self.write(f"{name}.txt", name) for name in ("b", "c", "d", "e", "f")]
+        with patch("github_auto_sync.Github", side_effect=make_client):
+            self.assertTrue(self.manager.sync_if_needed(paths=paths))
+        
+        self.assertEqual(len(clients), github_auto_sync.API_PUSH_UPLOAD_WORKERS)
+        self.assertTrue(all(interval == github_auto_sync.API_PUSH_WRITE_INTERVAL for _, interval in clients))
+        tree = self.gh_repo.create_git_tree.call_args[0][0]
+        self.assertEqual([element._identity["sha"][-1] for element in tree], ["b", "c", "d", "e", "f"])
+    
+    def test_push_via_api_unborn_head(self):
+        """Test that the first commit of a new repository is pushed with git instead."""
+        path = self.write("a.txt", "first")
+        self.assertTrue(self.manager.sync_if_needed(paths=[path]))
+        
+        self.gh_repo.create_git_commit.assert_not_called()
+        self.assertEqual(self.manager.repo.head.commit.hexsha, self.origin_head())
+    
+    def test_push_via_api_fetch_failure(self):
+        """Test that a failed fetch after an API commit is retried before the next commit."""
+        self.write("a.txt", "first")
+        self.commit_and_push()
+        
+        git_command = self.manager._git
+        
+        def failing_fetch(*args):
+            if args[0] == 'fetch':
+                raise git.GitCommandError(['git', 'fetch'], 128)
+            return git_command(*args)
+        
+        with patch.object(self.manager, "_git", side_effect=failing_fetch):
+            self.assertTrue(self.manager.sync_if_needed(paths=[self.write("a.txt", "second")]))
+            api_commit = self.origin_head()
+            self.assertNotEqual(self.manager.repo.head.commit.hexsha, api_commit)
+            
+            # Nothing is committed on the stale branch while the fetch keeps failing
+            self.assertFalse(self.manager.sync_if_needed(paths=[self.write("b.txt", "other")]))
+            self.assertEqual(self.origin_head(), api_commit)
+        
+        self.assertTrue(self.manager.sync_if_needed(paths=[str(self.work_dir / "b.txt")]))
+        self.assertEqual(run_git(self.origin_dir, 'rev-parse', 'main~1'), api_commit)
+        self.assertEqual(self.manager.repo.head.commit.hexsha, self.origin_head())
+
+if __name__ == '__main__':
+    unittest.main()
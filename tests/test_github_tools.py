@@ -27,19 +27,20 @@ class TestGitHubAPI(unittest.TestCase):
         # Create API instance
         self.api = GitHubAPI()
         
-        # Mock requests
-        self.requests_patcher = patch('github_tools.requests')
-        self.mock_requests = self.requests_patcher.start()
+        # Mock the HTTP session
+        self.session_patcher = patch.object(self.api, 'session')
+        self.mock_session = self.session_patcher.start()
         
         # Set up mock response
         mock_response = MagicMock()
+        mock_response.content = b'{"success": true}'
         mock_response.json.return_value = {"success": True}
-        self.mock_requests.get.return_value = mock_response
+        self.mock_session.get.return_value = mock_response
     
     def tearDown(self):
         """Clean up after tests."""
         self.env_patcher.stop()
-        self.requests_patcher.stop()
+        self.session_patcher.stop()
     
     def test_initialization(self):
         """Test GitHubAPI initialization."""
@@ -47,6 +48,14 @@ class TestGitHubAPI(unittest.TestCase):
         self.assertEqual(self.api.headers["Authorization"], "token mock-github-token")
         self.assertEqual(self.api.headers["Accept"], "application/vnd.github.v3+json")
     
+    def test_session_configuration(self):
+        """Test that the session carries auth headers and retries rate limits."""
+        api = GitHubAPI()
+        self.assertEqual(api.session.headers["Authorization"], "token mock-github-token")
+        
+        adapter = api.session.get_adapter("https://api.github.com")
+        self.assertIn(429, adapter.max_retries.status_forcelist)
+    
     def test_get_request(self):
         """Test GET request."""
         # Make a GET request
@@ -55,11 +64,12 @@ class TestGitHubAPI(unittest.TestCase):
         # Check if response is correct
         self.assertEqual(response, {"success": True})
         
-        # Check if requests was called correctly
-        self.mock_requests.get.assert_called_once_with(
+        # Check if the session was called correctly
+        self.mock_session.get.assert_called_once_with(
             "https://api.github.com/repos/owner/repo",
-            headers=self.api.headers,
-            params=None
+            params=None,
+            headers=None,
+            timeout=10
         )
     
     def test_get_request_with_params(self):
@@ -71,16 +81,87 @@ class TestGitHubAPI(unittest.TestCase):
         # Check if response is correct
         self.assertEqual(response, {"success": True})
         
-        # Check if requests was called correctly
-        self.mock_requests.get.assert_called_once_with(
+        # Check if the session was called correctly
+        self.mock_session.get.assert_called_once_with(
             "https://api.github.com/repos/owner/repo/issues",
-            headers=self.api.headers,
-            params=params
+            params=params,
+            headers=None,
+            timeout=10
         )
+    
+    def test_get_request_cached(self):
+        """Test that repeated requests are served from the cache and revalidated by ETag."""
+        url = "https://api.github.com/repos/owner/repo"
+        first = self.mock_session.get.return_value
+        first.status_code = 200
+        first.headers = {"ETag": '"abc"'}
+        
+        self.assertEqual(self.api.get(url), {"success": True})
+        self.assertEqual(self.api.get(url), {"success": True})
+        self.mock_session.get.assert_called_once()
+        
+        # Once expired, the entry is revalidated and a 304 reuses the cached data
+        key = (url, frozenset())
+        etag, data, _ = self.api._cache[key]
+        self.api._cache[key] = (etag, data, 0)
+        self.mock_session.get.return_value = MagicMock(status_code=304)
+        
+        self.assertEqual(self.api.get(url), {"success": True})
+        self.assertEqual(self.mock_session.get.call_args.kwargs["headers"], {"If-None-Match": '"abc"'})
+
+    def test_get_async_request(self):
+        """Test async GET request, retrying after a rate limit."""
+        import asyncio
+        from unittest.mock import AsyncMock
+        
+        limited = MagicMock(status_code=429, headers={"Retry-After": "0"})
+        ok = MagicMock(status_code=200, content=b'{"success": true}')
+        ok.json.return_value = {"success": True}
+        
+        with patch.object(GitHubAPI, 'async_client') as mock_client:
+            mock_client.get = AsyncMock(side_effect=[limited, ok])
+            response = asyncio.run(self.api.get_async("https://api.github.com/repos/owner/repo"))
+        
+        self.assertEqual(response, {"success": True})
+        self.assertEqual(mock_client.get.call_count, 2)
+        ok.raise_for_status.assert_called_once()
+
+    def test_async_client_per_event_loop(self):
+        """Test that each event loop gets its own async client, reused within that loop."""
+        import asyncio
+        
+        async def clients():
+            client = self.api.async_client
+            self.assertIs(self.api.async_client, client)
+            return client
+        
+        first = asyncio.run(clients())
+        second = asyncio.run(clients())
+        self.assertIsNot(first, second)
+        
+        # Closing only drops the running loop's client
+        async def close():
+            client = self.api.async_client
+            await self.api.aclose()
+            self.assertTrue(client.is_closed)
+            self.assertIsNot(self.api.async_client, client)
+            await self.api.aclose()
+        
+        asyncio.run(close())
+        self.assertFalse(second.is_closed)
 
 class TestGitHubTools(unittest.TestCase):
     """Test cases for GitHub tools."""
     
+    def setUp(self):
+        """Set up test environment."""
+        # Tools are built once per process; rebuild them around each test's mocks
+        get_github_tools.cache_clear()
+    
+    def tearDown(self):
+        """Clean up after tests."""
+        get_github_tools.cache_clear()
+    
     @patch('github_tools.GitHubAPI')
     def test_get_github_tools(self, mock_api_class):
         """Test getting GitHub tools."""
@@ -103,4 +184,33 @@ class TestGitHubTools(unittest.TestCase):
             self.assertTrue(hasattr(tool, 'parameters'))
             self.assertTrue(hasattr(tool, 'function'))
             self.assertTrue(hasattr(tool, 'category'))
-            self.assertEqual(tool.category, 'github')
\ No newline at end of file
+            self.assertEqual(tool.category, 'github')
+        
+        # Subsequent calls reuse the same tools
+        self.assertIs(get_github_tools(), tools)
+    
+    @patch('github_tools.GitHubAPI')
+    def test_list_issues_filters(self, mock_api_class):
+        """Test that list filters are passed to the API and unset ones are left out."""
+        import asyncio
+        from unittest.mock import AsyncMock
+        mock_api = mock_api_class.return_value
+        mock_api.get_async = AsyncMock(return_value=[])
+        
+        tools = {tool.name: tool for tool in get_github_tools()}
+        asyncio.run(tools["list_issues"].function("owner", "repo", labels="bug"))
+        
+        mock_api.get_async.assert_called_once_with(
+            "https://api.github.com/repos/owner/repo/issues",
+            {"state": "open", "labels": "bug", "per_page": 10}
+        )
+    
+    @patch('github_tools.GitHubAPI')
+    def test_search_code_requires_scope(self, mock_api_class):
+        """Test that unscoped code searches are rejected before any request."""
+        import asyncio
+        tools = {tool.name: tool for tool in get_github_tools()}
+        
+        with self.assertRaises(ValueError):
+            asyncio.run(tools["search_code"].function("def main"))
+        mock_api_class.return_value.get_async.assert_not_called()
\ No newline at end of file
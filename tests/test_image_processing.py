@@ -8,13 +8,14 @@ import unittest
 import tempfile
 from unittest.mock import MagicMock, patch
 import base64
+import io
 from pathlib import Path
 import shutil
 
 # Add the project root to sys.path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from image_processing import ImageProcessor, ImageAnalyzer, get_image_tools
+from image_processing import ImageProcessor, ImageAnalyzer, LRUDictCache, get_image_tools
 
 class TestImageProcessor(unittest.TestCase):
     """Test cases for the ImageProcessor class."""
@@ -53,6 +54,49 @@ class TestImageProcessor(unittest.TestCase):
         except Exception:
             self.fail("Invalid base64 data")
     
+    def test_encode_image_base64_cached(self):
+        """Test that re-encoding an unchanged image reuses the cached result."""
+        first = ImageProcessor.encode_image_base64(str(self.test_image_path))
+        second = ImageProcessor.encode_image_base64(str(self.test_image_path))
+        self.assertIs(first, second)
+        
+        # Rewriting the file invalidates the cached entry
+        from PIL import Image
+        Image.new('RGB', (50, 50), color='blue').save(self.test_image_path)
+        stat = os.stat(self.test_image_path)
+        os.utime(self.test_image_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+        third = ImageProcessor.encode_image_base64(str(self.test_image_path))
+        self.assertNotEqual(first["source"]["data"], third["source"]["data"])
+    
+    def test_encode_image_base64_shared_content(self):
+        """Test that the same image content at another path shares a cache entry."""
+        copy_path = self.test_image_dir / "copy.jpg"
+        shutil.copyfile(self.test_image_path, copy_path)
+        first = ImageProcessor.encode_image_base64(str(self.test_image_path))
+        second = ImageProcessor.encode_image_base64(str(copy_path))
+        self.assertIs(first, second)
+    
+    def test_encode_images_base64(self):
+        """Test encoding several images concurrently."""
+        import asyncio
+        from PIL import Image
+        second_path = self.test_image_dir / "second.png"
+        Image.new('RGB', (10, 10), color='green').save(second_path)
+        
+        results = asyncio.run(ImageProcessor.encode_images_base64(
+            [str(self.test_image_path), str(second_path)]
+        ))
+        
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[0]["source"]["media_type"], "image/jpeg")
+        self.assertEqual(results[1]["source"]["media_type"], "image/png")
+        
+        # A cached image is returned without going to a worker thread
+        with patch("asyncio.to_thread") as mock_to_thread:
+            cached = asyncio.run(ImageProcessor.encode_image_base64_async(str(second_path)))
+        mock_to_thread.assert_not_called()
+        self.assertIs(cached, results[1])
+    
     def test_encode_image_url(self):
         """Test encoding image URL."""
         # Encode URL
@@ -76,6 +120,100 @@ class TestImageProcessor(unittest.TestCase):
         if optimized_path != str(self.test_image_path):
             # Clean up optimized image
             os.unlink(optimized_path)
+    
+    def test_optimize_image_reuses_unchanged_output(self):
+        """Test that a cached optimized path is only reused while its file is unchanged."""
+        from PIL import Image
+        red_path = ImageProcessor.optimize_image(str(self.test_image_path), max_width=50, max_height=50)
+        self.assertNotEqual(red_path, str(self.test_image_path))
+        self.assertEqual(ImageProcessor.optimize_image(str(self.test_image_path), max_width=50, max_height=50), red_path)
+        
+        # Another image with the same stem overwrites the shared output file
+        Image.new('RGB', (100, 100), color='blue').save(self.test_image_path)
+        ImageProcessor.optimize_image(str(self.test_image_path), max_width=60, max_height=60)
+        
+        Image.new('RGB', (100, 100), color='red').save(self.test_image_path)
+        ImageProcessor.optimize_image(str(self.test_image_path), max_width=50, max_height=50)
+        with Image.open(red_path) as img:
+            self.assertEqual(img.size, (50, 50))
+            self.assertGreater(img.getpixel((0, 0))[0], 200)
+    
+    def test_optimize_image_to_bytes(self):
+        """Test in-memory image optimization and encoding."""
+        data, media_type = ImageProcessor.optimize_image_to_bytes(str(self.test_image_path), max_size_mb=1.0)
+        self.assertEqual(media_type, "image/jpeg")
+        self.assertTrue(data.startswith(b"\xff\xd8"))
+        
+        result = ImageProcessor.encode_image_bytes(data, media_type)
+        self.assertEqual(result["source"]["media_type"], "image/jpeg")
+        self.assertEqual(base64.b64decode(result["source"]["data"]), data)
+    
+    def test_optimize_image_to_bytes_mpo(self):
+        """Test that multi-picture JPEGs from cameras are labelled and optimized as JPEG."""
+        from PIL import Image
+        mpo_path = self.test_image_dir / "camera.jpg"
+        frames = [Image.new('RGB', (400, 300), color='red'), Image.new('RGB', (400, 300), color='blue')]
+        frames[0].save(mpo_path, format="MPO", save_all=True, append_images=frames[1:])
+        with Image.open(mpo_path) as img:
+            self.assertEqual(img.format, "MPO")
+        
+        # Small enough to send as is
+        _, media_type = ImageProcessor.optimize_image_to_bytes(str(mpo_path), max_size_mb=1.0)
+        self.assertEqual(media_type, "image/jpeg")
+        
+        # Resized through the JPEG path
+        with patch("image_processing.HAS_TORCHVISION", False):
+            data, media_type = ImageProcessor.optimize_image_to_bytes(str(mpo_path), max_width=200)
+        self.assertEqual(media_type, "image/jpeg")
+        with Image.open(io.BytesIO(data)) as img:
+            self.assertEqual((img.format, img.size), ("JPEG", (200, 150)))
+    
+    def test_optimize_image_to_bytes_max_pixels(self):
+        """Test that large images are scaled down to the pixel budget."""
+        from PIL import Image
+        import io
+        large_path = self.test_image_dir / "large.jpg"
+        Image.new('RGB', (2000, 1500), color='green').save(large_path)
+        
+        data, _ = ImageProcessor.optimize_image_to_bytes(str(large_path), max_pixels=300_000)
+        with Image.open(io.BytesIO(data)) as img:
+            self.assertLessEqual(img.width * img.height, 300_000)
+            self.assertAlmostEqual(img.width / img.height, 2000 / 1500, places=1)
+
+class TestImageAnalyzer(unittest.TestCase):
+    """Test cases for the ImageAnalyzer class."""
+    
+    @patch('anthropic_client.get_client')
+    def test_analyze_images(self, mock_get_client):
+        """Test that several images are sent in a single request."""
+        import asyncio
+        from unittest.mock import AsyncMock
+        
+        mock_client = MagicMock()
+        mock_client.messages.create = AsyncMock(return_value=MagicMock(content=[MagicMock(text="Two red squares")]))
+        mock_get_client.return_value = mock_client
+        
+        with patch('image_processing._prepare_image', side_effect=lambda path: {"type": "image", "path": path}):
+            result = asyncio.run(ImageAnalyzer().analyze_images(["a.jpg", "b.jpg"], "Compare these"))
+        
+        self.assertEqual(result, "Two red squares")
+        mock_client.messages.create.assert_awaited_once()
+        content = mock_client.messages.create.call_args.kwargs["messages"][0]["content"]
+        self.assertEqual([block["type"] for block in content], ["image", "image", "text"])
+
+class TestLRUDictCache(unittest.TestCase):
+    """Test cases for the LRUDictCache class."""
+    
+    def test_evicts_beyond_max_bytes(self):
+        """Test that entries are evicted once their total size exceeds max_bytes."""
+        cache = LRUDictCache(maxsize=10, max_bytes=10, sizeof=len)
+        cache.put("a", "xxxx")
+        cache.put("b", "xxxx")
+        cache.get("a")
+        cache.put("c", "xxxx")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), "xxxx")
+        self.assertEqual(cache.get("c"), "xxxx")
 
 class TestImageTools(unittest.TestCase):
     """Test cases for image tools."""
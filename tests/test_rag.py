@@ -5,17 +5,20 @@ Unit tests for RAG system
 import os
 import sys
 import unittest
+import asyncio
 import tempfile
 import shutil
 from unittest.mock import MagicMock, patch
 from pathlib import Path
 import json
+import numpy as np
 
 # Add the project root to sys.path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from rag import RAGSystem, Document, VectorStore, EmbeddingGenerator
-from rag_enhancements import DocumentProcessor, HybridSearcher, DocumentCollection, CollectionManager
+import rag_enhancements
+from rag_enhancements import DocumentProcessor, HybridSearcher, KeywordIndex, EmbeddingBatcher, DocumentCollection, CollectionManager, batch_cosine
 
 class TestVectorStore(unittest.TestCase):
     """Test cases for the VectorStore class."""
@@ -136,6 +139,12 @@ class TestDocumentProcessor(unittest.TestCase):
         self.assertTrue("processed_at" in metadata)
         self.assertTrue("word_count" in metadata)
         self.assertTrue("char_count" in metadata)
+        
+        # Identical content hashes identically, whatever the file name
+        copy_path = self.test_dir / "copy.txt"
+        shutil.copy(self.test_txt_path, copy_path)
+        _, copy_metadata = DocumentProcessor.extract_text_from_file(str(copy_path))
+        self.assertEqual(copy_metadata["content_hash"], metadata["content_hash"])
     
     def test_extract_text_from_file_html(self):
         """Test extracting text from an HTML file."""
@@ -155,6 +164,143 @@ class TestDocumentProcessor(unittest.TestCase):
         self.assertTrue("processed_at" in metadata)
         self.assertTrue("word_count" in metadata)
         self.assertTrue("char_count" in metadata)
+    
+    def test_extract_text_from_file_csv(self):
+        """Test that CSV rows are streamed as tab-separated lines."""
+        csv_path = self.test_dir / "test.csv"
+        with open(csv_path, 'w') as f:
+            f.write("name,count\napples,3\n\"bananas, ripe\",5\n")
+        
+        text, metadata = DocumentProcessor.extract_text_from_file(str(csv_path))
+        
+        self.assertEqual(text, "name\tcount\napples\t3\nbananas, ripe\t5\n")
+        self.assertEqual(metadata["type"], "csv")
+    
+    def test_extract_text_from_file_excel(self):
+        """Test that every worksheet is streamed as tab-separated rows."""
+        import openpyxl
+        
+        excel_path = self.test_dir / "test.xlsx"
+        workbook = openpyxl.Workbook()
+        workbook.active.title = "Fruit"
+        workbook.active.append(["name", "count"])
+        workbook.active.append(["apples", 3])
+        workbook.create_sheet("Empty")
+        workbook.save(excel_path)
+        
+        text, metadata = DocumentProcessor.extract_text_from_file(str(excel_path))
+        
+        self.assertEqual(text, "Sheet: Fruit\nname\tcount\napples\t3\n\nSheet: Empty\n\n")
+        self.assertEqual(metadata["type"], "excel")
+    
+    @unittest.skipIf(rag_enhancements.fitz is None, "PyMuPDF is not installed")
+    def test_extract_text_from_pdf_parallel(self):
+        """Test that page ranges extracted in worker processes are joined in page order."""
+        import fitz
+        
+        pdf_path = self.test_dir / "test.pdf"
+        with fitz.open() as doc:
+            for i in range(5):
+                doc.new_page().insert_text((72, 72), f"Page {i}")
+            doc.save(pdf_path)
+        
+        with patch("rag_enhancements.PDF_PARALLEL_MIN_PAGES", 2), patch("os.cpu_count", return_value=4):
+            text = DocumentProcessor.extract_text_from_pdf(str(pdf_path))
+        
+        self.assertEqual([line for line in text.split("\n") if line], [f"Page {i}" for i in range(5)])
+
+class TestKeywordIndex(unittest.TestCase):
+    """Test cases for the KeywordIndex class."""
+    
+    def test_search(self):
+        """Test that chunks are scored by term frequency plus a phrase bonus."""
+        index = KeywordIndex([
+            {"id": "a", "content": "The cat sat on the cat mat"},
+            {"id": "b", "content": "A dog"},
+            {"id": "c", "content": "cat sat"}
+        ])
+        
+        results = index.search("cat sat")
+        
+        self.assertEqual([r["chunk"]["id"] for r in results], ["a", "c"])
+        self.assertEqual([r["score"] for r in results], [6.0, 5.0])
+        self.assertEqual(index.search("unicorn"), [])
+
+class TestEmbeddingBatcher(unittest.TestCase):
+    """Test cases for the EmbeddingBatcher class."""
+    
+    def test_embed_all_batches_concurrent_callers(self):
+        """Test that texts from concurrent callers share provider calls."""
+        calls = []
+        
+        async def embed_many(texts):
+            calls.append(list(texts))
+            return [[float(len(text))] for text in texts]
+        
+        async def run():
+            batcher = EmbeddingBatcher(embed_many, batch_size=4, max_wait_ms=1)
+            try:
+                return await asyncio.gather(
+                    batcher.embed_all(["a", "bb", "ccc"]),
+                    batcher.embed_all(["dddd", "eeeee", "ffffff", "g"])
+                )
+            finally:
+                await batcher.close()
+        
+        first, second = asyncio.run(run())
+        
+        self.assertEqual(first, [[1.0], [2.0], [3.0]])
+        self.assertEqual(second, [[4.0], [5.0], [6.0], [1.0]])
+        self.assertEqual([len(batch) for batch in calls], [4, 3])
+    
+    def test_embed_propagates_errors(self):
+        """Test that a failed provider call fails every text in its batch."""
+        async def embed_many(texts):
+            raise RuntimeError("provider down")
+        
+        async def run():
+            batcher = EmbeddingBatcher(embed_many, max_wait_ms=1)
+            try:
+                return await asyncio.gather(batcher.embed("a"), batcher.embed("b"), return_exceptions=True)
+            finally:
+                await batcher.close()
+        
+        results = asyncio.run(run())
+        
+        self.assertTrue(all(isinstance(result, RuntimeError) for result in results))
+    
+    def test_embed_rejects_short_responses(self):
+        """Test that a provider returning too few embeddings fails the whole batch."""
+        async def embed_many(texts):
+            return [[1.0]] * (len(texts) - 1)
+        
+        async def run():
+            batcher = EmbeddingBatcher(embed_many, max_wait_ms=1)
+            try:
+                return await asyncio.wait_for(
+                    asyncio.gather(batcher.embed("a"), batcher.embed("b"), return_exceptions=True), 1
+                )
+            finally:
+                await batcher.close()
+        
+        results = asyncio.run(run())
+        
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+
+class TestBatchCosine(unittest.TestCase):
+    """Test cases for the batch_cosine helper."""
+    
+    def test_batch_cosine(self):
+        """Test that every query is scored against every row, with or without SimSIMD."""
+        import numpy as np
+        
+        queries = np.array([[3.0, 4.0], [1.0, 0.0]], dtype=np.float32)
+        matrix = np.array([[6.0, 8.0], [0.0, 0.0], [0.0, 2.0]], dtype=np.float32)
+        expected = [[1.0, 0.0, 0.8], [0.6, 0.0, 0.0]]
+        
+        np.testing.assert_allclose(batch_cosine(queries, matrix), expected, atol=1e-5)
+        with patch("rag_enhancements.simsimd", None):
+            np.testing.assert_allclose(batch_cosine(queries, matrix), expected, atol=1e-5)
 
 class TestCollectionManager(unittest.TestCase):
     """Test cases for the CollectionManager class."""
@@ -239,4 +385,275 @@ class TestCollectionManager(unittest.TestCase):
         collection_names = [c["name"] for c in collections]
         self.assertIn("default", collection_names)
         self.assertIn("test_collection1", collection_names)
-        self.assertIn("test_collection2", collection_names)
\ No newline at end of file
+        self.assertIn("test_collection2", collection_names)
+    
+    def test_collections_load_lazily(self):
+        """Test that collections are only instantiated when first used."""
+        self.collection_manager.create_collection("test_collection")
+        
+        manager = CollectionManager(str(self.test_dir))
+        self.assertIn("test_collection", manager.collections)
+        self.assertIsNone(manager.collections["test_collection"])
+        
+        # Listing reads metadata without loading the collection
+        self.assertIn("test_collection", [c["name"] for c in manager.list_collections()])
+        self.assertIsNone(manager.collections["test_collection"])
+        
+        collection = manager.get_collection("test_collection")
+        self.assertIs(manager.get_collection("test_collection"), collection)
+
+def make_chunk(chunk_id, document_id, content, embedding):
+    """Create a chunk object like the ones produced by the RAG system."""
+    chunk = MagicMock(id=chunk_id, document_id=document_id, content=content, embedding=embedding)
+    chunk.dict.return_value = {
+        "id": chunk_id,
+        "document_id": document_id,
+        "content": content,
+        "embedding": embedding,
+        "metadata": {}
+    }
+    return chunk
+
+class TestDocumentCollection(unittest.TestCase):
+    """Test cases for the DocumentCollection class."""
+    
+    def setUp(self):
+        """Set up test environment."""
+        # Create a test directory
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.collection = DocumentCollection("test", str(self.test_dir))
+    
+    def tearDown(self):
+        """Clean up after tests."""
+        # Remove test directory
+        shutil.rmtree(self.test_dir)
+    
+    def test_search(self):
+        """Test that search ranks chunks by cosine similarity."""
+        self.collection.add_chunk(make_chunk("a", "doc1", "apples", [1.0, 0.0]))
+        self.collection.add_chunk(make_chunk("b", "doc1", "bananas", [0.0, 2.0]))
+        self.collection.add_chunk(make_chunk("c", "doc2", "cherries", [1.0, 1.0]))
+        
+        results = self.collection.search([0.0, 1.0], top_k=2)
+        
+        self.assertEqual([r["chunk"]["id"] for r in results], ["b", "c"])
+        self.assertAlmostEqual(results[0]["score"], 1.0, places=5)
+        
+        # Adding a chunk is visible to the next search
+        self.collection.add_chunk(make_chunk("d", "doc2", "dates", [0.0, 5.0]))
+        results = self.collection.search([0.0, 1.0], top_k=1)
+        self.assertIn(results[0]["chunk"]["id"], ["b", "d"])
+    
+    def test_search_batch(self):
+        """Test that batched queries each get their own ranking."""
+        self.collection.add_chunk(make_chunk("a", "doc1", "apples", [1.0, 0.0]))
+        self.collection.add_chunk(make_chunk("b", "doc1", "bananas", [0.0, 2.0]))
+        self.collection.add_chunk(make_chunk("c", "doc2", "cherries", [1.0, 1.0]))
+        
+        results = self.collection.search_batch([[0.0, 1.0], [3.0, 0.0], [0.0, 0.0]], top_k=2)
+        
+        self.assertEqual([[r["chunk"]["id"] for r in query_results] for query_results in results], [["b", "c"], ["a", "c"], []])
+        self.assertAlmostEqual(results[1][0]["score"], 1.0, places=5)
+    
+    def test_search_document_filter(self):
+        """Test that a document filter restricts scoring to that document's chunks."""
+        self.collection.add_chunk(make_chunk("a", "doc1", "apples", [1.0, 0.0]))
+        self.collection.add_chunk(make_chunk("b", "doc2", "bananas", [0.9, 0.1]))
+        self.collection.add_chunk(make_chunk("c", "doc2", "cherries", [0.0, 1.0]))
+        
+        results = self.collection.search([1.0, 0.0], top_k=2, document_ids=["doc2"])
+        
+        self.assertEqual([r["chunk"]["id"] for r in results], ["b", "c"])
+        self.assertEqual(self.collection.search([1.0, 0.0], document_ids=["missing"]), [])
+        
+        # The HNSW path applies the same filter through a faiss selector
+        if rag_enhancements.faiss is not None:
+            with patch("rag_enhancements.ANN_MIN_ROWS", 1):
+                self.collection._invalidate_index()
+                results = self.collection.search([1.0, 0.0], top_k=1, document_ids=["doc2"])
+            self.assertEqual([r["chunk"]["id"] for r in results], ["b"])
+    
+    def test_delete_document(self):
+        """Test that deleting a document removes its chunks and embeddings."""
+        document = MagicMock(id="doc1")
+        document.dict.return_value = {"id": "doc1"}
+        self.collection.add_document(document)
+        self.collection.add_chunk(make_chunk("a", "doc1", "apples", [1.0, 0.0]))
+        self.collection.add_chunk(make_chunk("b", "doc2", "bananas", [0.0, 1.0]))
+        
+        self.assertTrue(self.collection.delete_document("doc1"))
+        
+        self.assertIsNone(self.collection.get_chunk("a"))
+        self.assertEqual(self.collection.get_chunk("b")["embedding"], [0.0, 1.0])
+        self.assertEqual([r["chunk"]["id"] for r in self.collection.search([1.0, 0.0])], ["b"])
+        
+        # The compacted store is what a fresh instance loads
+        reloaded = DocumentCollection("test", str(self.test_dir))
+        self.assertEqual([r["chunk"]["id"] for r in reloaded.search([1.0, 0.0])], ["b"])
+    
+    def test_delete_document_tombstones(self):
+        """Test that deletes below the compaction threshold leave the store in place and are skipped by search."""
+        document = MagicMock(id="doc1")
+        document.dict.return_value = {"id": "doc1"}
+        self.collection.add_document(document)
+        self.collection.add_chunk(make_chunk("a", "doc1", "apples", [1.0, 0.0]))
+        self.collection.add_chunk(make_chunk("b", "doc2", "bananas", [0.9, 0.1]))
+        self.collection.add_chunk(make_chunk("c", "doc2", "cherries", [0.0, 1.0]))
+        self.assertEqual(self.collection.search([1.0, 0.0], top_k=1)[0]["chunk"]["id"], "a")
+        store_size = self.collection.embeddings_path.stat().st_size
+        
+        with patch("rag_enhancements.COMPACT_DELETED_FRACTION", 0.5):
+            self.assertTrue(self.collection.delete_document("doc1"))
+        
+        self.assertEqual(self.collection.embeddings_path.stat().st_size, store_size)
+        self.assertEqual([r["chunk"]["id"] for r in self.collection.search([1.0, 0.0], top_k=3)], ["b", "c"])
+        
+        # The tombstones persist, and the HNSW path excludes them through a selector
+        reloaded = DocumentCollection("test", str(self.test_dir))
+        self.assertEqual([r["chunk"]["id"] for r in reloaded.search([1.0, 0.0], top_k=3)], ["b", "c"])
+        if rag_enhancements.faiss is not None:
+            with patch("rag_enhancements.ANN_MIN_ROWS", 1):
+                reloaded._invalidate_index()
+                self.assertEqual([r["chunk"]["id"] for r in reloaded.search([1.0, 0.0], top_k=3)], ["b", "c"])
+        
+        # Compaction drops the deleted rows and the tombstones
+        reloaded.compact()
+        self.assertLess(reloaded.embeddings_path.stat().st_size, store_size)
+        self.assertFalse(reloaded.deleted_ids_path.exists())
+        self.assertEqual([r["chunk"]["id"] for r in reloaded.search([1.0, 0.0], top_k=3)], ["b", "c"])
+    
+    def test_load_repairs_interrupted_append(self):
+        """Test that embedding rows written without their index entries are truncated on load."""
+        self.collection.add_chunk(make_chunk("a", "doc1", "apples", [1.0, 0.0]))
+        store_size = self.collection.embeddings_path.stat().st_size
+        
+        # Simulate a crash after the embedding append, mid-way through the index append
+        with open(self.collection.embeddings_path, 'ab') as f:
+            f.write(np.array([[0.0, 1.0]], dtype=np.float32).tobytes())
+        with open(self.collection.chunk_ids_path, 'a') as f:
+            f.write("b\tdoc1")
+        
+        reloaded = DocumentCollection("test", str(self.test_dir))
+        reloaded.add_chunk(make_chunk("c", "doc2", "cherries", [0.0, 1.0]))
+        
+        self.assertEqual(reloaded.embeddings_path.stat().st_size, 2 * store_size)
+        self.assertEqual(reloaded.get_chunk("c")["embedding"], [0.0, 1.0])
+        self.assertEqual([r["chunk"]["id"] for r in reloaded.search([0.0, 1.0], top_k=2)], ["c", "a"])
+    
+    def test_add_document_deduplicates_content(self):
+        """Test that a document with already stored content is not stored again."""
+        documents = []
+        for document_id in ("doc1", "doc2"):
+            document = MagicMock(id=document_id)
+            document.dict.return_value = {"id": document_id, "metadata": {"content_hash": "abc"}}
+            documents.append(document)
+        
+        self.assertEqual(self.collection.add_document(documents[0]), "doc1")
+        self.assertEqual(self.collection.add_document(documents[1]), "doc1")
+        self.assertIsNone(self.collection.get_document("doc2"))
+        self.assertEqual(self.collection.metadata["document_count"], 1)
+        
+        # Deleting the stored copy lets the content be added again
+        self.assertTrue(self.collection.delete_document("doc1"))
+        self.assertIsNone(self.collection.find_document("abc"))
+        self.assertEqual(self.collection.add_document(documents[1]), "doc2")
+    
+    @unittest.skipIf(rag_enhancements.faiss is None, "faiss is not installed")
+    def test_bulk_mode_defers_ann_index(self):
+        """Test that bulk mode writes the HNSW index once, when the block exits."""
+        with patch("rag_enhancements.ANN_MIN_ROWS", 1):
+            with self.collection.bulk_mode():
+                self.collection.add_chunk(make_chunk("a", "doc1", "apples", [1.0, 0.0]))
+                self.assertEqual(self.collection.search([1.0, 0.0], top_k=1)[0]["chunk"]["id"], "a")
+                self.collection.add_chunk(make_chunk("b", "doc1", "bananas", [0.0, 1.0]))
+                self.assertEqual(self.collection.search([0.0, 1.0], top_k=1)[0]["chunk"]["id"], "b")
+                self.assertFalse(self.collection.ann_index_path.exists())
+            
+            self.assertTrue(self.collection.ann_index_path.exists())
+            reloaded = DocumentCollection("test", str(self.test_dir))
+            self.assertEqual(reloaded.metadata["chunk_count"], 2)
+            self.assertEqual(reloaded.search([0.0, 1.0], top_k=1)[0]["chunk"]["id"], "b")
+    
+    def test_migrate_inline_embeddings(self):
+        """Test that legacy inline embeddings move to the store, skipping mismatched dimensions."""
+        chunks_dir = self.collection.chunks_dir
+        for chunk_id, embedding in (("a", [1.0, 0.0]), ("b", [0.0, 1.0, 0.0])):
+            with open(chunks_dir / f"{chunk_id}.json", 'w') as f:
+                json.dump({"id": chunk_id, "document_id": "doc1", "content": chunk_id, "metadata": {}, "embedding": embedding}, f)
+        
+        collection = DocumentCollection("test", str(self.test_dir))
+        results = collection.search([1.0, 0.0])
+        
+        self.assertEqual([r["chunk"]["id"] for r in results], ["a"])
+        with open(chunks_dir / "a.json", 'r') as f:
+            self.assertNotIn("embedding", json.load(f))
+        
+        # The mismatched embedding stays inline rather than being lost
+        self.assertEqual(collection.get_chunk("b")["embedding"], [0.0, 1.0, 0.0])
+    
+    def test_bulk_add_chunks(self):
+        """Test that bulk adds share one store append and defer the metadata write."""
+        ids = self.collection.bulk_add_chunks([
+            make_chunk("a", "doc1", "apples", [1.0, 0.0]),
+            make_chunk("b", "doc1", "no embedding", None),
+            make_chunk("c", "doc2", "cherries", [0.0, 1.0])
+        ])
+        
+        self.assertEqual(ids, ["a", "b", "c"])
+        self.assertEqual(self.collection.get_chunk("c")["embedding"], [0.0, 1.0])
+        self.assertEqual([r["chunk"]["id"] for r in self.collection.search([0.0, 1.0], top_k=1)], ["c"])
+        
+        # Counts reach disk on flush
+        with open(self.collection.metadata_path, 'r') as f:
+            self.assertEqual(json.load(f)["chunk_count"], 0)
+        self.collection.flush()
+        with open(self.collection.metadata_path, 'r') as f:
+            self.assertEqual(json.load(f)["chunk_count"], 3)
+    
+    def test_storage_size_cache(self):
+        """Test that the cached storage size is refreshed after a change."""
+        self.collection.add_chunk(make_chunk("a", "doc1", "apples", [1.0, 0.0]))
+        size = self.collection.get_stats()["storage_size_bytes"]
+        self.assertGreater(size, 0)
+        self.assertEqual(self.collection.get_stats()["storage_size_bytes"], size)
+        
+        self.collection.add_chunk(make_chunk("b", "doc1", "bananas", [0.0, 1.0]))
+        self.assertGreater(self.collection.get_stats()["storage_size_bytes"], size)
+    
+    @unittest.skipIf(rag_enhancements.faiss is None, "faiss is not installed")
+    def test_search_ann_index(self):
+        """Test that large collections are searched through a persisted HNSW index."""
+        with patch("rag_enhancements.ANN_MIN_ROWS", 2):
+            self.collection.add_chunk(make_chunk("a", "doc1", "apples", [1.0, 0.0]))
+            self.collection.add_chunk(make_chunk("b", "doc1", "bananas", [0.0, 2.0]))
+            
+            results = self.collection.search([0.0, 1.0], top_k=1)
+            self.assertEqual(results[0]["chunk"]["id"], "b")
+            self.assertTrue(self.collection.ann_index_path.exists())
+            
+            # Appended rows extend the stored index
+            self.collection.add_chunk(make_chunk("c", "doc2", "cherries", [-1.0, 0.0]))
+            results = self.collection.search([-1.0, 0.0], top_k=1)
+            self.assertEqual(results[0]["chunk"]["id"], "c")
+            self.assertAlmostEqual(results[0]["score"], 1.0, places=5)
+    
+    @unittest.skipIf(rag_enhancements.faiss is None, "faiss is not installed")
+    def test_search_ann_index_document_filter(self):
+        """Test that filtered searches of an HNSW-indexed collection still find the allowed chunks."""
+        with patch("rag_enhancements.ANN_MIN_ROWS", 2):
+            self.collection.add_chunk(make_chunk("a", "doc1", "apples", [1.0, 0.0]))
+            self.collection.add_chunk(make_chunk("b", "doc1", "bananas", [0.9, 0.1]))
+            self.collection.add_chunk(make_chunk("c", "doc2", "cherries", [0.0, 1.0]))
+            self.collection.add_chunk(make_chunk("d", "doc3", "dates", [-1.0, 0.0]))
+            self.collection.add_chunk(make_chunk("e", "doc3", "elderberries", [-0.9, -0.1]))
+            
+            # A single allowed row is scored exactly
+            results = self.collection.search([1.0, 0.0], top_k=2, document_ids=["doc2"])
+            self.assertEqual([r["chunk"]["id"] for r in results], ["c"])
+            
+            # Queries the graph leaves short fall back to exact scoring
+            ann = self.collection._ann
+            with patch.object(self.collection, "_ann", MagicMock(ntotal=ann.ntotal)) as short_ann:
+                short_ann.search.return_value = (np.zeros((1, 2), dtype=np.float32), np.full((1, 2), -1))
+                results = self.collection.search([1.0, 0.0], top_k=2, document_ids=["doc3"])
+            self.assertEqual([r["chunk"]["id"] for r in results], ["e", "d"])
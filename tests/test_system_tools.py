@@ -4,6 +4,7 @@ Unit tests for system tools
 
 import os
 import sys
+import asyncio
 import unittest
 import tempfile
 from unittest.mock import MagicMock, patch
@@ -13,6 +14,7 @@ import pandas as pd
 # Add the project root to sys.path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+import system_tools
 from system_tools import get_system_tools
 
 class TestSystemTools(unittest.TestCase):
@@ -59,6 +61,31 @@ class TestSystemTools(unittest.TestCase):
             # Clean up
             os.unlink(tmp_path)
     
+    def test_read_text_cached_bounds(self):
+        """Test that the read cache keeps one version per path and stays within its total size."""
+        paths = []
+        for i in range(3):
+            with tempfile.NamedTemporaryFile(mode='w', delete=False) as tmp:
+                tmp.write("x" * 10)
+                paths.append(tmp.name)
+        
+        try:
+            with patch.dict(system_tools._read_file_cache, clear=True), \
+                    patch("system_tools._read_file_cache_bytes", 0), \
+                    patch("system_tools.READ_FILE_CACHE_TOTAL_BYTES", 20):
+                system_tools._read_text_cached(paths[0], 1, 10)
+                system_tools._read_text_cached(paths[0], 2, 10)
+                self.assertEqual(list(system_tools._read_file_cache), [paths[0]])
+                
+                # A third file pushes out the least recently read one
+                system_tools._read_text_cached(paths[1], 1, 10)
+                system_tools._read_text_cached(paths[2], 1, 10)
+                self.assertEqual(list(system_tools._read_file_cache), paths[1:])
+                self.assertEqual(system_tools._read_file_cache_bytes, 20)
+        finally:
+            for path in paths:
+                os.unlink(path)
+    
     async def test_write_file_tool(self):
         """Test write_file tool."""
         # Get system tools
@@ -84,4 +111,109 @@ class TestSystemTools(unittest.TestCase):
                 self.assertEqual(content, "Test content to write")
         finally:
             # Clean up
-            os.unlink(tmp_path)
\ No newline at end of file
+            os.unlink(tmp_path)
+    
+    @unittest.skipIf(system_tools.pa is None, "pyarrow is not installed")
+    def test_summarize_csv_streaming(self):
+        """Test that the batch-merged summary matches pandas describe()."""
+        data = pd.DataFrame({"a": [1.5, None, 3.0, -2.0, 8.25], "b": [1, 2, 3, 4, 5], "s": list("vwxyz")})
+        with tempfile.NamedTemporaryFile(mode='w', suffix=".csv", delete=False) as tmp:
+            data.to_csv(tmp, index=False)
+            tmp_path = tmp.name
+        
+        try:
+            # Tiny blocks force the summary to merge several record batches
+            with patch("system_tools.CSV_BLOCK_SIZE", 16):
+                summary = system_tools._summarize_csv_streaming(tmp_path)
+            
+            expected = pd.read_csv(tmp_path).describe()
+            self.assertEqual(set(summary), {"a", "b"})
+            for column, stats in summary.items():
+                for stat, value in stats.items():
+                    self.assertAlmostEqual(value, expected[column][stat])
+        finally:
+            os.unlink(tmp_path)
+    
+    @unittest.skipIf(system_tools.pa is None, "pyarrow is not installed")
+    def test_summarize_csv_streaming_widens_types(self):
+        """Test that values past the first block that do not fit the inferred type are still summarized."""
+        rows = [str(i) for i in range(20)] + ["2.5"]
+        with tempfile.NamedTemporaryFile(mode='w', suffix=".csv", delete=False) as tmp:
+            tmp.write("n,t\n" + "".join(f"{row},{row}\n" for row in rows) + "3,text\n")
+            tmp_path = tmp.name
+        
+        try:
+            with patch("system_tools.CSV_BLOCK_SIZE", 16):
+                summary = system_tools._summarize_csv_streaming(tmp_path)
+            
+            # The column with text falls out, as it would from describe()
+            expected = pd.read_csv(tmp_path).describe()
+            self.assertEqual(set(summary), {"n"})
+            for stat, value in summary["n"].items():
+                self.assertAlmostEqual(value, expected["n"][stat])
+        finally:
+            os.unlink(tmp_path)
+
+class TestSystemToolsAsync(unittest.IsolatedAsyncioTestCase):
+    """Test cases for system tools that run on an event loop."""
+    
+    async def test_read_file_tool_sees_edits(self):
+        """Test that cached reads pick up changes to the file."""
+        # Find the read_file tool
+        tools = get_system_tools()
+        read_file_tool = next(tool for tool in tools if tool.name == "read_file")
+        
+        with tempfile.NamedTemporaryFile(mode='w', delete=False) as tmp:
+            tmp.write("first\r\n")
+            tmp_path = tmp.name
+        
+        try:
+            self.assertEqual((await read_file_tool.function(path=tmp_path))["content"], "first\n")
+            self.assertEqual((await read_file_tool.function(path=tmp_path))["content"], "first\n")
+            
+            # A rewrite changes the size and modification time, so the cache misses
+            with open(tmp_path, 'w') as f:
+                f.write("second version")
+            self.assertEqual((await read_file_tool.function(path=tmp_path))["content"], "second version")
+        finally:
+            os.unlink(tmp_path)
+    
+    async def test_execute_command_tool_spills_long_output(self):
+        """Test that output beyond the in-memory cap is spilled to a temporary file."""
+        # Find the execute_command tool
+        tools = get_system_tools()
+        execute_command_tool = next(tool for tool in tools if tool.name == "execute_command")
+        
+        with patch("system_tools.COMMAND_OUTPUT_MAX_BYTES", 5):
+            result = await execute_command_tool.function(command="printf 'hello world'")
+        
+        try:
+            # Only the first bytes are kept in memory; the file has everything
+            self.assertEqual(result["stdout"], "hello")
+            self.assertEqual(result["returncode"], 0)
+            with open(result["stdout_path"], 'r') as f:
+                self.assertEqual(f.read(), "hello world")
+        finally:
+            os.unlink(result["stdout_path"])
+    
+    async def test_read_stream_removes_expired_spills(self):
+        """Test that spill files past their TTL are removed when the next one is written."""
+        async def read(data):
+            stream = asyncio.StreamReader()
+            stream.feed_data(data)
+            stream.feed_eof()
+            return await system_tools._read_stream(stream)
+        
+        with patch("system_tools.COMMAND_OUTPUT_MAX_BYTES", 5):
+            _, first_path = await read(b"hello world")
+            self.assertTrue(os.path.exists(first_path))
+            
+            os.utime(first_path, (0, 0))
+            _, second_path = await read(b"goodbye world")
+        
+        try:
+            self.assertFalse(os.path.exists(first_path))
+            with open(second_path, 'rb') as f:
+                self.assertEqual(f.read(), b"goodbye world")
+        finally:
+            os.unlink(second_path)
@@ -2,6 +2,7 @@
 Unit tests for web API
 """
 
+import gc
 import os
 import sys
 import unittest
@@ -13,6 +14,7 @@ from fastapi.testclient import TestClient
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 # Import the web API app
+import web_api
 from web_api import app, get_agent, create_conversation, get_api_key
 
 # Create test client
@@ -122,6 +124,20 @@ class TestWebAPI(unittest.TestCase):
         self.assertEqual(data["tools"][0]["name"], "test_tool")
         self.assertEqual(data["tools"][0]["category"], "test")
     
+    def test_tool_listing_cache_released_with_agent(self):
+        """Test that a cached tool listing is reused for its agent and dropped along with it."""
+        agent = MagicMock(tools={}, tool_categories={}, tools_version=1)
+        with patch('web_api.get_agent', return_value=agent):
+            for _ in range(2):
+                response = client.get("/tools", headers={"X-API-Key": "test-api-key"})
+                self.assertEqual(response.json(), {"tools": []})
+        self.assertEqual(web_api.tool_listing_cache[agent], {None: (1, [])})
+        cached_agents = len(web_api.tool_listing_cache)
+        
+        del agent
+        gc.collect()
+        self.assertEqual(len(web_api.tool_listing_cache), cached_agents - 1)
+    
     def test_invalid_api_key(self):
         """Test invalid API key."""
         # Make request with invalid API key
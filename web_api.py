@@ -10,6 +10,7 @@ import logging
 import asyncio
 import uvicorn
 import base64
+import weakref
 from typing import Dict, List, Optional, Any, Union
 from datetime import datetime
 from pathlib import Path
@@ -126,6 +127,11 @@ app.add_middleware(
 # Global agent instances cache
 agent_instances = {}
 
+# Formatted tool listings by agent, then by category, tagged with the agent's
+# tools_version so they are rebuilt only after tools change. Entries go away
+# with their agent.
+tool_listing_cache: "weakref.WeakKeyDictionary[Agent, Dict[Optional[str], tuple]]" = weakref.WeakKeyDictionary()
+
 # In-memory conversation storage (in a real app, use a database)
 conversations = {}
 
@@ -476,11 +482,10 @@ async def execute_tool(request: ToolExecutionRequest, api_key: bool = Depends(va
     agent = get_agent()
     
     # Check if tool exists
-    if request.tool_name not in agent.tools:
+    tool = agent.get_tool(request.tool_name)
+    if tool is None:
         raise HTTPException(status_code=404, detail=f"Tool {request.tool_name} not found")
     
-    tool = agent.tools[request.tool_name]
-    
     # Check required parameters
     missing_params = []
     for param in tool.parameters:
@@ -544,7 +549,14 @@ async def list_tools(category: Optional[str] = None, api_key: bool = Depends(val
     if category:
         if category not in agent.tool_categories:
             raise HTTPException(status_code=404, detail=f"Category {category} not found")
-        
+    
+    # Reuse the formatted listing until new tools are registered
+    listings = tool_listing_cache.setdefault(agent, {})
+    cached = listings.get(category)
+    if cached is not None and cached[0] == agent.tools_version:
+        return {"tools": cached[1]}
+    
+    if category:
         tools = {name: agent.tools[name] for name in agent.tool_categories[category]}
     else:
         tools = agent.tools
@@ -568,6 +580,8 @@ async def list_tools(category: Optional[str] = None, api_key: bool = Depends(val
             ]
         })
     
+    listings[category] = (agent.tools_version, formatted_tools)
+    
     return {"tools": formatted_tools}
 
 # RAG endpoints